@@ -0,0 +1,44 @@
+# Code archive for Pipeline Runner Lambda
+resource "archive_file" "pipeline_runner_lambda" {
+  type        = "zip"
+  source_dir  = "${path.module}/lambda/pipeline_runner/build"
+  output_path = "${path.module}/lambda/pipeline_runner.zip"
+}
+
+# Lambda Function for the fused hello_world → timestamp steps
+resource "aws_lambda_function" "pipeline_runner" {
+  filename         = archive_file.pipeline_runner_lambda.output_path
+  source_code_hash = archive_file.pipeline_runner_lambda.output_base64sha256
+  function_name    = "${var.project_name}-${var.environment}-pipeline-runner"
+  role             = aws_iam_role.lambda_role.arn
+  handler          = "index.lambda_handler"
+  runtime          = var.lambda_runtime_python
+  timeout          = 30
+
+  environment {
+    variables = {
+      ENVIRONMENT    = var.environment
+      PROJECT_NAME   = var.project_name
+      PIPELINE_STEPS = "hello_world:helloWorldResult,timestamp:timestampResult"
+      PROFILING      = var.lambda_profiling ? "true" : "false"
+    }
+  }
+
+  tags = {
+    Name        = "${var.project_name}-${var.environment}-pipeline-runner-lambda"
+    Environment = var.environment
+    Project     = var.project_name
+  }
+}
+
+# CloudWatch Log Group for Pipeline Runner Lambda
+resource "aws_cloudwatch_log_group" "pipeline_runner_lambda_logs" {
+  name              = "/aws/lambda/${var.aws_region}/${aws_lambda_function.pipeline_runner.function_name}"
+  retention_in_days = 14
+
+  tags = {
+    Name        = "${var.project_name}-${var.environment}-${var.aws_region}-pipeline-runner-logs"
+    Environment = var.environment
+    Project     = var.project_name
+  }
+}
@@ -19,6 +19,7 @@ resource "aws_lambda_function" "timestamp" {
     variables = {
       ENVIRONMENT  = var.environment
       PROJECT_NAME = var.project_name
+      PROFILING    = var.lambda_profiling ? "true" : "false"
     }
   }
 
@@ -27,6 +27,7 @@ resource "aws_lambda_function" "trigger_dag" {
       GOOGLE_APPLICATION_CREDENTIALS = "./wif_direct_access.json"
       GCP_PROJECT_ID                 = var.gcp_project_id
       PUBSUB_TOPIC_ID                = google_pubsub_topic.hello_world_trigger_topic.id
+      PROFILING                      = var.lambda_profiling ? "true" : "false"
     }
   }
 
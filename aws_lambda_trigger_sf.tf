@@ -26,6 +26,11 @@ resource "aws_lambda_function" "trigger_sf_lambda" {
       GOOGLE_CLOUD_PROJECT           = var.gcp_project_id
       PUBSUB_SUBSCRIPTION_PATH       = "projects/${var.gcp_project_id}/subscriptions/${google_pubsub_subscription.hello_world_sf_trigger_subscription.name}"
       STEP_FUNCTION_ARN              = aws_sfn_state_machine.hello_world_end.arn
+      DRAIN_MODE                     = "true"
+      DRAIN_SAFETY_MARGIN_MS         = "10000"
+      COALESCE_MODE                  = "false"
+      COALESCE_STEP_FUNCTION_ARN     = aws_sfn_state_machine.hello_world_end_batch.arn
+      PROFILING                      = var.lambda_profiling ? "true" : "false"
     }
   }
 
@@ -44,7 +44,8 @@ resource "aws_iam_role_policy" "trigger_sf_lambda_policy" {
           "states:StopExecution"
         ]
         Resource = [
-          aws_sfn_state_machine.hello_world_end.arn
+          aws_sfn_state_machine.hello_world_end.arn,
+          aws_sfn_state_machine.hello_world_end_batch.arn
         ]
       }
     ]
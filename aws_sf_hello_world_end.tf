@@ -36,3 +36,71 @@ resource "aws_sfn_state_machine" "hello_world_end" {
     Purpose     = "hello-world-end-workflow"
   }
 }
+
+# AWS Step Function - Hello World End Workflow for coalesced executions of trigger_sf (COALESCE_MODE).
+# The input is {"batch_id", "count", "items": [...]}; each item is one Pub/Sub message with its correlation_id.
+# A failed item is recorded in its result instead of failing the other items.
+resource "aws_sfn_state_machine" "hello_world_end_batch" {
+  name     = "${var.project_name}-${var.environment}-hello-world-end-batch-sf"
+  role_arn = aws_iam_role.step_function_role.arn
+
+  definition = jsonencode({
+    Comment = "The Hello World End workflow for each item of a coalesced batch"
+    StartAt = "ProcessItems"
+
+    States = {
+      "ProcessItems" = {
+        Type           = "Map"
+        ItemsPath      = "$.items"
+        MaxConcurrency = 10
+        ItemProcessor = {
+          ProcessorConfig = {
+            Mode = "INLINE"
+          }
+          StartAt = "HelloWorld"
+          States = {
+            "HelloWorld" = {
+              Type       = "Task"
+              Resource   = aws_lambda_function.hello_world.arn
+              ResultPath = "$.helloWorldResult"
+              End        = true
+              Catch = [
+                {
+                  ErrorEquals = ["States.ALL"]
+                  ResultPath  = "$.error"
+                  Next        = "ItemFailed"
+                }
+              ]
+            }
+
+            "ItemFailed" = {
+              Type = "Pass"
+              End  = true
+            }
+          }
+        }
+        ResultPath = "$.results"
+        End        = true
+        Catch = [
+          {
+            ErrorEquals = ["States.ALL"]
+            Next        = "ErrorHandler"
+          }
+        ]
+      }
+
+      "ErrorHandler" = {
+        Type  = "Fail"
+        Cause = "An error occurred during execution"
+        Error = "WorkflowError"
+      }
+    }
+  })
+
+  tags = {
+    Name        = "${var.project_name}-${var.environment}-hello-world-end-batch-sf"
+    Environment = var.environment
+    Project     = var.project_name
+    Purpose     = "hello-world-end-batch-workflow"
+  }
+}
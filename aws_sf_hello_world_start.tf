@@ -1,3 +1,69 @@
+# The HelloWorld and Timestamp steps, either as one Lambda each (default) or fused into one
+# pipeline_runner invocation (fuse_hello_world_steps). The fused variant skips the 5s wait in between
+# and routes step failures to the ErrorHandler through pipelineResult.success.
+locals {
+  hello_world_start_split_states = {
+    "HelloWorld" = {
+      Type       = "Task"
+      Resource   = aws_lambda_function.hello_world.arn
+      ResultPath = "$.helloWorldResult"
+      Next       = "WaitState"
+      Catch = [
+        {
+          ErrorEquals = ["States.ALL"]
+          Next        = "ErrorHandler"
+        }
+      ]
+    }
+
+    "WaitState" = {
+      Type    = "Wait"
+      Seconds = 5
+      Next    = "TimestampState"
+    }
+
+    "TimestampState" = {
+      Type       = "Task"
+      Resource   = aws_lambda_function.timestamp.arn
+      ResultPath = "$.timestampResult"
+      Next       = "TriggerAirflowDAGInit"
+      Catch = [
+        {
+          ErrorEquals = ["States.ALL"]
+          Next        = "ErrorHandler"
+        }
+      ]
+    }
+  }
+
+  hello_world_start_fused_states = {
+    "HelloWorldPipeline" = {
+      Type       = "Task"
+      Resource   = aws_lambda_function.pipeline_runner.arn
+      ResultPath = "$"
+      Next       = "CheckPipelineResult"
+      Catch = [
+        {
+          ErrorEquals = ["States.ALL"]
+          Next        = "ErrorHandler"
+        }
+      ]
+    }
+
+    "CheckPipelineResult" = {
+      Type = "Choice"
+      Choices = [
+        {
+          Variable      = "$.pipelineResult.success"
+          BooleanEquals = true
+          Next          = "TriggerAirflowDAGInit"
+        }
+      ]
+      Default = "ErrorHandler"
+    }
+  }
+}
+
 # AWS Step Function - Hello World Workflow
 resource "aws_sfn_state_machine" "hello_world_start" {
   name     = "${var.project_name}-${var.environment}-hello-world-start-sf"
@@ -5,121 +71,117 @@ resource "aws_sfn_state_machine" "hello_world_start" {
 
   definition = jsonencode({
     Comment = "A Hello World Step Function workflow with Airflow DAG trigger"
-    StartAt = "HelloWorld"
-
-    States = {
-      "HelloWorld" = {
-        Type       = "Task"
-        Resource   = aws_lambda_function.hello_world.arn
-        ResultPath = "$.helloWorldResult"
-        Next       = "WaitState"
-        Catch = [
-          {
-            ErrorEquals = ["States.ALL"]
-            Next        = "ErrorHandler"
-          }
-        ]
-      }
-
-      "WaitState" = {
-        Type    = "Wait"
-        Seconds = 5
-        Next    = "TimestampState"
-      }
+    StartAt = var.fuse_hello_world_steps ? "HelloWorldPipeline" : "HelloWorld"
 
-      "TimestampState" = {
-        Type       = "Task"
-        Resource   = aws_lambda_function.timestamp.arn
-        ResultPath = "$.timestampResult"
-        Next       = "TriggerAirflowDAGInit"
-        Catch = [
-          {
-            ErrorEquals = ["States.ALL"]
-            Next        = "ErrorHandler"
+    States = merge(
+      { for name, state in local.hello_world_start_split_states : name => state if !var.fuse_hello_world_steps },
+      { for name, state in local.hello_world_start_fused_states : name => state if var.fuse_hello_world_steps },
+      {
+        "TriggerAirflowDAGInit" = {
+          Type = "Pass"
+          Parameters = {
+            "retry_count" : 0
           }
-        ]
-      }
+          ResultPath = "$.airflowDagConfig"
+          Next       = "WaitBeforeTriggerAirflowDAG"
+        }
 
-      "TriggerAirflowDAGInit" = {
-        Type = "Pass"
-        Parameters = {
-          "retry_count" : 0
+        "WaitBeforeTriggerAirflowDAG" = {
+          Type    = "Wait"
+          Seconds = 5
+          Next    = "TriggerAirflowDAG"
         }
-        ResultPath = "$.airflowDagConfig"
-        Next       = "WaitBeforeTriggerAirflowDAG"
-      }
 
-      "WaitBeforeTriggerAirflowDAG" = {
-        Type    = "Wait"
-        Seconds = 5
-        Next    = "TriggerAirflowDAG"
-      }
+        "TriggerAirflowDAG" = {
+          Type       = "Task"
+          Resource   = aws_lambda_function.trigger_dag_go.arn
+          ResultPath = "$.triggerResult"
+          Next       = "CheckDAGTriggerResult"
+          # Publish errors are retried inside the Lambda within its remaining time and reported as
+          # triggerResult.retryable, so only Lambda service errors are retried here
+          Retry = [
+            {
+              ErrorEquals     = ["Lambda.ServiceException", "Lambda.AWSLambdaException", "Lambda.SdkClientException", "Lambda.TooManyRequestsException"]
+              IntervalSeconds = 2
+              MaxAttempts     = 3
+              BackoffRate     = 2.0
+            }
+          ]
+          Catch = [
+            {
+              ErrorEquals = ["States.ALL"]
+              Next        = "ErrorHandler"
+            }
+          ]
+        }
 
-      "TriggerAirflowDAG" = {
-        Type       = "Task"
-        Resource   = aws_lambda_function.trigger_dag_go.arn
-        ResultPath = "$.triggerResult"
-        Next       = "CheckDAGTriggerResult"
-        Retry = [
-          {
-            ErrorEquals     = ["States.ALL"]
-            IntervalSeconds = 2
-            MaxAttempts     = 3
-            BackoffRate     = 2.0
-          }
-        ]
-        Catch = [
-          {
-            ErrorEquals = ["States.ALL"]
-            Next        = "ErrorHandler"
-          }
-        ]
-      }
+        "CheckDAGTriggerResult" = {
+          Type = "Choice"
+          Choices = [
+            {
+              Variable      = "$.triggerResult.success"
+              BooleanEquals = true
+              Next          = "SuccessState"
+            },
+            {
+              # Non-retryable failures (e.g. missing topic, permission denied) skip the retry loop
+              And = [
+                {
+                  Variable  = "$.triggerResult.retryable"
+                  IsPresent = true
+                },
+                {
+                  Variable      = "$.triggerResult.retryable"
+                  BooleanEquals = false
+                }
+              ]
+              Next = "ErrorHandler"
+            },
+            {
+              # Failed publish attempts were already retried within the Lambda's time budget, another
+              # round of retries would only stack on top of them. Failures before any publish attempt
+              # (e.g. creating the Pub/Sub client) report no attempts and go through the retry loop
+              Variable  = "$.triggerResult.attempts"
+              IsPresent = true
+              Next      = "ErrorHandler"
+            }
+          ]
+          Default = "ShouldRetryAirflowDAG"
+        }
 
-      "CheckDAGTriggerResult" = {
-        Type = "Choice"
-        Choices = [
-          {
-            Variable      = "$.triggerResult.success"
-            BooleanEquals = true
-            Next          = "SuccessState"
-          }
-        ]
-        Default = "ShouldRetryAirflowDAG"
-      }
+        "ShouldRetryAirflowDAG" = {
+          Type = "Choice"
+          Choices = [
+            {
+              Variable        = "$.airflowDagConfig.retry_count"
+              NumericLessThan = 3
+              Next            = "IncrementRetryCountAirflowDAG"
+            }
+          ]
+          Default = "ErrorHandler"
+        }
 
-      "ShouldRetryAirflowDAG" = {
-        Type = "Choice"
-        Choices = [
-          {
-            Variable        = "$.airflowDagConfig.retry_count"
-            NumericLessThan = 3
-            Next            = "IncrementRetryCountAirflowDAG"
+        "IncrementRetryCountAirflowDAG" = {
+          Type = "Pass"
+          Parameters = {
+            "retry_count.$" : "States.MathAdd($.airflowDagConfig.retry_count, 1)"
           }
-        ]
-        Default = "ErrorHandler"
-      }
-
-      "IncrementRetryCountAirflowDAG" = {
-        Type = "Pass"
-        Parameters = {
-          "retry_count.$" : "States.MathAdd($.airflowDagConfig.retry_count, 1)"
+          ResultPath = "$.airflowDagConfig"
+          Next       = "WaitBeforeTriggerAirflowDAG"
         }
-        ResultPath = "$.airflowDagConfig"
-        Next       = "WaitBeforeTriggerAirflowDAG"
-      }
 
-      "SuccessState" = {
-        Type    = "Succeed"
-        Comment = "Workflow completed successfully"
-      }
+        "SuccessState" = {
+          Type    = "Succeed"
+          Comment = "Workflow completed successfully"
+        }
 
-      "ErrorHandler" = {
-        Type  = "Fail"
-        Cause = "An error occurred during execution"
-        Error = "WorkflowError"
+        "ErrorHandler" = {
+          Type  = "Fail"
+          Cause = "An error occurred during execution"
+          Error = "WorkflowError"
+        }
       }
-    }
+    )
   })
 
   tags = {
@@ -170,6 +232,7 @@ resource "aws_iam_role_policy" "step_function_policy" {
         Resource = [
           aws_lambda_function.hello_world.arn,
           aws_lambda_function.timestamp.arn,
+          aws_lambda_function.pipeline_runner.arn,
           aws_lambda_function.trigger_dag.arn,
           aws_lambda_function.trigger_dag_go.arn
         ]
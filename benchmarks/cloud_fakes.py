@@ -0,0 +1,245 @@
+"""
+In-process stand-ins for the cloud services the Lambdas and DAGs talk to.
+
+Only the client methods the handlers actually call are implemented:
+- FakePubSub: topics fanning out to subscriptions, at-least-once delivery with
+  ack deadlines and optional random redelivery of acknowledged messages
+- FakePublisherClient / FakeSubscriberClient: google.cloud.pubsub_v1 client surface; an idle
+  pull raises DeadlineExceeded like the real client
+- FakeStepFunctions: boto3 'stepfunctions' client recording start_execution calls
+- FakeLambdaContext: Lambda context with a remaining-time budget
+"""
+
+import base64
+import itertools
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+
+
+class FakeClientError(Exception):
+    """Mimics botocore ClientError: the error code is in response['Error']['Code']"""
+
+    def __init__(self, code, message=''):
+        super().__init__(f"An error occurred ({code}): {message}")
+        self.response = {'Error': {'Code': code, 'Message': message}}
+
+
+class DeadlineExceeded(Exception):
+    """Named like google.api_core.exceptions.DeadlineExceeded, which a pull raises when no message arrived in time"""
+
+
+class FakeLambdaContext:
+    """Lambda context whose remaining time counts down from timeout_ms"""
+
+    def __init__(self, timeout_ms=60000, function_name='local'):
+        self.aws_request_id = str(uuid.uuid4())
+        self.function_name = function_name
+        self.memory_limit_in_mb = 128
+        self._deadline = time.monotonic() + timeout_ms / 1000
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self._deadline - time.monotonic()) * 1000))
+
+
+class FakeFuture:
+    def __init__(self, value):
+        self._value = value
+
+    def result(self, timeout=None):
+        return self._value
+
+
+class FakePubsubMessage:
+    def __init__(self, data, message_id, publish_time):
+        self.data = data
+        self.message_id = message_id
+        self.publish_time = publish_time
+        self.attributes = {}
+
+
+class FakeReceivedMessage:
+    def __init__(self, ack_id, message, delivery_attempt):
+        self.ack_id = ack_id
+        self.message = message
+        self.delivery_attempt = delivery_attempt
+
+    def to_dict(self):
+        """Same shape as ReceivedMessage.to_dict(), as returned by the Pub/Sub sensors"""
+        return {
+            'ack_id': self.ack_id,
+            'delivery_attempt': self.delivery_attempt,
+            'message': {
+                'data': base64.b64encode(self.message.data).decode('ascii'),
+                'message_id': self.message.message_id,
+                'publish_time': self.message.publish_time.isoformat(),
+                'attributes': {},
+            },
+        }
+
+
+class FakePullResponse:
+    def __init__(self, received_messages):
+        self.received_messages = received_messages
+
+
+class _Subscription:
+    def __init__(self):
+        self.ready = deque()       # (message, delivery_attempt)
+        self.outstanding = {}      # ack_id -> (message, delivery_attempt, deadline)
+
+
+class FakePubSub:
+    """
+    In-memory Pub/Sub broker.
+
+    Args:
+        ack_deadline_seconds: Default ack deadline of pulled messages
+        redelivery_rate: Probability that an acknowledged message is delivered again anyway
+        pull_wait_seconds: How long an empty pull waits for messages before returning
+        seed: Random seed for reproducible redelivery
+    """
+
+    def __init__(self, ack_deadline_seconds=10, redelivery_rate=0.0, pull_wait_seconds=0.05, seed=None):
+        self.ack_deadline_seconds = ack_deadline_seconds
+        self.redelivery_rate = redelivery_rate
+        self.pull_wait_seconds = pull_wait_seconds
+        self.random = random.Random(seed)
+        self.topics = {}           # topic -> [subscription names]
+        self.subscriptions = {}    # subscription -> _Subscription
+        self.published_count = 0
+        self.redelivered_count = 0
+        self._message_ids = itertools.count(1)
+        self._ack_ids = itertools.count(1)
+        self._changed = threading.Condition()
+
+    def create_subscription(self, topic, subscription):
+        with self._changed:
+            self.topics.setdefault(topic, []).append(subscription)
+            self.subscriptions[subscription] = _Subscription()
+
+    def publish(self, topic, data):
+        with self._changed:
+            message = FakePubsubMessage(data, str(next(self._message_ids)), datetime.now(timezone.utc))
+            for subscription in self.topics.get(topic, []):
+                self.subscriptions[subscription].ready.append((message, 1))
+            self.published_count += 1
+            self._changed.notify_all()
+        return message.message_id
+
+    def _expire(self, state):
+        now = time.monotonic()
+        for ack_id, (message, attempt, deadline) in list(state.outstanding.items()):
+            if deadline <= now:
+                del state.outstanding[ack_id]
+                state.ready.append((message, attempt + 1))
+
+    def pull(self, subscription, max_messages, timeout=None):
+        wait = self.pull_wait_seconds if timeout is None else min(timeout, self.pull_wait_seconds)
+        deadline = time.monotonic() + wait
+        with self._changed:
+            state = self.subscriptions[subscription]
+            self._expire(state)
+            while not state.ready and time.monotonic() < deadline:
+                self._changed.wait(deadline - time.monotonic())
+                self._expire(state)
+
+            received = []
+            while state.ready and len(received) < max_messages:
+                message, attempt = state.ready.popleft()
+                ack_id = f"ack-{next(self._ack_ids)}"
+                state.outstanding[ack_id] = (message, attempt, time.monotonic() + self.ack_deadline_seconds)
+                received.append(FakeReceivedMessage(ack_id, message, attempt))
+            return received
+
+    def acknowledge(self, subscription, ack_ids):
+        with self._changed:
+            state = self.subscriptions[subscription]
+            for ack_id in ack_ids:
+                entry = state.outstanding.pop(ack_id, None)
+                if entry and self.redelivery_rate and self.random.random() < self.redelivery_rate:
+                    # At-least-once delivery: an acknowledged message may still be redelivered
+                    state.ready.append((entry[0], entry[1] + 1))
+                    self.redelivered_count += 1
+            self._changed.notify_all()
+
+    def modify_ack_deadline(self, subscription, ack_ids, ack_deadline_seconds):
+        with self._changed:
+            state = self.subscriptions[subscription]
+            for ack_id in ack_ids:
+                if ack_id in state.outstanding:
+                    message, attempt, _ = state.outstanding[ack_id]
+                    state.outstanding[ack_id] = (message, attempt, time.monotonic() + ack_deadline_seconds)
+
+    def backlog(self, subscription):
+        """Number of messages not yet acknowledged on subscription"""
+        with self._changed:
+            state = self.subscriptions[subscription]
+            return len(state.ready) + len(state.outstanding)
+
+
+class FakePublisherClient:
+    """pubsub_v1.PublisherClient surface used by trigger_dag"""
+
+    def __init__(self, broker):
+        self.broker = broker
+        self._is_stopped = False
+
+    def publish(self, topic, data, **attributes):
+        return FakeFuture(self.broker.publish(topic, data))
+
+
+class FakeSubscriberClient:
+    """pubsub_v1.SubscriberClient surface used by trigger_sf"""
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    def pull(self, subscription, max_messages, timeout=None, **kwargs):
+        received = self.broker.pull(subscription, max_messages, timeout)
+        # Like the real client, an idle pull ends in DeadlineExceeded rather than an empty response
+        if not received:
+            raise DeadlineExceeded(f"Deadline exceeded pulling {subscription}")
+        return FakePullResponse(received)
+
+    def acknowledge(self, subscription, ack_ids, **kwargs):
+        self.broker.acknowledge(subscription, ack_ids)
+
+    def modify_ack_deadline(self, subscription, ack_ids, ack_deadline_seconds, **kwargs):
+        self.broker.modify_ack_deadline(subscription, ack_ids, ack_deadline_seconds)
+
+
+class FakeStepFunctions:
+    """
+    boto3 'stepfunctions' client that records start_execution calls.
+
+    Args:
+        latency_ms: Simulated StartExecution round trip
+        throttle_rate: Probability that a call fails with ThrottlingException
+        seed: Random seed for reproducible throttling
+    """
+
+    def __init__(self, latency_ms=0.0, throttle_rate=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.throttle_rate = throttle_rate
+        self.random = random.Random(seed)
+        self.executions = {}   # name -> (monotonic start time, input)
+        self.calls = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def start_execution(self, stateMachineArn, name, input):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        with self._lock:
+            self.calls += 1
+            if self.throttle_rate and self.random.random() < self.throttle_rate:
+                self.throttled += 1
+                raise FakeClientError('ThrottlingException', 'Rate exceeded')
+            if name in self.executions:
+                raise FakeClientError('ExecutionAlreadyExists', f"Execution already exists: '{name}'")
+            self.executions[name] = (time.monotonic(), input)
+        return {'executionArn': f"{stateMachineArn}:{name}", 'startDate': datetime.now(timezone.utc)}
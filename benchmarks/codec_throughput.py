@@ -0,0 +1,81 @@
+"""
+Encode/decode throughput of shared/message_codec.py.
+
+Compares the previous per-hop handling (json.dumps(...).encode('utf-8') and
+json.loads(data.decode('utf-8'))) with message_codec.encode() and
+message_codec.decode() across payload sizes, and reports the encoded size.
+The codec uses orjson when it is installed; run once with and once without it
+to see the effect of the backend.
+
+Usage:
+    python benchmarks/codec_throughput.py [--iterations 2000]
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'shared'))
+
+import message_codec  # noqa: E402
+from message_codec import TRIGGER_SCHEMA, decode, encode  # noqa: E402
+
+PAYLOAD_SIZES = (256, 4 * 1024, 64 * 1024, 512 * 1024)
+
+
+def make_payload(size):
+    """Trigger-like message whose JSON serialization is roughly size bytes"""
+    return {
+        'custom_message': 'Hello from AWS Step Function! Workflow: workflow-1',
+        'source': 'aws_step_function',
+        'workflow_id': 'workflow-1',
+        'execution_id': '42',
+        'items': [{'key': f'key-{i}', 'value': f'value-{i % 100}' * 4} for i in range(max(1, size // 64))]
+    }
+
+
+def legacy_encode(message):
+    return json.dumps(message).encode('utf-8')
+
+
+def legacy_decode(data):
+    return json.loads(data.decode('utf-8'))
+
+
+def mb_per_second(size, seconds, iterations):
+    return size * iterations / seconds / 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    backend = 'orjson' if message_codec.orjson is not None else 'json'
+    print(f"backend: {backend}, compression threshold: {message_codec.CODEC_COMPRESS_THRESHOLD_BYTES} bytes")
+    print(f"{'payload':>10} {'encoded':>10} {'legacy enc MB/s':>16} {'codec enc MB/s':>15} "
+          f"{'legacy dec MB/s':>16} {'codec dec MB/s':>15}")
+    for size in PAYLOAD_SIZES:
+        message = make_payload(size)
+        legacy_data = legacy_encode(message)
+        codec_data = encode(message)
+        assert decode(codec_data, TRIGGER_SCHEMA) == legacy_decode(legacy_data)
+
+        # Scale iterations down for large payloads to keep the run short
+        iterations = max(10, args.iterations * 1024 // max(1024, size))
+        json_size = len(legacy_data)
+        results = [
+            timeit.timeit(lambda: legacy_encode(message), number=iterations),
+            timeit.timeit(lambda: encode(message), number=iterations),
+            timeit.timeit(lambda: legacy_decode(legacy_data), number=iterations),
+            timeit.timeit(lambda: decode(codec_data, TRIGGER_SCHEMA), number=iterations),
+        ]
+        throughput = [mb_per_second(json_size, seconds, iterations) for seconds in results]
+        print(f"{json_size:>10} {len(codec_data):>10} {throughput[0]:>16.1f} {throughput[1]:>15.1f} "
+              f"{throughput[2]:>16.1f} {throughput[3]:>15.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""
+hello_world_dag layout benchmark: per-task vs. fused (fuse_hello_world_dag_steps).
+
+Runs complete hello_world_dag runs with dag.test() in each layout and reports
+per layout the DAG run wall time, the number of task instances and the number
+of metadata DB writes (INSERT/UPDATE/DELETE statements) per run. Every layout
+runs in its own process with a throwaway SQLite metadata DB and its own
+hello_world_dag_layout module, the constant Terraform renders next to the DAG.
+
+dag.test() runs the tasks in-process, one after the other, so the wall time
+leaves out the scheduler latency and the task process startup every task
+instance pays in Composer. Multiply the task instance difference by the
+per-task overhead observed in the environment to estimate those savings.
+trigger_aws_step_function and publish_pubsub_message are marked successful
+without running, so no AWS or GCP access is needed.
+
+Requires Airflow and the providers in dags/requirements.txt.
+
+Usage:
+    python benchmarks/dag_layout_compare.py [--runs 10] [--workflows 1]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(BENCHMARKS_DIR, '..')
+DEFAULT_RESULTS = os.path.join(BENCHMARKS_DIR, 'results', 'dag_layout_compare.json')
+
+LAYOUTS = {'per-task': False, 'fused': True}
+
+# Tasks that talk to AWS or GCP, marked successful instead of run
+CLOUD_TASKS = r'^(trigger_aws_step_function|publish_pubsub_message)$'
+
+WRITE_STATEMENTS = ('insert', 'update', 'delete')
+
+
+def run_conf(workflows, run):
+    """DAG run conf with one payload, or a batch of workflows payloads"""
+    payloads = [
+        {'workflow_id': f"workflow-{run}-{i}", 'execution_id': i, 'custom_message': 'dag_layout_compare',
+         'source': 'dag_layout_compare', 'timestamp': '2024-01-01T00:00:00'}
+        for i in range(workflows)
+    ]
+    return {'pubsub_params': payloads[0] if workflows == 1 else payloads}
+
+
+def measure_layout(runs, workflows, fused):
+    """Run in the child process: time the DAG runs of the per-task or fused layout"""
+    airflow_home = tempfile.mkdtemp(prefix='dag_layout_compare_')
+    with open(os.path.join(airflow_home, 'hello_world_dag_layout.py'), 'w') as f:
+        f.write(f"HELLO_WORLD_FUSED_STEPS = {fused}\nHELLO_WORLD_BATCH_MODE = {workflows > 1}\n")
+    sys.path.insert(0, os.path.join(ROOT, 'shared'))
+    sys.path.insert(0, os.path.join(ROOT, 'dags'))
+    sys.path.insert(0, airflow_home)
+    os.environ['AIRFLOW_HOME'] = airflow_home
+    os.environ['AIRFLOW__CORE__LOAD_EXAMPLES'] = 'False'
+
+    from datetime import timedelta
+    from sqlalchemy import event
+    from airflow import settings
+    from airflow.utils import db, timezone
+    from airflow.utils.state import DagRunState
+
+    db.resetdb()
+    import hello_world_dag
+    dag = hello_world_dag.dag
+
+    writes = 0
+
+    def count_write(conn, cursor, statement, parameters, context, executemany):
+        nonlocal writes
+        if statement.lstrip().lower().startswith(WRITE_STATEMENTS):
+            writes += 1
+
+    event.listen(settings.engine, 'before_cursor_execute', count_write)
+    start_date = timezone.utcnow() - timedelta(days=runs)
+    results = []
+    for run in range(runs):
+        writes = 0
+        start = time.perf_counter()
+        dag_run = dag.test(execution_date=start_date + timedelta(days=run), run_conf=run_conf(workflows, run),
+                           mark_success_pattern=CLOUD_TASKS)
+        wall_ms = (time.perf_counter() - start) * 1000
+        results.append({
+            'wall_ms': round(wall_ms, 1),
+            'db_writes': writes,
+            'task_instances': len(dag_run.get_task_instances()),
+            'success': dag_run.state == DagRunState.SUCCESS,
+        })
+    return results
+
+
+def run_layout(fused, runs, workflows):
+    """Measure one layout in a fresh process, returning its per-run results"""
+    command = [sys.executable, os.path.abspath(__file__), '--child', '--runs', str(runs), '--workflows', str(workflows)]
+    if fused:
+        command.append('--fused')
+    output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+    # Task logs go to stdout too, the results are the last line
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarize(runs):
+    # The first run also pays for the lazy imports of the task callables
+    timed = runs[1:] or runs
+    return {
+        'wall_ms_mean': round(statistics.mean(run['wall_ms'] for run in timed), 1),
+        'wall_ms_p50': round(statistics.median(run['wall_ms'] for run in timed), 1),
+        'db_writes_mean': round(statistics.mean(run['db_writes'] for run in runs), 1),
+        'task_instances': runs[-1]['task_instances'],
+        'failed_runs': sum(not run['success'] for run in runs),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=10, help='DAG runs per layout (default: 10)')
+    parser.add_argument('--workflows', type=int, default=1,
+                        help='Payloads per DAG run, more than 1 uses batch mode (default: 1)')
+    parser.add_argument('--results', default=DEFAULT_RESULTS,
+                        help='JSON results file (default: benchmarks/results/dag_layout_compare.json)')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--fused', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(measure_layout(args.runs, args.workflows, args.fused)))
+        return 0
+
+    summaries = {layout: summarize(run_layout(fused, args.runs, args.workflows)) for layout, fused in LAYOUTS.items()}
+
+    print(f"{'layout':>9} {'wall mean ms':>13} {'wall p50 ms':>12} {'db writes':>10} {'task instances':>15} {'failed':>7}")
+    for layout, summary in summaries.items():
+        print(f"{layout:>9} {summary['wall_ms_mean']:>13} {summary['wall_ms_p50']:>12} {summary['db_writes_mean']:>10} "
+              f"{summary['task_instances']:>15} {summary['failed_runs']:>7}")
+    split, fused = summaries['per-task'], summaries['fused']
+    print(f"\nfused saves {split['task_instances'] - fused['task_instances']} task instances and "
+          f"{split['db_writes_mean'] - fused['db_writes_mean']:.1f} DB writes per DAG run")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.results)), exist_ok=True)
+    with open(args.results, 'w') as f:
+        json.dump({'runs': args.runs, 'workflows': args.workflows, 'layouts': summaries}, f, indent=2)
+    print(f"\nResults written to {args.results}")
+    return 1 if any(summary['failed_runs'] for summary in summaries.values()) else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
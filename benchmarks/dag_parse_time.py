@@ -0,0 +1,108 @@
+"""
+Parse-time benchmark of the DAG files.
+
+Loads each DAG file through a DagBag repeatedly and reports mean and p95
+parse time and peak memory. Like the DAG processor, Airflow itself is
+imported once up front and every parse runs in a freshly forked process, so
+modules imported by the DAG file (e.g. provider operators) are paid for on
+every parse, as they are on every worker task run. Exits non-zero if a DAG
+file fails to import or exceeds the thresholds.
+
+Requires Airflow and the providers in dags/requirements.txt (Linux/macOS, uses fork).
+
+Usage:
+    python benchmarks/dag_parse_time.py [--iterations 20] [--max-p95-ms 500] [--max-peak-mb 50]
+"""
+
+import argparse
+import math
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+DAGS_DIR = os.path.join(ROOT, 'dags')
+sys.path.insert(0, os.path.join(ROOT, 'shared'))
+sys.path.insert(0, DAGS_DIR)
+
+DAG_FILES = ('hello_world_dag.py', 'pubsub_trigger_dag.py')
+
+# Throwaway Airflow home, set before Airflow is imported
+os.environ['AIRFLOW_HOME'] = tempfile.mkdtemp(prefix='dag_parse_time_')
+os.environ['AIRFLOW__CORE__LOAD_EXAMPLES'] = 'False'
+
+from airflow.models.dagbag import DagBag  # noqa: E402
+
+
+def parse_once(dag_file, trace_memory, conn):
+    """Parse dag_file in this (forked) process and send back (seconds, peak bytes, import errors)"""
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    dagbag = DagBag(dag_folder=dag_file, include_examples=False, safe_mode=False)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] if trace_memory else 0
+    conn.send((elapsed, peak, dict(dagbag.import_errors)))
+    conn.close()
+
+
+def parse_in_child(dag_file, trace_memory=False):
+    ctx = multiprocessing.get_context('fork')
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=parse_once, args=(dag_file, trace_memory, child_conn))
+    process.start()
+    result = parent_conn.recv()
+    process.join()
+    return result
+
+
+def p95(values):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(0.95 * len(ordered)) - 1)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--iterations', type=int, default=20, help='Timed parses per DAG file (default: 20)')
+    parser.add_argument('--memory-iterations', type=int, default=3,
+                        help='Parses per DAG file with tracemalloc enabled (default: 3)')
+    parser.add_argument('--max-p95-ms', type=float, default=500.0,
+                        help='Fail if the p95 parse time of a DAG file exceeds this (default: 500)')
+    parser.add_argument('--max-peak-mb', type=float, default=50.0,
+                        help='Fail if the peak memory of a DAG file parse exceeds this (default: 50)')
+    args = parser.parse_args(argv)
+
+    failures = []
+    print(f"{'dag file':>24} {'mean ms':>9} {'p95 ms':>9} {'peak MB':>9}")
+    for dag_file in DAG_FILES:
+        path = os.path.join(DAGS_DIR, dag_file)
+        timings = []
+        for _ in range(args.iterations):
+            elapsed, _, import_errors = parse_in_child(path)
+            if import_errors:
+                failures.append(f"{dag_file}: import errors {import_errors}")
+                break
+            timings.append(elapsed * 1000)
+        if not timings:
+            continue
+
+        peak_mb = max(parse_in_child(path, trace_memory=True)[1] for _ in range(args.memory_iterations)) / 1e6
+        mean_ms, p95_ms = statistics.mean(timings), p95(timings)
+        print(f"{dag_file:>24} {mean_ms:>9.1f} {p95_ms:>9.1f} {peak_mb:>9.1f}")
+
+        if p95_ms > args.max_p95_ms:
+            failures.append(f"{dag_file}: p95 parse time {p95_ms:.1f} ms exceeds {args.max_p95_ms} ms")
+        if peak_mb > args.max_peak_mb:
+            failures.append(f"{dag_file}: peak memory {peak_mb:.1f} MB exceeds {args.max_peak_mb} MB")
+
+    for failure in failures:
+        print(failure)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
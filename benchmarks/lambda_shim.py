@@ -0,0 +1,70 @@
+"""
+Local invocation shim for the Python Lambda handlers.
+
+Imports lambda/<function>/index.py with the shared modules on the path, then
+invokes lambda_handler once per JSON event line on stdin with a local Lambda
+context, writing one line per event to stdout:
+
+    {"ready": true, "import_ms": ...}                     after importing the handler
+    {"response": {...}, "duration_ms": ...}               per event
+    {"response": null, "duration_ms": ..., "error": "..."} if the handler raised
+
+This is the same protocol as the Go trigger_dag in local mode (TRIGGER_DAG_LOCAL=true),
+which benchmarks/trigger_dag_compare.py relies on. Handler logs go to stderr.
+
+Usage:
+    echo '{"workflow_id": "w1"}' | python benchmarks/lambda_shim.py lambda/trigger_dag [--fake-pubsub]
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cloud_fakes import FakeLambdaContext, FakePubSub, FakePublisherClient  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('function_dir', help='Lambda function directory, e.g. lambda/trigger_dag')
+    parser.add_argument('--timeout-ms', type=int, default=60000, help='Lambda timeout of each invocation (default: 60000)')
+    parser.add_argument('--fake-pubsub', action='store_true',
+                        help='Publish to an in-process fake instead of Pub/Sub or the emulator (trigger_dag only)')
+    args = parser.parse_args(argv)
+
+    # Logs go to stderr, stdout carries the protocol
+    logging.basicConfig(stream=sys.stderr, format='%(levelname)s %(message)s')
+
+    sys.path.insert(0, os.path.join(ROOT, 'shared'))
+    sys.path.insert(0, os.path.abspath(args.function_dir))
+    start = time.perf_counter()
+    import index
+    import_ms = (time.perf_counter() - start) * 1000
+
+    if args.fake_pubsub:
+        broker = FakePubSub()
+        index.create_publisher = lambda: FakePublisherClient(broker)
+
+    print(json.dumps({'ready': True, 'import_ms': round(import_ms, 3)}), flush=True)
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        start = time.perf_counter()
+        try:
+            response = index.lambda_handler(json.loads(line), FakeLambdaContext(args.timeout_ms))
+            output = {'response': response}
+        except Exception as error:
+            output = {'response': None, 'error': f"{error.__class__.__name__}: {error}"}
+        output['duration_ms'] = round((time.perf_counter() - start) * 1000, 3)
+        print(json.dumps(output, default=str), flush=True)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,290 @@
+"""
+Local end-to-end load harness for the Step Function <-> Airflow bridge.
+
+Drives the real handlers against in-process stand-ins (benchmarks/cloud_fakes.py):
+
+    producer -> trigger_dag.lambda_handler -> FakePubSub 'trigger'
+      -> parse_trigger_messages (pubsub_trigger_dag) -> DAG run registry (TriggerDagRunOperator)
+      -> hello_world_dag stand-in -> FakePubSub 'execution'
+      -> trigger_sf.lambda_handler (invoked every --sf-interval) -> FakeStepFunctions
+
+The producer sends --rate requests per second for --duration seconds. The
+harness reports throughput, p50/p99 request-to-StartExecution latency,
+duplicates (workflows started more than once, hello_world_dag runs triggered
+more than once for the same Pub/Sub message) and lost requests, and appends
+the results as one JSON line to --results for tracking over time. It exits
+non-zero if any request was lost.
+
+Usage:
+    python benchmarks/load_harness.py [--rate 50] [--duration 10] [--redelivery-rate 0.01]
+"""
+
+import argparse
+import importlib.util
+import json
+import logging
+import math
+import os
+import platform
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'shared'))
+sys.path.insert(0, os.path.join(ROOT, 'dags'))
+sys.path.insert(0, os.path.join(ROOT, 'lambda', 'trigger_sf'))
+
+from cloud_fakes import (  # noqa: E402
+    FakeLambdaContext, FakePubSub, FakePublisherClient, FakeStepFunctions, FakeSubscriberClient
+)
+
+TRIGGER_TOPIC = 'projects/local/topics/trigger'
+TRIGGER_SUBSCRIPTION = 'projects/local/subscriptions/trigger'
+EXECUTION_TOPIC = 'projects/local/topics/execution'
+EXECUTION_SUBSCRIPTION = 'projects/local/subscriptions/execution'
+STATE_MACHINE_ARN = 'arn:aws:states:local:000000000000:stateMachine:hello-world-end'
+
+DEFAULT_RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results', 'load_harness.jsonl')
+
+
+def load_module(name, path):
+    """Import a handler module under a unique name (both Lambdas are called index.py)"""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_handlers(coalesce=False):
+    """Configure the handlers through their environment variables, then import them"""
+    os.environ['PUBSUB_TOPIC_ID'] = TRIGGER_TOPIC
+    os.environ['PUBSUB_SUBSCRIPTION_PATH'] = EXECUTION_SUBSCRIPTION
+    os.environ['STEP_FUNCTION_ARN'] = STATE_MACHINE_ARN
+    os.environ['DEDUP_PERSIST_PATH'] = ''
+    os.environ.setdefault('DRAIN_MODE', 'true')
+    os.environ.setdefault('DRAIN_SAFETY_MARGIN_MS', '1000')
+    os.environ.setdefault('RETRY_ACK_DEADLINE_SECONDS', '1')
+    if coalesce:
+        os.environ['COALESCE_MODE'] = 'true'
+
+    trigger_dag = load_module('trigger_dag_index', os.path.join(ROOT, 'lambda', 'trigger_dag', 'index.py'))
+    trigger_sf = load_module('trigger_sf_index', os.path.join(ROOT, 'lambda', 'trigger_sf', 'index.py'))
+    import trigger_messages
+    return trigger_dag, trigger_sf, trigger_messages
+
+
+class Harness:
+    def __init__(self, args, trigger_dag, trigger_sf, trigger_messages):
+        self.args = args
+        self.trigger_dag = trigger_dag
+        self.trigger_sf = trigger_sf
+        self.trigger_messages = trigger_messages
+
+        self.broker = FakePubSub(redelivery_rate=args.redelivery_rate, seed=args.seed)
+        self.broker.create_subscription(TRIGGER_TOPIC, TRIGGER_SUBSCRIPTION)
+        self.broker.create_subscription(EXECUTION_TOPIC, EXECUTION_SUBSCRIPTION)
+        self.sfn = FakeStepFunctions(latency_ms=args.sfn_latency_ms, throttle_rate=args.sfn_throttle_rate, seed=args.seed)
+
+        # Point the handlers at the stand-ins
+        trigger_dag.create_publisher = lambda: FakePublisherClient(self.broker)
+        trigger_sf.create_sfn_client = lambda: self.sfn
+        trigger_sf.create_subscriber = lambda: FakeSubscriberClient(self.broker)
+
+        self.sent = {}             # workflow_id -> monotonic send time
+        self.dag_runs = set()      # trigger_run_id of triggered hello_world_dag runs
+        self.triggered_messages = {}  # Pub/Sub message_id -> hello_world_dag runs triggered for it
+        self.publish_failures = 0
+        self.sf_invocations = 0
+        self.stopped = threading.Event()
+
+    def produce(self):
+        """Invoke trigger_dag at the configured rate"""
+        count = int(self.args.rate * self.args.duration)
+        start = time.monotonic()
+        for i in range(count):
+            delay = start + i / self.args.rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            workflow_id = f"load-{i}"
+            self.sent[workflow_id] = time.monotonic()
+            response = self.trigger_dag.lambda_handler(
+                {'workflow_id': workflow_id, 'execution_id': str(i)}, FakeLambdaContext(self.args.lambda_timeout_ms)
+            )
+            if not response.get('success'):
+                self.publish_failures += 1
+
+    def run_dags(self):
+        """pubsub_trigger_dag runs back to back, each triggering hello_world_dag runs for one batch"""
+        while not self.stopped.is_set():
+            received = self.broker.pull(TRIGGER_SUBSCRIPTION, self.args.batch_size)
+            if not received:
+                continue
+            # The sensor acknowledges the messages before returning them
+            self.broker.acknowledge(TRIGGER_SUBSCRIPTION, [m.ack_id for m in received])
+            ts = datetime.now(timezone.utc).isoformat()
+            messages = [m.to_dict() for m in received]
+            for kwargs in self.trigger_messages.parse_trigger_messages(messages, ts):
+                self.trigger_hello_world_dag(kwargs, ts)
+            if self.args.dag_run_overhead_ms:
+                time.sleep(self.args.dag_run_overhead_ms / 1000)
+
+    def trigger_hello_world_dag(self, kwargs, ts):
+        """TriggerDagRunOperator, then the hello_world_dag tasks that publish the execution request"""
+        run_id = kwargs['trigger_run_id']
+        if run_id in self.dag_runs:
+            return
+        self.dag_runs.add(run_id)
+        message_id = run_id.rsplit('__', 1)[-1]
+        self.triggered_messages[message_id] = self.triggered_messages.get(message_id, 0) + 1
+
+        from message_codec import encode
+        from trace_context import record_hop
+
+        conf = kwargs['conf']
+        params = conf['pubsub_params']
+        log = self.trigger_messages.log
+        hello_trace = record_hop(conf, 'hello_world_dag.hello_world', log)
+        ts_nodash = ts.replace('-', '').replace(':', '').split('.')[0]
+        message = {
+            'name': f"gcp-pubsub-{ts_nodash}-{params.get('workflow_id')}-{params.get('execution_id')}",
+            'source': 'hello_world_dag',
+            'workflow_id': params.get('workflow_id'),
+            'execution_id': params.get('execution_id'),
+            'custom_message': params.get('custom_message', ''),
+            'trace': hello_trace,
+        }
+        message['trace'] = record_hop(message, 'hello_world_dag.publish_pubsub_message', log)
+        self.broker.publish(EXECUTION_TOPIC, encode(message))
+
+    def run_trigger_sf(self):
+        """trigger_sf invoked on a schedule, like the EventBridge rule"""
+        while not self.stopped.is_set():
+            self.trigger_sf.lambda_handler({}, FakeLambdaContext(self.args.lambda_timeout_ms))
+            self.sf_invocations += 1
+            self.stopped.wait(self.args.sf_interval)
+
+    def started_workflows(self):
+        """workflow_id -> sorted start times of its executions"""
+        started = {}
+        for start_time, execution_input in list(self.sfn.executions.values()):
+            execution_input = json.loads(execution_input)
+            # Coalesced executions carry one item per message
+            for item in execution_input.get('items', [execution_input]):
+                started.setdefault(item.get('workflow_id'), []).append(start_time)
+        return {workflow_id: sorted(times) for workflow_id, times in started.items()}
+
+    def settled(self):
+        return (len(self.started_workflows()) >= len(self.sent)
+                and not self.broker.backlog(TRIGGER_SUBSCRIPTION)
+                and not self.broker.backlog(EXECUTION_SUBSCRIPTION))
+
+    def run(self):
+        workers = [threading.Thread(target=target, daemon=True) for target in (self.run_dags, self.run_trigger_sf)]
+        for worker in workers:
+            worker.start()
+
+        start = time.monotonic()
+        self.produce()
+        produced = time.monotonic()
+
+        # Wait for in-flight requests (and redeliveries) to drain
+        deadline = produced + self.args.drain_timeout
+        while time.monotonic() < deadline and not self.settled():
+            time.sleep(0.1)
+        self.stopped.set()
+        for worker in workers:
+            worker.join()
+        return self.results(start, produced)
+
+    def results(self, start, produced):
+        started = self.started_workflows()
+        latencies_ms = sorted((times[0] - self.sent[workflow_id]) * 1000
+                              for workflow_id, times in started.items() if workflow_id in self.sent)
+        last_start = max((times[0] for times in started.values()), default=start)
+
+        def percentile(fraction):
+            if not latencies_ms:
+                return None
+            return round(latencies_ms[max(0, math.ceil(fraction * len(latencies_ms)) - 1)], 1)
+
+        return {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'config': {key: value for key, value in vars(self.args).items() if key != 'results'},
+            'sent': len(self.sent),
+            'started': len(started),
+            'lost': len(set(self.sent) - set(started)),
+            'duplicate_executions': sum(len(times) - 1 for times in started.values()),
+            'duplicate_dag_runs': sum(count - 1 for count in self.triggered_messages.values()),
+            'publish_failures': self.publish_failures,
+            'redelivered': self.broker.redelivered_count,
+            'executions': len(self.sfn.executions),
+            'sfn_calls': self.sfn.calls,
+            'sfn_throttled': self.sfn.throttled,
+            'trigger_sf_invocations': self.sf_invocations,
+            'produce_seconds': round(produced - start, 2),
+            'throughput_per_second': round(len(started) / (last_start - start), 1) if started else 0.0,
+            'latency_ms': {
+                'mean': round(statistics.mean(latencies_ms), 1) if latencies_ms else None,
+                'p50': percentile(0.5),
+                'p99': percentile(0.99),
+                'max': round(latencies_ms[-1], 1) if latencies_ms else None,
+            },
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rate', type=float, default=50, help='Requests per second sent to trigger_dag (default: 50)')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds to send requests for (default: 10)')
+    parser.add_argument('--batch-size', type=int, default=10,
+                        help='Messages per pubsub_trigger_dag run, PUBSUB_BATCH_SIZE (default: 10)')
+    parser.add_argument('--dag-run-overhead-ms', type=float, default=0,
+                        help='Scheduling gap between consecutive pubsub_trigger_dag runs (default: 0)')
+    parser.add_argument('--sf-interval', type=float, default=1.0,
+                        help='Seconds between trigger_sf invocations (default: 1.0)')
+    parser.add_argument('--lambda-timeout-ms', type=int, default=60000,
+                        help='Time budget of each Lambda invocation (default: 60000)')
+    parser.add_argument('--sfn-latency-ms', type=float, default=20, help='StartExecution round trip (default: 20)')
+    parser.add_argument('--sfn-throttle-rate', type=float, default=0.0,
+                        help='Fraction of StartExecution calls throttled (default: 0)')
+    parser.add_argument('--redelivery-rate', type=float, default=0.0,
+                        help='Fraction of acknowledged Pub/Sub messages redelivered anyway (default: 0)')
+    parser.add_argument('--coalesce', action='store_true',
+                        help='Run trigger_sf in coalescing mode (COALESCE_MODE=true)')
+    parser.add_argument('--drain-timeout', type=float, default=60,
+                        help='Seconds to wait for in-flight requests after the last one was sent (default: 60)')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for redelivery and throttling')
+    parser.add_argument('--results', default=DEFAULT_RESULTS,
+                        help='JSON lines file the results are appended to (default: benchmarks/results/load_harness.jsonl)')
+    parser.add_argument('--log-level', default='WARNING', help='Log level of the handlers (default: WARNING)')
+    args = parser.parse_args(argv)
+
+    trigger_dag, trigger_sf, trigger_messages = load_handlers(args.coalesce)
+    # The handlers set the root logger to INFO on import
+    logging.basicConfig(format='%(levelname)s %(message)s')
+    logging.getLogger().setLevel(args.log_level)
+
+    results = Harness(args, trigger_dag, trigger_sf, trigger_messages).run()
+
+    latency = results['latency_ms']
+    print(f"sent {results['sent']}, started {results['started']}, lost {results['lost']}, "
+          f"duplicate executions {results['duplicate_executions']}, duplicate DAG runs {results['duplicate_dag_runs']}")
+    print(f"throughput {results['throughput_per_second']}/s, latency p50 {latency['p50']} ms, "
+          f"p99 {latency['p99']} ms, max {latency['max']} ms")
+    print(f"executions {results['executions']}, StartExecution calls {results['sfn_calls']} ({results['sfn_throttled']} throttled), "
+          f"Pub/Sub redeliveries {results['redelivered']}, trigger_sf invocations {results['trigger_sf_invocations']}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.results)), exist_ok=True)
+    with open(args.results, 'a') as f:
+        f.write(json.dumps(results) + '\n')
+    print(f"Results appended to {args.results}")
+    return 1 if results['lost'] else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
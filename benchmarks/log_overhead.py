@@ -0,0 +1,76 @@
+"""
+Microbenchmark of per-invocation logging overhead.
+
+Compares the previous handler logging (f-string json.dumps(..., indent=2) at
+INFO) with shared/log_utils.StructuredLogger, with the record both emitted and
+dropped by the log level, across payload sizes.
+
+Usage:
+    python benchmarks/log_overhead.py [--iterations 2000]
+"""
+
+import argparse
+import io
+import json
+import logging
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'shared'))
+
+from log_utils import StructuredLogger  # noqa: E402
+
+PAYLOAD_SIZES = (256, 4 * 1024, 64 * 1024)
+
+
+def make_payload(size):
+    """Event-like payload whose JSON serialization is roughly size bytes"""
+    return {
+        'workflow_id': 'workflow-1',
+        'execution_id': '42',
+        'items': [{'key': f'key-{i}', 'value': 'x' * 40} for i in range(max(1, size // 64))]
+    }
+
+
+def make_logger(level):
+    logger = logging.getLogger(f'bench-{level}')
+    logger.handlers = [logging.StreamHandler(io.StringIO())]
+    logger.propagate = False
+    logger.setLevel(level)
+    return logger
+
+
+def legacy_invocation(logger, event, result):
+    logger.info('Lambda function started')
+    logger.info(f'Event: {json.dumps(event, indent=2)}')
+    logger.info(f'Result: {json.dumps(result, indent=2)}')
+
+
+def structured_invocation(log, event, result):
+    log.info('lambda_started', event=event)
+    log.info('lambda_result', result=result)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    print(f"{'payload':>10} {'level':>8} {'legacy us':>12} {'structured us':>14} {'speedup':>8}")
+    for size in PAYLOAD_SIZES:
+        event = make_payload(size)
+        result = {'message': 'done', 'success': True}
+        for level in (logging.INFO, logging.WARNING):
+            logger = make_logger(level)
+            log = StructuredLogger(logger)
+            legacy = timeit.timeit(lambda: legacy_invocation(logger, event, result), number=args.iterations)
+            structured = timeit.timeit(lambda: structured_invocation(log, event, result), number=args.iterations)
+            legacy_us = legacy / args.iterations * 1e6
+            structured_us = structured / args.iterations * 1e6
+            print(f"{size:>10} {logging.getLevelName(level):>8} {legacy_us:>12.1f} {structured_us:>14.1f} "
+                  f"{legacy_us / structured_us:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""
+Per-hop latency report of the Step Function <-> Airflow loop.
+
+Reads the 'trace_hop' records logged by shared/trace_context.py (and the Go
+trigger_dag Lambda) from exported log files, one record per line. Lines may
+be bare JSON records, Lambda log lines with a prefix before the JSON, or
+Cloud Logging JSON exports with the record in jsonPayload / textPayload /
+message. Records of the same trace are merged into branches (the Pub/Sub and
+the direct Step Function path fork in hello_world_dag), then the report shows
+a latency histogram per hop transition and the critical path of the traces.
+
+Usage:
+    python benchmarks/trace_report.py lambda_logs.txt composer_logs.json [...]
+    cat logs.txt | python benchmarks/trace_report.py -
+"""
+
+import argparse
+import json
+import math
+import statistics
+import sys
+from collections import Counter, defaultdict
+
+# Histogram bucket upper bounds in milliseconds
+BUCKETS_MS = (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, math.inf)
+BAR_WIDTH = 40
+
+
+def parse_record(line):
+    """Return the trace_hop record in a log line, else None"""
+    start = line.find('{')
+    if start < 0:
+        return None
+    try:
+        record = json.loads(line[start:])
+    except ValueError:
+        return None
+    return unwrap_record(record)
+
+
+def unwrap_record(record):
+    """Find the trace_hop record in a log record or a log export entry"""
+    if not isinstance(record, dict):
+        return None
+    if record.get('msg') == 'trace_hop' and isinstance(record.get('trace'), dict):
+        return record
+    for key in ('jsonPayload', 'textPayload', 'message'):
+        value = record.get(key)
+        if isinstance(value, str):
+            value = parse_record(value)
+        found = unwrap_record(value)
+        if found:
+            return found
+    return None
+
+
+def collect_branches(lines):
+    """
+    Merge the hops of all records by trace.
+
+    Returns:
+        dict: trace_id -> list of branches, each a list of (hop, ts) tuples. Branches that
+        are a prefix of another branch of the same trace are dropped.
+    """
+    sequences = defaultdict(set)
+    for line in lines:
+        record = parse_record(line)
+        if not record:
+            continue
+        trace = record['trace']
+        hops = tuple((hop.get('hop'), hop.get('ts')) for hop in trace.get('hops', []) if isinstance(hop, dict))
+        if trace.get('trace_id') and hops:
+            sequences[trace['trace_id']].add(hops)
+
+    branches = {}
+    for trace_id, hop_sequences in sequences.items():
+        branches[trace_id] = [
+            list(sequence) for sequence in hop_sequences
+            if not any(other != sequence and other[:len(sequence)] == sequence for other in hop_sequences)
+        ]
+    return branches
+
+
+def transition_latencies(branches):
+    """Latency in milliseconds of every hop transition, counting transitions shared by branches once"""
+    latencies = defaultdict(list)
+    for trace_id, trace_branches in branches.items():
+        seen = set()
+        for branch in trace_branches:
+            for index in range(1, len(branch)):
+                key = tuple(branch[:index + 1])
+                if key in seen:
+                    continue
+                seen.add(key)
+                (previous_hop, previous_ts), (hop, ts) = branch[index - 1], branch[index]
+                latencies[f"{previous_hop} -> {hop}"].append(ts - previous_ts)
+    return latencies
+
+
+def critical_paths(branches):
+    """
+    Return the critical path of each trace: the branch that finished last.
+
+    Returns:
+        list: (hop names, end-to-end ms, [(transition, ms), ...]) per trace
+    """
+    paths = []
+    for trace_branches in branches.values():
+        branch = max(trace_branches, key=lambda b: b[-1][1])
+        if len(branch) < 2:
+            continue
+        transitions = [(f"{branch[i - 1][0]} -> {branch[i][0]}", branch[i][1] - branch[i - 1][1])
+                       for i in range(1, len(branch))]
+        paths.append((tuple(hop for hop, _ in branch), branch[-1][1] - branch[0][1], transitions))
+    return paths
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def print_histogram(values):
+    counts = Counter(next(bound for bound in BUCKETS_MS if value <= bound) for value in values)
+    largest = max(counts.values())
+    for bound in BUCKETS_MS:
+        if not counts[bound]:
+            continue
+        label = '> 60000' if bound == math.inf else f"<= {bound}"
+        bar = '#' * max(1, round(counts[bound] / largest * BAR_WIDTH))
+        print(f"    {label:>9} ms {counts[bound]:>6} {bar}")
+
+
+def report(branches):
+    latencies = transition_latencies(branches)
+    print(f"{len(branches)} traces, {sum(len(b) for b in branches.values())} branches\n")
+
+    print('Per-hop latency (ms)')
+    for transition, values in sorted(latencies.items(), key=lambda item: -statistics.mean(item[1])):
+        print(f"  {transition}: n={len(values)} mean={statistics.mean(values):.0f} "
+              f"p50={percentile(values, 0.5):.0f} p95={percentile(values, 0.95):.0f} max={max(values):.0f}")
+        print_histogram(values)
+
+    paths = critical_paths(branches)
+    if not paths:
+        return
+    print('\nCritical path')
+    path_counts = Counter(hops for hops, _, _ in paths)
+    hops, count = path_counts.most_common(1)[0]
+    print(f"  most common ({count} of {len(paths)} traces): {' -> '.join(hops)}")
+
+    end_to_end = [total for _, total, _ in paths]
+    print(f"  end-to-end: mean={statistics.mean(end_to_end):.0f} ms p95={percentile(end_to_end, 0.95):.0f} ms")
+
+    contributions = defaultdict(list)
+    for _, total, transitions in paths:
+        for transition, ms in transitions:
+            contributions[transition].append((ms, ms / total if total else 0))
+    print('  share of the critical path per transition:')
+    for transition, values in sorted(contributions.items(), key=lambda item: -sum(ms for ms, _ in item[1])):
+        print(f"    {transition}: mean={statistics.mean(ms for ms, _ in values):.0f} ms "
+              f"share={statistics.mean(share for _, share in values):.0%} (on {len(values)} critical paths)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('files', nargs='+', help="Exported log files, '-' for stdin")
+    args = parser.parse_args(argv)
+
+    lines = []
+    for path in args.files:
+        if path == '-':
+            lines.extend(sys.stdin)
+        else:
+            with open(path) as f:
+                lines.extend(f)
+
+    branches = collect_branches(lines)
+    if not branches:
+        print('No trace_hop records found')
+        return 1
+    report(branches)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
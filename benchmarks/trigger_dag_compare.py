@@ -0,0 +1,194 @@
+"""
+Python vs Go trigger_dag comparison.
+
+Runs lambda/trigger_dag/index.py (through benchmarks/lambda_shim.py) and the
+Go trigger_dag (built with go build, run with TRIGGER_DAG_LOCAL=true) as
+local processes. Both speak the same stdin/stdout protocol and publish to the
+Pub/Sub emulator. For every implementation and payload size a fresh process
+measures:
+
+- cold init: process start until the handler is ready
+- first invocation: includes creating the Pub/Sub client
+- warm latency: p50/p99 of the following invocations, timed inside the process
+- throughput: sequential invocations (one publish each) per second
+- peak RSS of the process
+
+The payload size is the length of the workflow_id, which the handlers copy
+into the published message twice.
+
+Start the emulator first (gcloud beta emulators pubsub start) and export
+PUBSUB_EMULATOR_HOST. Without it only the Python handler runs, publishing to
+the in-process fake from benchmarks/cloud_fakes.py, and Go is skipped.
+
+Usage:
+    PUBSUB_EMULATOR_HOST=localhost:8085 python benchmarks/trigger_dag_compare.py [--sizes 100,10000] [--invocations 200]
+"""
+
+import argparse
+import json
+import math
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(BENCHMARKS_DIR, '..')
+GO_SOURCE_DIR = os.path.join(ROOT, 'lambda', 'trigger_dag_go')
+DEFAULT_RESULTS = os.path.join(BENCHMARKS_DIR, 'results', 'trigger_dag_compare.json')
+
+
+def ensure_topic(emulator_host, project_id, topic):
+    """Create the topic on the emulator through its REST API, if it does not exist yet"""
+    request = urllib.request.Request(
+        f"http://{emulator_host}/v1/projects/{project_id}/topics/{topic}", data=b'{}', method='PUT',
+        headers={'Content-Type': 'application/json'}
+    )
+    try:
+        urllib.request.urlopen(request, timeout=10).close()
+    except urllib.error.HTTPError as error:
+        if error.code != 409:
+            raise
+
+
+def build_go(output_dir):
+    """
+    Build the Go trigger_dag for this machine.
+
+    Returns:
+        tuple: (binary path or None, reason it is missing)
+    """
+    if shutil.which('go') is None:
+        return None, 'go is not installed'
+    binary = os.path.join(output_dir, 'trigger_dag_go')
+    result = subprocess.run(['go', 'build', '-o', binary, '.'], cwd=GO_SOURCE_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        return None, f"go build failed: {result.stderr.strip().splitlines()[-1] if result.stderr.strip() else result.returncode}"
+    return binary, None
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)] if ordered else None
+
+
+def run_case(command, env, payload_bytes, invocations):
+    """Start one handler process, invoke it invocations times and collect its measurements"""
+    spawn = time.perf_counter()
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                               env=env, text=True, bufsize=1)
+    ready = json.loads(process.stdout.readline())
+    init_ms = (time.perf_counter() - spawn) * 1000
+
+    durations = []
+    failures = 0
+    loop_start = time.perf_counter()
+    for i in range(invocations):
+        event = {'workflow_id': f"bench-{i}-".ljust(payload_bytes, 'x'), 'execution_id': str(i)}
+        process.stdin.write(json.dumps(event) + '\n')
+        process.stdin.flush()
+        output = json.loads(process.stdout.readline())
+        durations.append(output['duration_ms'])
+        if output.get('error') or not (output.get('response') or {}).get('success'):
+            failures += 1
+    wall_seconds = time.perf_counter() - loop_start
+
+    process.stdin.close()
+    _, _, usage = os.wait4(process.pid, 0)
+    process.returncode = 0
+    process.stdout.close()
+
+    warm = durations[1:]
+    return {
+        'init_ms': round(init_ms, 1),
+        'import_ms': ready.get('import_ms'),
+        'first_invocation_ms': round(durations[0], 2),
+        'warm_p50_ms': round(percentile(warm, 0.5), 3) if warm else None,
+        'warm_p99_ms': round(percentile(warm, 0.99), 3) if warm else None,
+        'warm_mean_ms': round(statistics.mean(warm), 3) if warm else None,
+        'throughput_per_second': round(invocations / wall_seconds, 1),
+        'peak_rss_mb': round(usage.ru_maxrss / 1024, 1),  # ru_maxrss is in KB on Linux
+        'failures': failures,
+    }
+
+
+def print_report(results, skipped):
+    columns = ('init_ms', 'first_invocation_ms', 'warm_p50_ms', 'warm_p99_ms', 'throughput_per_second',
+               'peak_rss_mb', 'failures')
+    print('| Implementation | Payload (B) | Cold init (ms) | First invocation (ms) | Warm p50 (ms) | Warm p99 (ms) '
+          '| Throughput (/s) | Peak RSS (MB) | Failures |')
+    print('|---|---:|---:|---:|---:|---:|---:|---:|---:|')
+    for result in results:
+        values = ' | '.join(str(result[column]) for column in columns)
+        print(f"| {result['implementation']} | {result['payload_bytes']} | {values} |")
+
+    by_case = {(r['implementation'], r['payload_bytes']): r for r in results}
+    ratios = []
+    for (implementation, payload_bytes), python in by_case.items():
+        go = by_case.get(('go', payload_bytes))
+        if implementation == 'python' and go and go['warm_p50_ms']:
+            ratios.append(f"  {payload_bytes} B: warm p50 python/go = {python['warm_p50_ms'] / go['warm_p50_ms']:.2f}x, "
+                          f"cold init python/go = {python['init_ms'] / go['init_ms']:.2f}x, "
+                          f"peak RSS python/go = {python['peak_rss_mb'] / go['peak_rss_mb']:.2f}x")
+    if ratios:
+        print('\nPython relative to Go')
+        print('\n'.join(ratios))
+    for implementation, reason in skipped.items():
+        print(f"\n{implementation} skipped: {reason}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', default='100,1000,10000,100000', help='Payload sizes in bytes (default: 100,1000,10000,100000)')
+    parser.add_argument('--invocations', type=int, default=200, help='Invocations per process (default: 200)')
+    parser.add_argument('--project', default='local-project', help='Emulator project (default: local-project)')
+    parser.add_argument('--topic', default='trigger-dag-bench', help='Emulator topic (default: trigger-dag-bench)')
+    parser.add_argument('--go-binary', help='Prebuilt Go trigger_dag binary (default: go build into a temporary directory)')
+    parser.add_argument('--results', default=DEFAULT_RESULTS,
+                        help='JSON results file (default: benchmarks/results/trigger_dag_compare.json)')
+    args = parser.parse_args(argv)
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    emulator_host = os.environ.get('PUBSUB_EMULATOR_HOST')
+    env = dict(os.environ, GCP_PROJECT_ID=args.project, PUBSUB_TOPIC_ID=f"projects/{args.project}/topics/{args.topic}",
+               DIAGNOSTICS='false', TRIGGER_DAG_LOCAL='true')
+    python_command = [sys.executable, os.path.join(BENCHMARKS_DIR, 'lambda_shim.py'), os.path.join(ROOT, 'lambda', 'trigger_dag')]
+
+    implementations = {}
+    skipped = {}
+    with tempfile.TemporaryDirectory() as build_dir:
+        if emulator_host:
+            ensure_topic(emulator_host, args.project, args.topic)
+            implementations['python'] = python_command
+            go_binary, reason = (args.go_binary, None) if args.go_binary else build_go(build_dir)
+            if go_binary:
+                implementations['go'] = [go_binary]
+            else:
+                skipped['go'] = reason
+        else:
+            implementations['python'] = python_command + ['--fake-pubsub']
+            skipped['go'] = 'PUBSUB_EMULATOR_HOST is not set (Python ran against the in-process fake)'
+
+        results = []
+        for payload_bytes in sizes:
+            for implementation, command in implementations.items():
+                result = run_case(command, env, payload_bytes, args.invocations)
+                results.append({'implementation': implementation, 'payload_bytes': payload_bytes, **result})
+
+    print_report(results, skipped)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.results)), exist_ok=True)
+    with open(args.results, 'w') as f:
+        json.dump({'emulator': bool(emulator_host), 'invocations': args.invocations, 'results': results,
+                   'skipped': skipped}, f, indent=2)
+    print(f"\nResults written to {args.results}")
+    return 1 if any(result['failures'] for result in results) else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
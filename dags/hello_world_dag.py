@@ -7,18 +7,38 @@ from datetime import datetime, timedelta
 import json
 import os
 import logging
+import time
 from airflow import DAG
 from airflow.decorators import task
 from airflow.operators.python import get_current_context
 from airflow.operators.python import PythonOperator
 from airflow.operators.bash import BashOperator
 from airflow.operators.empty import EmptyOperator
-from airflow.providers.amazon.aws.operators.step_function import StepFunctionStartExecutionOperator
-from airflow.providers.google.cloud.operators.pubsub import PubSubPublishMessageOperator
+from log_utils import StructuredLogger
+from trace_context import find_trace, record_hop
+
+# The DAG layout is a set of constants Terraform renders next to this file, not environment lookups, so
+# the scheduler and every worker parse the same DAG shape. Without the file the defaults below apply.
+try:
+    import hello_world_dag_layout as layout
+except ImportError:
+    layout = None
+# Run the start -> hello_world -> print_timestamp -> bash_hello chain in one task instance
+HELLO_WORLD_FUSED_STEPS = getattr(layout, 'HELLO_WORLD_FUSED_STEPS', False)
+# Map the tasks over a list of workflow payloads; otherwise a run carries exactly one, with unmapped tasks
+HELLO_WORLD_BATCH_MODE = getattr(layout, 'HELLO_WORLD_BATCH_MODE', False)
+# Maximum number of direct Step Function starts running at once per DAG run in batch mode
+STEP_FUNCTION_START_CONCURRENCY = getattr(layout, 'STEP_FUNCTION_START_CONCURRENCY', 10)
+
+BASH_HELLO_COMMAND = 'echo "Hello from Bash operator!" && date'
+
+# Airflow re-parses this file continuously and every task run parses it again, so the
+# provider hooks and environment lookups live inside the task callables that need them
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
+log = StructuredLogger(logger)
 
 # Default arguments for the DAG
 default_args = {
@@ -31,19 +51,58 @@ default_args = {
     'retry_delay': timedelta(minutes=5),
 }
 
-def encode_message(message) -> bytes:
-    print(f"Raw message: {message}")
-    logger.info(f"Raw message: {message}")
-    logger.info(f"Raw message type: {type(message)}")
+def get_pubsub_params(context):
+    """
+    Return the Pub/Sub parameters of the DAG run, decoded once by pubsub_trigger_dag:
+    a dict, or a list of dicts for a batch run
+    """
+    conf = context.get('dag_run', {}).conf or {}
+    pubsub_params = conf.get('pubsub_params') or {}
+    # Runs triggered before pubsub_trigger_dag passed dicts carry a JSON string
+    if isinstance(pubsub_params, str):
+        pubsub_params = json.loads(pubsub_params)
+    return pubsub_params
+
+
+def get_workflow_payloads(context):
+    """
+    Split the DAG run conf into one payload per workflow, the op_kwargs of the mapped tasks.
+
+    A single pubsub_params dict (or none, for manual runs) gives one payload with
+    batch_index None, which the tasks treat exactly like before batch mode. A list
+    gives one payload per entry; an entry may carry its own trace, otherwise the
+    trace of the run is continued.
+    """
+    conf = context['dag_run'].conf or {}
+    pubsub_params = get_pubsub_params(context)
+    if not isinstance(pubsub_params, list):
+        return [{'pubsub_params': pubsub_params, 'trace': find_trace(conf), 'batch_index': None}]
+    return [
+        {
+            'pubsub_params': {key: value for key, value in params.items() if key != 'trace'},
+            'trace': find_trace(params) or find_trace(conf),
+            'batch_index': batch_index
+        }
+        for batch_index, params in enumerate(pubsub_params)
+    ]
+
 
-    json_message = json.dumps(message)
-    logger.info(f"Encoded message: {json_message}")
-    logger.info(f"Encoded message type: {type(json_message)}")
+def layout_payloads(context):
+    """The run's workflow payloads: any number in batch mode, exactly one otherwise"""
+    payloads = get_workflow_payloads(context)
+    if not HELLO_WORLD_BATCH_MODE and len(payloads) != 1:
+        raise ValueError(f"Got {len(payloads)} workflow payloads, but hello_world_dag is deployed without "
+                         f"batch mode (hello_world_batch_mode)")
+    return payloads
 
-    binary_encoded_message = json_message.encode('utf-8')
-    logger.info(f"Binary encoded message: {binary_encoded_message}")
-    logger.info(f"Binary encoded message type: {type(binary_encoded_message)}")
-    return binary_encoded_message
+
+def execution_name(prefix, ts_nodash, hello_result):
+    """Step Function execution name of a workflow, suffixed with its batch index in batch runs"""
+    name = (f"{prefix}-{ts_nodash}-{str(hello_result.get('workflow_id', 'unknown')).replace(' ', '_')}"
+            f"-{str(hello_result.get('execution_id', 'unknown')).replace(' ', '_')}")
+    if hello_result.get('batch_index') is not None:
+        name = f"{name}-{hello_result['batch_index']}"
+    return name
 
 
 # Define the DAG
@@ -53,36 +112,38 @@ dag = DAG(
     description='A simple Hello World DAG',
     schedule_interval=timedelta(days=1),
     catchup=False,
-    user_defined_macros={"encode_message": encode_message},
     tags=['example', 'hello-world'],
 )
 
 # Define tasks
-start_task = EmptyOperator(
-    task_id='start',
-    dag=dag,
-)
+@task(task_id='workflow_payloads')
+def workflow_payloads():
+    """One payload per workflow of the run, hello_world and print_timestamp are mapped over them"""
+    payloads = get_workflow_payloads(get_current_context())
+    log.info('workflow_payloads', count=len(payloads), batch=payloads[0]['batch_index'] is not None)
+    return payloads
 
-def print_hello(**context):
-    """Print hello message with optional parameters from Pub/Sub"""
-    # Get configuration parameters if triggered by another DAG
-    conf = context.get('dag_run', {}).conf or {}
-    pubsub_params = json.loads(conf.get('pubsub_params', {}))
+def print_hello(pubsub_params, trace=None, batch_index=None, **context):
+    """Print hello message with optional parameters from Pub/Sub, for one workflow of the run"""
+    # Continue the trace of the triggering message, or start one for manual runs
+    trace = record_hop({'trace': trace}, 'hello_world_dag.hello_world', log)
 
     if pubsub_params:
         workflow_id = pubsub_params.get('workflow_id', 'unknown')
         execution_id = pubsub_params.get('execution_id', 'unknown')
 
-        print(f"Workflow ID: {workflow_id}")
-        print(f"Execution ID: {execution_id}")
-
         custom_message = pubsub_params.get('custom_message', 'Hello, World!')
         source = pubsub_params.get('source', 'unknown')
         trigger_time = pubsub_params.get('timestamp', 'unknown')
-        print(f"Hello, World! This is a simple Airflow DAG.")
-        print(f"Custom message: {custom_message}")
-        print(f"Triggered by: {source}")
-        print(f"Trigger time: {trigger_time}")
+        log.info(
+            'hello_world',
+            message="Hello, World! This is a simple Airflow DAG.",
+            workflow_id=workflow_id,
+            execution_id=execution_id,
+            custom_message=custom_message,
+            source=source,
+            trigger_time=trigger_time
+        )
         
         # Safely increment execution_id, handling strings and non-numeric values
         try:
@@ -92,113 +153,241 @@ def print_hello(**context):
             int_execution_id = 0
         
         # Return dictionary with all data - this will be stored in XCom
-        return {
+        result = {
             'message': f"Hello World completed successfully with custom message: {custom_message}",
             'workflow_id': workflow_id,
             'execution_id': int_execution_id + 1,
             'custom_message': custom_message,
             'source': source,
-            'trigger_time': trigger_time
+            'trigger_time': trigger_time,
+            'trace': trace
         }
     else:
-        print("Hello, World! This is a simple Airflow DAG.")
-        return {
+        log.info('hello_world', message="Hello, World! This is a simple Airflow DAG.")
+        result = {
             'message': "Hello World completed successfully",
             'workflow_id': 'unknown',
-            'execution_id': 'unknown'
+            'execution_id': 'unknown',
+            'trace': trace
         }
 
-hello_task = PythonOperator(
-    task_id='hello_world',
-    python_callable=print_hello,
-    dag=dag,
-)
+    # Batch runs name the executions of each workflow after its position in the batch
+    if batch_index is not None:
+        result['batch_index'] = batch_index
+    return result
 
-def print_timestamp(**context):
-    """Print current timestamp with optional parameters from Pub/Sub"""
+def print_timestamp(pubsub_params, trace=None, batch_index=None, **context):
+    """Print current timestamp with optional parameters from Pub/Sub, for one workflow of the run"""
     current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    print(f"Current timestamp: {current_time}")
-    
-    # Get configuration parameters if triggered by another DAG
-    conf = context.get('dag_run', {}).conf or {}
-    pubsub_params = json.loads(conf.get('pubsub_params', {}))
 
     if pubsub_params:
         trigger_time = pubsub_params.get('timestamp', 'unknown')
-        print(f"Pub/Sub trigger time: {trigger_time}")
+        log.info('timestamp', current_time=current_time, pubsub_trigger_time=trigger_time)
         return f"Timestamp printed: {current_time} (triggered from Pub/Sub at {trigger_time})"
     else:
+        log.info('timestamp', current_time=current_time)
         return f"Timestamp printed: {current_time}"
 
-timestamp_task = PythonOperator(
-    task_id='print_timestamp',
-    python_callable=print_timestamp,
-    dag=dag,
-)
+def print_hello_single(**context):
+    """print_hello for the run's single payload, the unmapped hello_world task outside batch mode"""
+    payload, = layout_payloads(context)
+    return print_hello(**payload)
 
-bash_task = BashOperator(
-    task_id='bash_hello',
-    bash_command='echo "Hello from Bash operator!" && date',
-    dag=dag,
-)
+def print_timestamp_single(**context):
+    """print_timestamp for the run's single payload, the unmapped print_timestamp task outside batch mode"""
+    payload, = layout_payloads(context)
+    return print_timestamp(**payload)
 
-# AWS Step Function trigger task (direct)
-trigger_aws_step_function_direct = StepFunctionStartExecutionOperator(
-    task_id='trigger_aws_step_function',
-    state_machine_arn=os.environ.get('AWS_STEP_FUNCTION_ARN'),
-    name='gcp-direct-{{ ts_nodash }}-{{ ti.xcom_pull(task_ids="hello_world").workflow_id|string|replace(" ", "_") }}-{{ ti.xcom_pull(task_ids="hello_world").execution_id|string|replace(" ", "_") }}',
-    state_machine_input={
-        'source': 'gcp-composer-direct',
-        'triggered_by': 'hello_world_dag',
-        'trigger_time': '{{ ts }}',
-        'dag_run_id': '{{ dag_run.run_id }}',
-        'workflow_id': '{{ ti.xcom_pull(task_ids="hello_world").workflow_id }}',
-        'execution_id': '{{ ti.xcom_pull(task_ids="hello_world").execution_id }}',
-        'custom_message': '{{ ti.xcom_pull(task_ids="hello_world").custom_message }}',
-        'timestamp': '{{ ts }}',
-        'trigger_type': 'direct'
-    },
-    aws_conn_id='aws_default',  # This will use the WIF credentials
-    dag=dag,
-)
+def bash_hello():
+    """In-process equivalent of BASH_HELLO_COMMAND, returns what date prints like the BashOperator XCom"""
+    log.info('bash_hello', message="Hello from Bash operator!")
+    return datetime.now().astimezone().strftime('%a %b %e %H:%M:%S %Z %Y')
 
-@task
-def create_pubsub_message():
-    """Create Pub/Sub message with proper JSON encoding at runtime"""
+@task(task_id='hello_world', dag=dag)
+def run_fused_steps():
+    """
+    Run the workflow_payloads, hello_world, print_timestamp and bash_hello steps in this task instance.
+
+    Returns the hello_world results, one per workflow in batch mode, else the single result
+    dict, so downstream tasks and XCom readers see the same values as in the per-task layout.
+    The print_timestamp and bash_hello outputs and the per-step timings are pushed under
+    XCom keys named after the steps and 'step_timings'; the print_timestamp and bash_hello
+    shim tasks return the first two under their own task_ids.
+    """
     context = get_current_context()
-    # Get XCom data from hello_world task
-    hello_result = context['ti'].xcom_pull(task_ids='hello_world') or {}
+    timings = {}
 
-    # Create the message data
-    message_data = {
-        'name': f"gcp-pubsub-{context['ts_nodash']}-{str(hello_result.get('workflow_id', 'unknown')).replace(' ', '_')}-{str(hello_result.get('execution_id', 'unknown')).replace(' ', '_')}",
-        'source': 'hello_world_dag',
+    def timed(step, step_callable, *args, **kwargs):
+        start = time.perf_counter()
+        result = step_callable(*args, **kwargs)
+        totals = timings.setdefault(step, [0.0, 0])
+        totals[0] += time.perf_counter() - start
+        totals[1] += 1
+        return result
+
+    payloads = timed('workflow_payloads', layout_payloads, context)
+    hello_results = [timed('hello_world', print_hello, **payload) for payload in payloads]
+    timestamps = [timed('print_timestamp', print_timestamp, **payload) for payload in payloads]
+    bash_output = timed('bash_hello', bash_hello)
+
+    step_timings = [
+        {"step": step, "durationMs": round(seconds * 1000, 2), "count": count}
+        for step, (seconds, count) in timings.items()
+    ]
+    log.info('fused_steps_completed', workflow_count=len(payloads), steps=step_timings)
+
+    if not HELLO_WORLD_BATCH_MODE:
+        hello_results, timestamps = hello_results[0], timestamps[0]
+
+    ti = context['ti']
+    ti.xcom_push(key='print_timestamp', value=timestamps)
+    ti.xcom_push(key='bash_hello', value=bash_output)
+    ti.xcom_push(key='step_timings', value=step_timings)
+    return hello_results
+
+@task(task_id='print_timestamp')
+def print_timestamp_xcom():
+    """Fused layout: return the print_timestamp results so XCom readers of the print_timestamp task_id still find them"""
+    return get_current_context()['ti'].xcom_pull(task_ids='hello_world', key='print_timestamp')
+
+@task(task_id='bash_hello')
+def bash_hello_xcom():
+    """Fused layout: return the bash_hello output so XCom readers of the bash_hello task_id still find it"""
+    return get_current_context()['ti'].xcom_pull(task_ids='hello_world', key='bash_hello')
+
+if HELLO_WORLD_FUSED_STEPS:
+    # One task instance instead of five, with the same hello_world XCom. The print_timestamp and bash_hello
+    # shims only copy XComs, off the path to the Step Function triggers
+    hello_task = run_fused_steps()
+    xcom_shims = [print_timestamp_xcom(), bash_hello_xcom()]
+    hello_task >> xcom_shims
+    chain_tail = hello_task
+else:
+    # Per-task layout, e.g. for debugging a single step
+    start_task = EmptyOperator(
+        task_id='start',
+        dag=dag,
+    )
+
+    if HELLO_WORLD_BATCH_MODE:
+        payloads = workflow_payloads()
+
+        # Mapped over the workflow payloads: one task instance per workflow
+        hello_task = PythonOperator.partial(
+            task_id='hello_world',
+            python_callable=print_hello,
+            dag=dag,
+        ).expand(op_kwargs=payloads)
+
+        timestamp_task = PythonOperator.partial(
+            task_id='print_timestamp',
+            python_callable=print_timestamp,
+            dag=dag,
+        ).expand(op_kwargs=payloads)
+
+        start_task >> payloads
+    else:
+        # One payload per run: unmapped tasks with the dict and string XComs of the pre-batch DAG
+        hello_task = PythonOperator(
+            task_id='hello_world',
+            python_callable=print_hello_single,
+            dag=dag,
+        )
+
+        timestamp_task = PythonOperator(
+            task_id='print_timestamp',
+            python_callable=print_timestamp_single,
+            dag=dag,
+        )
+
+    bash_task = BashOperator(
+        task_id='bash_hello',
+        bash_command=BASH_HELLO_COMMAND,
+        dag=dag,
+    )
+
+    start_task >> hello_task >> timestamp_task >> bash_task
+    chain_tail = bash_task
+    xcom_shims = []
+
+@task(task_id='trigger_aws_step_function', max_active_tis_per_dagrun=STEP_FUNCTION_START_CONCURRENCY)
+def start_step_function_execution(hello_result):
+    """Start the AWS Step Function execution of one workflow, mapped over the hello_world results in batch mode"""
+    from airflow.providers.amazon.aws.hooks.step_function import StepFunctionHook
+
+    context = get_current_context()
+    state_machine_input = {
+        'source': 'gcp-composer-direct',
         'triggered_by': 'hello_world_dag',
         'trigger_time': context['ts'],
         'dag_run_id': context['dag_run'].run_id,
         'workflow_id': hello_result.get('workflow_id', 'unknown'),
         'execution_id': hello_result.get('execution_id', 'unknown'),
-        'custom_message': hello_result.get('custom_message', ''), 
+        'custom_message': hello_result.get('custom_message', ''),
         'timestamp': context['ts'],
-        'trigger_type': 'pubsub'
+        'trigger_type': 'direct',
+        'trace': record_hop(hello_result, 'hello_world_dag.trigger_aws_step_function', log)
     }
-    
-    # Return the JSON-encoded message as bytes
-    return message_data
 
-pubsub_message = create_pubsub_message()
+    hook = StepFunctionHook(aws_conn_id='aws_default')  # This will use the WIF credentials
+    execution_arn = hook.start_execution(
+        state_machine_arn=os.environ.get('AWS_STEP_FUNCTION_ARN'),
+        name=execution_name('gcp-direct', context['ts_nodash'], hello_result),
+        state_machine_input=state_machine_input,
+    )
+    log.info('execution_started', execution_arn=execution_arn)
+    return execution_arn
 
-# AWS Step Function trigger task (Pub/Sub)
-trigger_aws_step_function_pubsub = PubSubPublishMessageOperator(
-    task_id='publish_pubsub_message',
-    topic=os.environ.get('PUBSUB_TOPIC', 'hello-world-trigger-topic'),
-    messages=[
+if HELLO_WORLD_BATCH_MODE:
+    # AWS Step Function trigger task (direct), one start per workflow,
+    # at most STEP_FUNCTION_START_CONCURRENCY at a time
+    trigger_aws_step_function_direct = start_step_function_execution.expand(hello_result=hello_task.output)
+else:
+    # AWS Step Function trigger task (direct)
+    trigger_aws_step_function_direct = start_step_function_execution(hello_task.output)
+
+@task
+def create_pubsub_message(hello_results):
+    """Build the Pub/Sub messages of all workflows at runtime, publish_pubsub_message encodes them"""
+    context = get_current_context()
+    # A single result dict outside batch mode
+    if isinstance(hello_results, dict):
+        hello_results = [hello_results]
+
+    # Create the message data
+    return [
         {
-            "data": '{{ encode_message(ti.xcom_pull(task_ids="create_pubsub_message")) }}',
-        },
-    ],
-    dag=dag,
-)
+            'name': execution_name('gcp-pubsub', context['ts_nodash'], hello_result),
+            'source': 'hello_world_dag',
+            'triggered_by': 'hello_world_dag',
+            'trigger_time': context['ts'],
+            'dag_run_id': context['dag_run'].run_id,
+            'workflow_id': hello_result.get('workflow_id', 'unknown'),
+            'execution_id': hello_result.get('execution_id', 'unknown'),
+            'custom_message': hello_result.get('custom_message', ''),
+            'timestamp': context['ts'],
+            'trigger_type': 'pubsub',
+            'trace': hello_result.get('trace')
+        }
+        for hello_result in hello_results
+    ]
+
+# The hello_world result, or the results of all workflows in map index order in batch mode
+pubsub_message = create_pubsub_message(hello_task.output)
+
+@task
+def publish_pubsub_message(messages):
+    """Encode the messages with the shared message codec and publish them in one call"""
+    from pubsub_publish import publish_encoded
+
+    messages = [
+        {**message, 'trace': record_hop(message, 'hello_world_dag.publish_pubsub_message', log)}
+        for message in messages
+    ]
+    publish_encoded(os.environ.get('PUBSUB_TOPIC', 'hello-world-trigger-topic'), messages)
+
+# AWS Step Function trigger task (Pub/Sub)
+trigger_aws_step_function_pubsub = publish_pubsub_message(pubsub_message)
 
 end_task = EmptyOperator(
     task_id='end',
@@ -206,5 +395,6 @@ end_task = EmptyOperator(
 )
 
 # Define task dependencies
-bash_task >> pubsub_message
-start_task >> hello_task >> timestamp_task >> bash_task >> [pubsub_message >> trigger_aws_step_function_pubsub, trigger_aws_step_function_direct] >> end_task
+chain_tail >> pubsub_message
+chain_tail >> [pubsub_message >> trigger_aws_step_function_pubsub, trigger_aws_step_function_direct] >> end_task
+xcom_shims >> end_task
@@ -0,0 +1,225 @@
+"""
+Deferrable Pub/Sub long-poll sensor and trigger.
+
+The sensor defers to PubSubLongPollTrigger, which runs in the triggerer and
+long-polls the subscription. The async subscriber client is cached per
+triggerer process, so deferrals share it instead of building one each. An
+empty long poll already waited pull_timeout on the server, so the trigger polls
+again at once; only transient errors back off (up to max_retry_backoff). As
+soon as messages arrive they are acknowledged and returned, freeing the worker
+slot the PubSubPullSensor would hold between pokes.
+"""
+
+import asyncio
+from airflow.exceptions import AirflowException
+from airflow.sensors.base import BaseSensorOperator
+from airflow.triggers.base import BaseTrigger, TriggerEvent
+
+# Hooks of this triggerer process, by (gcp_conn_id, impersonation_chain, project_id). Each hook
+# keeps its async subscriber client, so the triggers of all deferrals reuse one client and channel.
+# The triggerer runs every trigger on one event loop, so no lock is needed.
+_hooks = {}
+
+
+def _hook_key(gcp_conn_id, impersonation_chain, project_id):
+    chain = tuple(impersonation_chain) if isinstance(impersonation_chain, (list, tuple)) else impersonation_chain
+    return gcp_conn_id, chain, project_id
+
+
+def get_hook(gcp_conn_id, impersonation_chain, project_id):
+    """Return the cached PubSubAsyncHook for the connection, building it on first use"""
+    key = _hook_key(gcp_conn_id, impersonation_chain, project_id)
+    hook = _hooks.get(key)
+    if hook is None:
+        from airflow.providers.google.cloud.hooks.pubsub import PubSubAsyncHook
+
+        hook = _hooks[key] = PubSubAsyncHook(
+            gcp_conn_id=gcp_conn_id,
+            impersonation_chain=impersonation_chain,
+            project_id=project_id,
+        )
+    return hook
+
+
+def discard_hook(gcp_conn_id, impersonation_chain, project_id):
+    """Drop a cached hook after an error, so the next pull builds a fresh client"""
+    _hooks.pop(_hook_key(gcp_conn_id, impersonation_chain, project_id), None)
+
+
+class PubSubLongPollTrigger(BaseTrigger):
+    """
+    Long-polls a Pub/Sub subscription from the triggerer.
+
+    Args:
+        project_id: GCP project of the subscription
+        subscription: Subscription name
+        max_messages: Maximum number of messages returned per event
+        ack_messages: Acknowledge messages before returning them
+        gcp_conn_id: Airflow connection used for credentials
+        pull_timeout: Seconds a single long-poll pull may wait for messages
+        min_retry_backoff: Initial backoff in seconds after a transient pull error
+        max_retry_backoff: Maximum backoff in seconds between retries
+        max_retries: Consecutive transient errors before the trigger fails
+        impersonation_chain: Optional service account(s) to impersonate
+    """
+
+    def __init__(
+        self,
+        project_id,
+        subscription,
+        max_messages=10,
+        ack_messages=True,
+        gcp_conn_id='google_cloud_default',
+        pull_timeout=60.0,
+        min_retry_backoff=1.0,
+        max_retry_backoff=10.0,
+        max_retries=5,
+        impersonation_chain=None,
+    ):
+        super().__init__()
+        self.project_id = project_id
+        self.subscription = subscription
+        self.max_messages = max_messages
+        self.ack_messages = ack_messages
+        self.gcp_conn_id = gcp_conn_id
+        self.pull_timeout = pull_timeout
+        self.min_retry_backoff = min_retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+        self.max_retries = max_retries
+        self.impersonation_chain = impersonation_chain
+
+    def serialize(self):
+        return (
+            'pubsub_long_poll.PubSubLongPollTrigger',
+            {
+                'project_id': self.project_id,
+                'subscription': self.subscription,
+                'max_messages': self.max_messages,
+                'ack_messages': self.ack_messages,
+                'gcp_conn_id': self.gcp_conn_id,
+                'pull_timeout': self.pull_timeout,
+                'min_retry_backoff': self.min_retry_backoff,
+                'max_retry_backoff': self.max_retry_backoff,
+                'max_retries': self.max_retries,
+                'impersonation_chain': self.impersonation_chain,
+            },
+        )
+
+    async def run(self):
+        from google.api_core.exceptions import (
+            Aborted, DeadlineExceeded, InternalServerError, ServiceUnavailable, TooManyRequests,
+        )
+        from google.cloud.pubsub_v1.types import ReceivedMessage
+
+        # TooManyRequests covers ResourceExhausted
+        transient_errors = (Aborted, InternalServerError, ServiceUnavailable, TooManyRequests)
+        hook_args = (self.gcp_conn_id, self.impersonation_chain, self.project_id)
+
+        retries = 0
+        retry_backoff = self.min_retry_backoff
+        try:
+            while True:
+                hook = get_hook(*hook_args)
+                try:
+                    # Long poll: the server holds the request until messages arrive or it times out
+                    pulled_messages = await hook.pull(
+                        project_id=self.project_id,
+                        subscription=self.subscription,
+                        max_messages=self.max_messages,
+                        return_immediately=False,
+                        timeout=self.pull_timeout,
+                    )
+                except DeadlineExceeded:
+                    pulled_messages = []
+                except transient_errors as e:
+                    retries += 1
+                    discard_hook(*hook_args)
+                    if retries > self.max_retries:
+                        raise
+                    self.log.warning('Pulling %s failed (%s), retrying in %.1fs', self.subscription, e, retry_backoff)
+                    await asyncio.sleep(retry_backoff)
+                    retry_backoff = min(self.max_retry_backoff, retry_backoff * 2)
+                    continue
+
+                retries = 0
+                retry_backoff = self.min_retry_backoff
+                if pulled_messages:
+                    if self.ack_messages:
+                        await hook.acknowledge(
+                            project_id=self.project_id,
+                            subscription=self.subscription,
+                            messages=pulled_messages,
+                        )
+                    self.log.info('Received %d messages from %s', len(pulled_messages), self.subscription)
+                    yield TriggerEvent({
+                        'status': 'success',
+                        'messages': [ReceivedMessage.to_dict(m) for m in pulled_messages],
+                    })
+                    return
+
+                # The pull already waited pull_timeout on the server, poll again right away
+                self.log.debug('No messages on %s within %.0fs', self.subscription, self.pull_timeout)
+
+        except Exception as e:
+            yield TriggerEvent({'status': 'error', 'message': str(e)})
+
+
+class PubSubLongPollSensor(BaseSensorOperator):
+    """
+    Waits for Pub/Sub messages by deferring to PubSubLongPollTrigger.
+
+    Returns the received messages in the same format as PubSubPullSensor
+    (a list of ReceivedMessage dicts with base64-encoded data).
+    """
+
+    template_fields = ('project_id', 'subscription')
+
+    def __init__(
+        self,
+        *,
+        project_id,
+        subscription,
+        max_messages=10,
+        ack_messages=True,
+        gcp_conn_id='google_cloud_default',
+        pull_timeout=60.0,
+        min_retry_backoff=1.0,
+        max_retry_backoff=10.0,
+        max_retries=5,
+        impersonation_chain=None,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.project_id = project_id
+        self.subscription = subscription
+        self.max_messages = max_messages
+        self.ack_messages = ack_messages
+        self.gcp_conn_id = gcp_conn_id
+        self.pull_timeout = pull_timeout
+        self.min_retry_backoff = min_retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+        self.max_retries = max_retries
+        self.impersonation_chain = impersonation_chain
+
+    def execute(self, context):
+        self.defer(
+            trigger=PubSubLongPollTrigger(
+                project_id=self.project_id,
+                subscription=self.subscription,
+                max_messages=self.max_messages,
+                ack_messages=self.ack_messages,
+                gcp_conn_id=self.gcp_conn_id,
+                pull_timeout=self.pull_timeout,
+                min_retry_backoff=self.min_retry_backoff,
+                max_retry_backoff=self.max_retry_backoff,
+                max_retries=self.max_retries,
+                impersonation_chain=self.impersonation_chain,
+            ),
+            method_name='execute_complete',
+        )
+
+    def execute_complete(self, context, event):
+        if event['status'] != 'success':
+            raise AirflowException(f"Pub/Sub long poll failed: {event.get('message')}")
+        self.log.info('Received %d messages', len(event['messages']))
+        return event['messages']
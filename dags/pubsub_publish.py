@@ -0,0 +1,33 @@
+"""
+Publish messages encoded with the shared message codec.
+
+Templates always render to strings, so they cannot produce the binary frames
+of message_codec.encode(). Tasks pass the message dicts to publish_encoded()
+instead, which encodes them once, right before publishing. The Pub/Sub hook
+is imported on first use to keep DAG parsing cheap.
+"""
+
+import logging
+from log_utils import StructuredLogger
+
+log = StructuredLogger(logging.getLogger(__name__))
+
+
+def publish_encoded(topic, messages, project_id=None, gcp_conn_id='google_cloud_default'):
+    """
+    Encode message dicts with message_codec and publish them in one request.
+
+    Args:
+        topic: Pub/Sub topic name
+        messages: List of message dicts
+        project_id: Project of the topic, defaults to the project of the connection
+        gcp_conn_id: Airflow connection used for credentials
+    """
+    from airflow.providers.google.cloud.hooks.pubsub import PubSubHook
+    from message_codec import encode
+
+    encoded_messages = [{'data': encode(message)} for message in messages]
+    log.info('messages_encoded', count=len(encoded_messages), size=sum(len(m['data']) for m in encoded_messages))
+
+    hook = PubSubHook(gcp_conn_id=gcp_conn_id)
+    hook.publish(project_id=project_id, topic=topic, messages=encoded_messages)
@@ -4,12 +4,20 @@ A DAG that listens for Pub/Sub messages and triggers the hello_world_dag with pa
 """
 
 from datetime import datetime, timedelta
-import json
 import os
-import base64
 from airflow.decorators import dag, task
+from airflow.operators.python import get_current_context
 from airflow.operators.trigger_dagrun import TriggerDagRunOperator
-from airflow.providers.google.cloud.sensors.pubsub import PubSubPullSensor
+from pubsub_long_poll import PubSubLongPollSensor
+
+# Maximum number of Pub/Sub messages pulled (and hello_world_dag runs triggered) per DAG run
+PUBSUB_BATCH_SIZE = int(os.environ.get('PUBSUB_BATCH_SIZE', '10'))
+# Trigger one hello_world_dag run for all the messages of a pull instead of one run per message. Read from
+# hello_world_dag's layout constants, so both DAGs agree on whether hello_world_dag takes a list of payloads
+try:
+    from hello_world_dag_layout import HELLO_WORLD_BATCH_MODE
+except ImportError:
+    HELLO_WORLD_BATCH_MODE = False
 
 # Default arguments for the DAG
 default_args = {
@@ -31,38 +39,32 @@ default_args = {
     tags=['pubsub', 'trigger', 'hello-world'],
 )
 def pubsub_trigger_dag():
-    # Pull messages from Pub/Sub
-    pull_pubsub_messages = PubSubPullSensor(
+    # Pull up to PUBSUB_BATCH_SIZE messages from Pub/Sub per DAG run.
+    # The sensor defers to the triggerer, which long-polls the subscription.
+    pull_pubsub_messages = PubSubLongPollSensor(
         task_id='pull_pubsub_messages',
         subscription=os.environ.get('PUBSUB_SUBSCRIPTION'),
         project_id=os.environ.get('GCP_PROJECT_ID'),
         ack_messages=True,
-        deferrable=False,
-        poke_interval=1,
-        max_messages=1, # only one message at a time
+        max_messages=PUBSUB_BATCH_SIZE,
     )
 
-    # Parse the messages
+    # Parse the messages, dropping malformed ones individually
     @task
-    def parse_pubsub_message(messages):
-        message_data = messages[0].get('message', {})
-        decoded_data = base64.b64decode(message_data['data']).decode('utf-8')
-        params = json.loads(decoded_data)
-        print(f"Received parameters: {params}")
-        return json.dumps(params)
+    def parse_pubsub_messages(messages):
+        from trigger_messages import batch_trigger_kwargs, parse_trigger_messages
+
+        ts = get_current_context()['ts']
+        trigger_kwargs = parse_trigger_messages(messages, ts)
+        return batch_trigger_kwargs(trigger_kwargs, ts) if HELLO_WORLD_BATCH_MODE else trigger_kwargs
 
-    message = parse_pubsub_message(messages=pull_pubsub_messages.output)
+    trigger_kwargs = parse_pubsub_messages(messages=pull_pubsub_messages.output)
 
-    # Trigger the hello_world_dag
-    TriggerDagRunOperator(
+    # Trigger one hello_world_dag run per parsed message, or one for all of them in batch mode
+    TriggerDagRunOperator.partial(
         task_id='trigger_hello_world_dag',
         trigger_dag_id='hello_world_dag',
         wait_for_completion=False,
-        conf={
-            'pubsub_params': message,
-            'triggered_by': 'pubsub_trigger_dag',
-            'trigger_time': '{{ ts }}'
-        },
-    )
+    ).expand_kwargs(trigger_kwargs)
 
 pubsub_trigger_dag()
@@ -0,0 +1,79 @@
+"""
+Turns pulled Pub/Sub trigger messages into hello_world_dag trigger arguments.
+
+Kept free of Airflow imports so that pubsub_trigger_dag's parse task and the
+local load harness (benchmarks/load_harness.py) run the same code.
+"""
+
+import base64
+import logging
+from log_utils import StructuredLogger
+from message_codec import TRIGGER_SCHEMA, decode
+from trace_context import record_hop
+
+log = StructuredLogger(logging.getLogger(__name__))
+
+
+def parse_trigger_messages(messages, ts):
+    """
+    Decode pulled messages into TriggerDagRunOperator kwargs, dropping malformed ones individually.
+
+    Args:
+        messages: Received messages in the PubSubPullSensor format (dicts with base64-encoded data)
+        ts: Logical timestamp of the pubsub_trigger_dag run
+
+    Returns:
+        list: {'trigger_run_id', 'conf'} dicts, one per valid message
+    """
+    trigger_kwargs = []
+    for received_message in messages:
+        message_data = received_message.get('message', {})
+        message_id = message_data.get('message_id', 'unknown')
+        try:
+            # Decode and validate once, downstream tasks receive the dict
+            params = decode(base64.b64decode(message_data['data']), TRIGGER_SCHEMA)
+        except (KeyError, ValueError) as e:
+            log.error('malformed_message', message_id=message_id, error=str(e))
+            continue
+
+        trace = record_hop(params, 'pubsub_trigger_dag', log)
+        params = {key: value for key, value in params.items() if key != 'trace'}
+        log.info('received_parameters', message_id=message_id, params=params)
+        trigger_kwargs.append({
+            'trigger_run_id': f"pubsub__{ts}__{message_id}",
+            'conf': {
+                'pubsub_params': params,
+                'triggered_by': 'pubsub_trigger_dag',
+                'trigger_time': ts,
+                'trace': trace
+            }
+        })
+
+    log.info('parsed_batch', received_count=len(messages), trigger_count=len(trigger_kwargs))
+    return trigger_kwargs
+
+
+def batch_trigger_kwargs(trigger_kwargs, ts):
+    """
+    Combine parsed trigger kwargs into a single hello_world_dag run in batch mode.
+
+    The run's pubsub_params is the list of the individual payloads, each one
+    keeping its own trace.
+
+    Args:
+        trigger_kwargs: Output of parse_trigger_messages()
+        ts: Logical timestamp of the pubsub_trigger_dag run
+
+    Returns:
+        list: One {'trigger_run_id', 'conf'} dict, or none if trigger_kwargs is empty
+    """
+    if not trigger_kwargs:
+        return []
+    return [{
+        'trigger_run_id': f"pubsub_batch__{ts}__{trigger_kwargs[0]['trigger_run_id'].rsplit('__', 1)[-1]}",
+        'conf': {
+            'pubsub_params': [{**kwargs['conf']['pubsub_params'], 'trace': kwargs['conf']['trace']} for kwargs in trigger_kwargs],
+            'triggered_by': 'pubsub_trigger_dag',
+            'trigger_time': ts
+        }
+    }]
@@ -58,6 +58,13 @@ resource "google_composer_environment" "composer_env" {
         min_count  = 1
         max_count  = 3
       }
+
+      # Runs the deferred Pub/Sub long-poll trigger of pubsub_trigger_dag
+      triggerer {
+        cpu       = 0.5
+        memory_gb = 1.0
+        count     = 1
+      }
     }
   }
 }
@@ -132,3 +139,53 @@ resource "google_storage_bucket_object" "pubsub_trigger_dag" {
 
   depends_on = [google_composer_environment.composer_env]
 }
+
+resource "google_storage_bucket_object" "pubsub_long_poll" {
+  name   = "dags/pubsub_long_poll.py"
+  bucket = replace(replace(google_composer_environment.composer_env.config[0].dag_gcs_prefix, "/dags", ""), "gs://", "")
+  source = "${path.module}/dags/pubsub_long_poll.py"
+
+  depends_on = [google_composer_environment.composer_env]
+}
+
+resource "google_storage_bucket_object" "pubsub_publish" {
+  name   = "dags/pubsub_publish.py"
+  bucket = replace(replace(google_composer_environment.composer_env.config[0].dag_gcs_prefix, "/dags", ""), "gs://", "")
+  source = "${path.module}/dags/pubsub_publish.py"
+
+  depends_on = [google_composer_environment.composer_env]
+}
+
+resource "google_storage_bucket_object" "trigger_messages" {
+  name   = "dags/trigger_messages.py"
+  bucket = replace(replace(google_composer_environment.composer_env.config[0].dag_gcs_prefix, "/dags", ""), "gs://", "")
+  source = "${path.module}/dags/trigger_messages.py"
+
+  depends_on = [google_composer_environment.composer_env]
+}
+
+# hello_world_dag's layout as a constant next to the DAG, so the scheduler and every worker parse the same shape
+resource "google_storage_bucket_object" "hello_world_dag_layout" {
+  name    = "dags/hello_world_dag_layout.py"
+  bucket  = replace(replace(google_composer_environment.composer_env.config[0].dag_gcs_prefix, "/dags", ""), "gs://", "")
+  content = <<-EOT
+    # Rendered by Terraform from var.fuse_hello_world_dag_steps, var.hello_world_batch_mode and
+    # var.step_function_start_concurrency
+    HELLO_WORLD_FUSED_STEPS = ${var.fuse_hello_world_dag_steps ? "True" : "False"}
+    HELLO_WORLD_BATCH_MODE = ${var.hello_world_batch_mode ? "True" : "False"}
+    STEP_FUNCTION_START_CONCURRENCY = ${var.step_function_start_concurrency}
+  EOT
+
+  depends_on = [google_composer_environment.composer_env]
+}
+
+# Upload the modules shared with the Lambda functions next to the DAGs (the DAGs folder is on sys.path)
+resource "google_storage_bucket_object" "shared_modules" {
+  for_each = fileset("${path.module}/shared", "*.py")
+
+  name   = "dags/${each.value}"
+  bucket = replace(replace(google_composer_environment.composer_env.config[0].dag_gcs_prefix, "/dags", ""), "gs://", "")
+  source = "${path.module}/shared/${each.value}"
+
+  depends_on = [google_composer_environment.composer_env]
+}
@@ -10,8 +10,40 @@ set -e  # Exit on any error
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 LAMBDA_DIR="$SCRIPT_DIR"
 
+# Modules shared by all Lambda functions (and the DAGs), copied into every package
+SHARED_DIR="$(cd "$SCRIPT_DIR/../shared" && pwd)"
+
 # List of Lambda functions to build
-LAMBDA_FUNCTIONS=("hello_world" "timestamp" "trigger_dag" "trigger_sf")
+LAMBDA_FUNCTIONS=("hello_world" "timestamp" "trigger_dag" "trigger_sf" "pipeline_runner")
+
+# Step handlers packaged into pipeline_runner as <function>.py (see PIPELINE_STEPS)
+PIPELINE_STEP_FUNCTIONS=("hello_world" "timestamp")
+
+# Python version of the Lambda runtime (see lambda_runtime_python in variables.tf).
+# Bytecode is only precompiled when the build interpreter has the same version.
+LAMBDA_PYTHON_VERSION="3.12"
+
+# Packages already provided by the Lambda Python runtime, pruned from the packages
+# unless --keep-runtime-packages is given
+RUNTIME_PROVIDED_PACKAGES=("boto3" "botocore" "s3transfer" "jmespath")
+KEEP_RUNTIME_PACKAGES=false
+
+# Modules the handlers import inside functions rather than at module level (see "Cold Start Slimming"
+# in README.md). They are loaded by the first invocation that needs them, so the build times them
+# separately from "import index". boto3 is only timed with --keep-runtime-packages, as it is pruned otherwise.
+declare -A DEFERRED_IMPORTS=(
+    ["trigger_dag"]="google.cloud.pubsub_v1 google.auth.transport.requests boto3"
+    ["trigger_sf"]="google.cloud.pubsub_v1 google.auth.transport.requests boto3"
+)
+
+# Test suite directories whose removal is verified by importing the handler and its deferred imports
+TEST_DIR_NAMES=("tests" "test")
+
+# Directory for import time reports and the build summary
+REPORT_DIR="$LAMBDA_DIR/reports"
+
+# Per-function summary lines, printed at the end of the build
+SUMMARY_LINES=()
 
 # Colors for output
 RED='\033[0;31m'
@@ -45,6 +77,14 @@ clean_build_artifacts() {
     done
 }
 
+# Function to clean build reports
+clean_reports() {
+    if [ -d "$REPORT_DIR" ]; then
+        rm -rf "$REPORT_DIR"
+        print_info "Cleaned: $REPORT_DIR"
+    fi
+}
+
 # Function to clean dependencies
 clean_dependencies() {
     print_info "Cleaning installed dependencies..."
@@ -93,18 +133,182 @@ build_lambda_function() {
         print_info "No requirements.txt found, skipping dependencies"
     fi
     
-    # Copy source files to build directory
-    cp "$source_path/index.py" "$build_dir/"
+    # Copy source files and shared modules to build directory
+    cp "$source_path"/*.py "$build_dir/"
+    cp "$SHARED_DIR"/*.py "$build_dir/"
+
+    if [ "$source_dir" = "pipeline_runner" ]; then
+        for step_name in "${PIPELINE_STEP_FUNCTIONS[@]}"; do
+            cp "$LAMBDA_DIR/$step_name/index.py" "$build_dir/$step_name.py"
+        done
+    fi
+
+    prune_build_dir "$source_dir" "$build_dir"
+    precompile_build_dir "$build_dir"
+
+    local import_times
+    import_times="$(record_import_time "$source_dir" "$build_dir")"
     
     # Create zip file
     print_info "Creating zip package: $output_zip"
+    rm -f "$output_path"
     cd "$build_dir"
     zip -r "$output_path" . -q
     cd - > /dev/null
+
+    local zip_size_kb=$(( $(wc -c < "$output_path") / 1024 ))
+    SUMMARY_LINES+=("$(printf "%-15s %10s KB %12s ms %16s ms" "$source_dir" "$zip_size_kb" $import_times)")
     
     print_info "Successfully built: $output_zip"
 }
 
+# Function to print the modules a function's handler imports lazily and that are present in the package
+deferred_imports() {
+    local lambda_name="$1"
+    local module
+    for module in ${DEFERRED_IMPORTS[$lambda_name]}; do
+        if [ "$module" = "boto3" ] && [ "$KEEP_RUNTIME_PACKAGES" != "true" ]; then
+            continue
+        fi
+        echo "$module"
+    done
+}
+
+# Function to check that the handler and its deferred imports can be imported from a build directory
+imports_cleanly() {
+    local lambda_name="$1"
+    local build_dir="$2"
+    local modules
+    modules="$(deferred_imports "$lambda_name" | tr '\n' ' ')"
+
+    # -B keeps the check from writing bytecode into the package, -S keeps the build machine's packages out
+    (cd "$build_dir" && python3 -S -B -c "import importlib, sys; [importlib.import_module(m) for m in sys.argv[1:]]" \
+        index $modules) > /dev/null 2>&1
+}
+
+# Function to remove files that are never used at runtime from a build directory
+prune_build_dir() {
+    local lambda_name="$1"
+    local build_dir="$2"
+
+    print_info "Pruning unused files from $build_dir"
+
+    if [ "$KEEP_RUNTIME_PACKAGES" != "true" ]; then
+        for package in "${RUNTIME_PROVIDED_PACKAGES[@]}"; do
+            rm -rf "$build_dir/$package" "$build_dir/$package"-*.dist-info
+        done
+    fi
+
+    prune_test_dirs "$lambda_name" "$build_dir"
+
+    # Stale bytecode, type stubs and console scripts
+    find "$build_dir" -depth -type d -name "__pycache__" -exec rm -rf {} +
+    find "$build_dir" -type f \( -name "*.pyc" -o -name "*.pyi" \) -delete
+    rm -rf "$build_dir/bin"
+
+    # Install bookkeeping; METADATA and entry_points.txt are kept as importlib.metadata reads them
+    find "$build_dir" -path "*.dist-info/*" -type f \( -name "RECORD" -o -name "INSTALLER" -o -name "REQUESTED" -o -name "direct_url.json" \) -delete
+}
+
+# Function to remove test suite directories, but only if the package still imports without them.
+# Some libraries ship runtime modules under a test/tests directory, so the test directories are
+# moved aside first and put back when the handler or one of its deferred imports no longer imports.
+prune_test_dirs() {
+    local lambda_name="$1"
+    local build_dir="$2"
+    local name_args=()
+    local name
+    for name in "${TEST_DIR_NAMES[@]}"; do
+        name_args+=(-o -name "$name")
+    done
+
+    local test_dirs=()
+    while IFS= read -r -d '' test_dir; do
+        test_dirs+=("${test_dir#"$build_dir"/}")
+    done < <(find "$build_dir" -mindepth 1 -type d \( "${name_args[@]:1}" \) -prune -print0)
+    if [ ${#test_dirs[@]} -eq 0 ]; then
+        return 0
+    fi
+
+    if ! imports_cleanly "$lambda_name" "$build_dir"; then
+        print_warning "Keeping ${#test_dirs[@]} test directories: the $lambda_name handler does not import on this machine, so their removal cannot be verified"
+        return 0
+    fi
+
+    local stash_dir
+    stash_dir="$(mktemp -d)"
+    (cd "$build_dir" && tar -cf - "${test_dirs[@]}" | tar -xf - -C "$stash_dir")
+    (cd "$build_dir" && rm -rf "${test_dirs[@]}")
+
+    if imports_cleanly "$lambda_name" "$build_dir"; then
+        print_info "Removed ${#test_dirs[@]} test directories"
+    else
+        (cd "$stash_dir" && tar -cf - . | tar -xf - -C "$build_dir")
+        print_warning "Kept ${#test_dirs[@]} test directories: the $lambda_name package does not import without them"
+    fi
+    rm -rf "$stash_dir"
+}
+
+# Function to precompile bytecode, as /var/task is read-only and Lambda would otherwise compile on every cold start
+precompile_build_dir() {
+    local build_dir="$1"
+    local build_python_version
+    build_python_version="$(python3 -c 'import sys; print(f"{sys.version_info.major}.{sys.version_info.minor}")')"
+
+    if [ "$build_python_version" != "$LAMBDA_PYTHON_VERSION" ]; then
+        print_warning "Skipping bytecode precompilation: build Python $build_python_version does not match Lambda runtime $LAMBDA_PYTHON_VERSION"
+        return 0
+    fi
+
+    print_info "Precompiling bytecode in $build_dir"
+    # unchecked-hash pycs stay valid regardless of the file timestamps in the zip
+    python3 -m compileall -q -j 0 --invalidation-mode unchecked-hash "$build_dir" > /dev/null \
+        || print_warning "Some files in $build_dir could not be precompiled"
+}
+
+# Function to record a python -X importtime report of the handler module and its deferred imports.
+# Prints the import time of the handler module and of the deferred imports in ms, "-" when it has none.
+record_import_time() {
+    local lambda_name="$1"
+    local build_dir="$2"
+    local report="$REPORT_DIR/${lambda_name}_importtime.txt"
+    local modules
+    modules="$(deferred_imports "$lambda_name" | tr '\n' ' ')"
+
+    mkdir -p "$REPORT_DIR"
+
+    # -S keeps packages installed on the build machine out of the measurement. The deferred imports are
+    # timed after the handler module, the way the first invocation that needs them loads them.
+    local deferred_ms
+    if deferred_ms="$(cd "$build_dir" && python3 -S -X importtime -c "
+import importlib, sys, time
+import index
+start = time.perf_counter()
+for module in sys.argv[1:]:
+    importlib.import_module(module)
+print(f'{(time.perf_counter() - start) * 1000:.1f}' if sys.argv[1:] else '-')
+" $modules 2> "$report")"; then
+        # Cumulative import time of the handler module, including everything it imports
+        awk -F'|' '/^import time:/ && $3 == " index" { printf "%.1f", $2 / 1000 }' "$report"
+        echo " $deferred_ms"
+        print_info "Import time report: $report" >&2
+    else
+        print_warning "Could not import $lambda_name handler or its deferred imports on this machine, see $report" >&2
+        echo "n/a n/a"
+    fi
+}
+
+# Function to print and save the per-function build summary
+print_summary() {
+    mkdir -p "$REPORT_DIR"
+    {
+        printf "%-15s %13s %15s %19s\n" "Function" "Zip size" "Import time" "Deferred imports"
+        for line in "${SUMMARY_LINES[@]}"; do
+            echo "$line"
+        done
+    } | tee "$REPORT_DIR/build_summary.txt"
+}
+
 # Main build function
 main() {
     print_info "Building Python Lambda functions..."
@@ -114,6 +318,9 @@ main() {
     for lambda_name in "${LAMBDA_FUNCTIONS[@]}"; do
         build_lambda_function "$lambda_name" "$lambda_name.zip"
     done
+
+    echo
+    print_summary
     
     echo
     print_info "Build completed successfully!"
@@ -124,12 +331,17 @@ main() {
 if [ "$1" = "--clean" ]; then
     clean_dependencies
     clean_build_artifacts
+    clean_reports
 elif [ "$1" = "--help" ] || [ "$1" = "-h" ]; then
     echo "Usage: $(basename "$0") [OPTION]"
     echo "Options:"
-    echo "  --clean    Clean installed dependencies from source directories"
-    echo "  --help     Show this help message"
-    echo "  (no args)  Build all Lambda functions"
+    echo "  --clean                  Clean installed dependencies from source directories"
+    echo "  --keep-runtime-packages  Keep packages provided by the Lambda runtime (${RUNTIME_PROVIDED_PACKAGES[*]})"
+    echo "  --help                   Show this help message"
+    echo "  (no args)                Build all Lambda functions"
+elif [ "$1" = "--keep-runtime-packages" ]; then
+    KEEP_RUNTIME_PACKAGES=true
+    main
 else
     main
 fi
@@ -1,12 +1,16 @@
-import json
 import os
-from datetime import datetime
+from datetime import datetime, timezone
 import logging
+from log_utils import StructuredLogger
+from profiling import profiled
+from trace_context import record_hop
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
+log = StructuredLogger(logger)
 
+@profiled
 def lambda_handler(event, context):
     """
     Hello World Lambda function for AWS Step Function workflow.
@@ -18,28 +22,28 @@ def lambda_handler(event, context):
     Returns:
         dict: Response with message, timestamp, and environment info
     """
-    logger.info('Hello World Lambda function started')
-    logger.info(f'Event: {json.dumps(event, indent=2)}')
+    log.info('hello_world_started', event=event)
     
     try:
         # Simulate some processing
         message = "Hello, World! This is a Step Function Lambda task."
-        timestamp = datetime.now(datetime.timezone.utc).isoformat()
+        timestamp = datetime.now(timezone.utc).isoformat()
         
         result = {
             "message": message,
             "timestamp": timestamp,
             "environment": os.environ.get('ENVIRONMENT', 'unknown'),
             "project": os.environ.get('PROJECT_NAME', 'unknown'),
-            "success": True
+            "success": True,
+            "trace": record_hop(event, 'hello_world', log)
         }
         
-        logger.info(f'Result: {json.dumps(result, indent=2)}')
+        log.info('hello_world_result', result=result)
         
         return result
         
     except Exception as error:
-        logger.error(f'Error in Hello World Lambda: {error}')
+        log.error('hello_world_error', error=str(error), error_class=error.__class__.__name__)
         
         return {
             "message": "Error occurred in Hello World task",
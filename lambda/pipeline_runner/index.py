@@ -0,0 +1,133 @@
+import os
+import time
+import logging
+import importlib
+import importlib.util
+from log_utils import StructuredLogger
+from profiling import profiled, section
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+log = StructuredLogger(logger)
+
+# Ordered steps as <module>:<ResultPath key>. Each module is a Lambda handler module
+# (build.sh packages lambda/<module>/index.py as <module>.py) exposing lambda_handler.
+PIPELINE_STEPS = os.environ.get('PIPELINE_STEPS', 'hello_world:helloWorldResult,timestamp:timestampResult')
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def load_handler(module_name):
+    """
+    Return the lambda_handler of a step module.
+
+    Falls back to lambda/<module>/index.py so the runner also works from the
+    source tree, where the step handlers are not copied next to it.
+    """
+    try:
+        module = importlib.import_module(module_name)
+    except ModuleNotFoundError:
+        path = os.path.join(LAMBDA_DIR, module_name, 'index.py')
+        if not os.path.exists(path):
+            raise
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    return module.lambda_handler
+
+
+def parse_steps(spec):
+    """
+    Parse a PIPELINE_STEPS value.
+
+    Returns:
+        list: (module name, result key, handler) tuples in execution order
+    """
+    steps = []
+    for entry in spec.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        module_name, _, result_key = entry.partition(':')
+        if not result_key:
+            raise ValueError(f"Pipeline step '{entry}' must be <module>:<result key>")
+        steps.append((module_name, result_key, load_handler(module_name)))
+    return steps
+
+
+# Step handlers are imported during the init phase, once per container
+STEPS = parse_steps(PIPELINE_STEPS)
+
+
+def run_pipeline(steps, event, context):
+    """
+    Run the steps in order, each one receiving the state built so far.
+
+    Every step result is stored under its result key, like a Task state with
+    ResultPath = "$.<key>", so the steps see the same input as in the Step
+    Function. The pipeline stops at the first step that raises or returns
+    success: false.
+
+    Returns:
+        dict: The event with one entry per completed step and a 'pipelineResult' summary
+    """
+    pipeline_start = time.perf_counter()
+    state = dict(event) if isinstance(event, dict) else {}
+    timings = []
+    failed_step = None
+    error = None
+
+    for module_name, result_key, handler in steps:
+        step_start = time.perf_counter()
+        try:
+            with section(module_name):
+                result = handler(state, context)
+            success = not (isinstance(result, dict) and result.get('success') is False)
+            if not success:
+                error = result.get('error', 'Step returned success: false')
+        except Exception as step_error:
+            result = {"error": str(step_error), "error_class": step_error.__class__.__name__, "success": False}
+            success = False
+            error = str(step_error)
+        duration_ms = round((time.perf_counter() - step_start) * 1000, 2)
+
+        state[result_key] = result
+        timings.append({"step": module_name, "resultPath": f"$.{result_key}", "durationMs": duration_ms, "success": success})
+        log.info('pipeline_step_completed', step=module_name, duration_ms=duration_ms, success=success)
+
+        if not success:
+            failed_step = module_name
+            break
+
+    state['pipelineResult'] = {
+        "success": failed_step is None,
+        "failedStep": failed_step,
+        "error": error,
+        "steps": timings,
+        "totalMs": round((time.perf_counter() - pipeline_start) * 1000, 2)
+    }
+    return state
+
+
+@profiled
+def lambda_handler(event, context):
+    """
+    Pipeline runner Lambda function for AWS Step Function workflow.
+    Runs the PIPELINE_STEPS handlers in one invocation instead of one Lambda per step.
+
+    Args:
+        event: Input event from Step Function
+        context: Lambda context object
+
+    Returns:
+        dict: The input with each step result under its result key and per-step timings under
+        'pipelineResult' (use ResultPath "$")
+    """
+    log.info('pipeline_runner_started', event=event, steps=[module_name for module_name, _, _ in STEPS])
+
+    result = run_pipeline(STEPS, event, context)
+
+    log.info('pipeline_result', result=result['pipelineResult'])
+
+    return result
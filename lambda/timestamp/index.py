@@ -1,12 +1,16 @@
-import json
 import os
 from datetime import datetime
 import logging
+from log_utils import StructuredLogger
+from profiling import profiled
+from trace_context import record_hop
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
+log = StructuredLogger(logger)
 
+@profiled
 def lambda_handler(event, context):
     """
     Timestamp Lambda function for AWS Step Function workflow.
@@ -18,8 +22,7 @@ def lambda_handler(event, context):
     Returns:
         dict: Response with current timestamp, formatted date, and input processing
     """
-    logger.info('Timestamp Lambda function started')
-    logger.info(f'Event: {json.dumps(event, indent=2)}')
+    log.info('timestamp_started', event=event)
     
     try:
         # Get current timestamp and format it
@@ -42,15 +45,16 @@ def lambda_handler(event, context):
             "inputTimestamp": input_timestamp,
             "environment": os.environ.get('ENVIRONMENT', 'unknown'),
             "project": os.environ.get('PROJECT_NAME', 'unknown'),
-            "success": True
+            "success": True,
+            "trace": record_hop(event, 'timestamp', log)
         }
         
-        logger.info(f'Result: {json.dumps(result, indent=2)}')
+        log.info('timestamp_result', result=result)
         
         return result
         
     except Exception as error:
-        logger.error(f'Error in Timestamp Lambda: {error}')
+        log.error('timestamp_error', error=str(error), error_class=error.__class__.__name__)
         
         return {
             "message": "Error occurred in Timestamp task",
@@ -1,86 +1,443 @@
-import json
 import os
 import logging
-import boto3
-from google.cloud import pubsub_v1
+import time
+from datetime import datetime, timezone
+from credential_cache import credential_metrics, get_credentials
+from log_utils import StructuredLogger
+from message_codec import encode
+from profiling import profiled, section
+from trace_context import record_hop
+
+# boto3 and google.cloud.pubsub_v1 are imported where they are first needed to keep
+# module import (and therefore the cold start init phase) cheap. boto3 is only
+# needed for the opt-in diagnostics.
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
+log = StructuredLogger(logger)
+
+# Clients are cached at module level so they survive warm invocations of the
+# same Lambda container. They are built lazily on first use and rebuilt when
+# unhealthy, too old, or after a publish error.
+CLIENT_MAX_AGE_SECONDS = int(os.environ.get('CLIENT_MAX_AGE_SECONDS', '3600'))
+
+# Publisher batching settings, used when a list of events is published at once
+PUBLISH_MAX_MESSAGES = int(os.environ.get('PUBLISH_MAX_MESSAGES', '100'))
+PUBLISH_MAX_BYTES = int(os.environ.get('PUBLISH_MAX_BYTES', str(1024 * 1024)))
+PUBLISH_MAX_LATENCY_SECONDS = float(os.environ.get('PUBLISH_MAX_LATENCY_SECONDS', '0.01'))
+
+# Publish deadline: attempts and backoff must fit into the Lambda's remaining time minus this
+# margin, so the handler reports the failure itself instead of being killed by the Lambda timeout
+PUBLISH_SAFETY_MARGIN_MS = int(os.environ.get('PUBLISH_SAFETY_MARGIN_MS', '2000'))
+PUBLISH_ATTEMPT_TIMEOUT_SECONDS = float(os.environ.get('PUBLISH_ATTEMPT_TIMEOUT_SECONDS', '10'))
+PUBLISH_RETRY_BASE_DELAY_SECONDS = float(os.environ.get('PUBLISH_RETRY_BASE_DELAY_SECONDS', '0.2'))
+PUBLISH_RETRY_MAX_DELAY_SECONDS = float(os.environ.get('PUBLISH_RETRY_MAX_DELAY_SECONDS', '2'))
+# Shortest attempt worth starting, and the budget used when the context has no remaining time (local runs)
+PUBLISH_MIN_ATTEMPT_SECONDS = 0.5
+PUBLISH_DEFAULT_BUDGET_MS = 30000
+
+# Transient errors worth retrying: google.api_core.exceptions, google.auth and timeout classes,
+# matched by name so that classifying an error does not import the Google libraries
+RETRYABLE_ERRORS = frozenset({
+    'Aborted', 'Cancelled', 'DeadlineExceeded', 'InternalServerError', 'ResourceExhausted',
+    'ServiceUnavailable', 'TooManyRequests', 'Unknown', 'RetryError', 'TransportError',
+    'TimeoutError', 'ConnectionError', 'ConnectionResetError', 'ConnectionRefusedError',
+})
+
+_clients = {}
+_invocation_count = 0
+
+
+def _is_healthy(name, entry):
+    """Return True if the cached client can be reused"""
+    if time.monotonic() - entry['created_at'] > CLIENT_MAX_AGE_SECONDS:
+        log.info('client_expired', client=name, max_age_seconds=CLIENT_MAX_AGE_SECONDS)
+        return False
+    # PublisherClient.stop() marks the client as unusable for further publishes
+    if getattr(entry['client'], '_is_stopped', False):
+        log.info('client_stopped', client=name)
+        return False
+    return True
+
+
+def get_client(name, factory):
+    """
+    Return a cached client, building it with factory() if missing or unhealthy.
+
+    Returns:
+        tuple: (client, init_ms) where init_ms is 0.0 when the cached client was reused
+    """
+    entry = _clients.get(name)
+    if entry is not None and _is_healthy(name, entry):
+        return entry['client'], 0.0
+
+    start = time.perf_counter()
+    with section('client_init'):
+        client = factory()
+    init_ms = (time.perf_counter() - start) * 1000
+    _clients[name] = {'client': client, 'created_at': time.monotonic()}
+    log.info('client_initialized', client=name, init_ms=round(init_ms, 1))
+    return client, init_ms
+
+
+def reset_client(name):
+    """Drop a cached client so the next get_client() call rebuilds it"""
+    entry = _clients.pop(name, None)
+    if entry is not None:
+        log.info('client_discarded', client=name)
+
+
+def create_publisher():
+    from google.cloud import pubsub_v1
+
+    batch_settings = pubsub_v1.types.BatchSettings(
+        max_messages=PUBLISH_MAX_MESSAGES,
+        max_bytes=PUBLISH_MAX_BYTES,
+        max_latency=PUBLISH_MAX_LATENCY_SECONDS,
+    )
+    # The emulator needs no credentials; otherwise share the cached WIF access token across client rebuilds
+    credentials = None if os.environ.get('PUBSUB_EMULATOR_HOST') else get_credentials()
+    return pubsub_v1.PublisherClient(batch_settings=batch_settings, credentials=credentials)
+
+
+def get_publisher():
+    return get_client('publisher', create_publisher)
+
+
+def diagnostics_enabled(event):
+    """STS caller identity check is opt-in via DIAGNOSTICS=true or event['diagnostics']"""
+    if isinstance(event, dict) and event.get('diagnostics'):
+        return True
+    return os.environ.get('DIAGNOSTICS', 'false').lower() == 'true'
+
+
+def log_caller_identity():
+    """Get caller identity to verify WIF is working"""
+    import boto3
+
+    sts_client, _ = get_client('sts', lambda: boto3.client('sts'))
+    response = sts_client.get_caller_identity()
+    log.info('caller_identity', arn=response.get('Arn'), account=response.get('Account'))
+    return response
+
+
+class PublishError(Exception):
+    """Publishing failed for good: a non-retryable error, or the retry budget ran out"""
+
+    def __init__(self, error, attempts, retryable):
+        super().__init__(str(error))
+        self.error = error
+        self.attempts = attempts
+        self.retryable = retryable
+
+
+def is_retryable(error):
+    """Return True if error is transient, so that publishing again later may succeed"""
+    return any(cls.__name__ in RETRYABLE_ERRORS for cls in type(error).__mro__)
+
+
+def publish_deadline(context):
+    """Monotonic time by which publishing must be done, from the Lambda's remaining time"""
+    get_remaining = getattr(context, 'get_remaining_time_in_millis', None)
+    remaining_ms = get_remaining() if callable(get_remaining) else PUBLISH_DEFAULT_BUDGET_MS
+    return time.monotonic() + (remaining_ms - PUBLISH_SAFETY_MARGIN_MS) / 1000
+
+
+def retry_delay(attempt):
+    """Exponential backoff before the next attempt"""
+    return min(PUBLISH_RETRY_MAX_DELAY_SECONDS, PUBLISH_RETRY_BASE_DELAY_SECONDS * 2 ** (attempt - 1))
+
+
+def publish(pubsub_topic_id, message_bytes, deadline):
+    """
+    Publish a message with the cached publisher, retrying transient errors until deadline.
+
+    The client's own retry policy is disabled and every attempt is bounded by the time left,
+    so the retries never outlast the Lambda. The publisher is rebuilt after the first failure.
+
+    Returns:
+        tuple: (message_id, init_ms, attempts)
+
+    Raises:
+        PublishError: On a non-retryable error, or when the next attempt would not fit before deadline
+    """
+    attempts = 0
+    init_ms = 0.0
+    while True:
+        timeout = min(PUBLISH_ATTEMPT_TIMEOUT_SECONDS, deadline - time.monotonic())
+        if timeout < PUBLISH_MIN_ATTEMPT_SECONDS:
+            raise PublishError(TimeoutError('Not enough time left in the Lambda to publish'), attempts, True)
+
+        attempts += 1
+        publisher, client_init_ms = get_publisher()
+        init_ms += client_init_ms
+        try:
+            with section('publish'):
+                future = publisher.publish(pubsub_topic_id, data=message_bytes, retry=None, timeout=timeout)
+                return future.result(timeout=timeout), init_ms, attempts
+        except Exception as error:
+            retryable = is_retryable(error)
+            delay = retry_delay(attempts)
+            log.warning('publish_attempt_failed', attempt=attempts, retryable=retryable, error=str(error),
+                        error_class=error.__class__.__name__,
+                        remaining_ms=round((deadline - time.monotonic()) * 1000))
+            if attempts == 1:
+                reset_client('publisher')
+            if not retryable or deadline - time.monotonic() < delay + PUBLISH_MIN_ATTEMPT_SECONDS:
+                raise PublishError(error, attempts, retryable) from error
+            time.sleep(delay)
+
+
+def publish_batch(pubsub_topic_id, messages, deadline):
+    """
+    Publish all messages without blocking in between and collect the futures, retrying the
+    messages that failed transiently until deadline, like publish() does for a single message.
+    The publisher groups the messages into batches according to its batch settings.
+    Every round is bounded by the time left; failures are classified as retryable or not.
+
+    Args:
+        pubsub_topic_id: Pub/Sub topic to publish to
+        messages: list of (item, message_bytes) tuples
+        deadline: Monotonic time by which publishing must be done
+
+    Returns:
+        tuple: (published, failures, init_ms)
+    """
+    def failure(index, item, error, attempts):
+        return {
+            "index": index,
+            "workflow_id": item.get('workflow_id', 'unknown'),
+            "execution_id": item.get('execution_id', 'unknown'),
+            "error": str(error),
+            "error_class": error.__class__.__name__,
+            "retryable": is_retryable(error),
+            "attempts": attempts
+        }
+
+    pending = [(index, item, message_bytes) for index, (item, message_bytes) in enumerate(messages)]
+    published = []
+    failures = []
+    attempts = 0
+    init_ms = 0.0
+    while pending:
+        timeout = min(PUBLISH_ATTEMPT_TIMEOUT_SECONDS, deadline - time.monotonic())
+        if timeout < PUBLISH_MIN_ATTEMPT_SECONDS:
+            error = TimeoutError('Not enough time left in the Lambda to publish')
+            failures.extend(failure(index, item, error, attempts) for index, item, _ in pending)
+            break
+
+        attempts += 1
+        publisher, client_init_ms = get_publisher()
+        init_ms += client_init_ms
+        futures = [(index, item, message_bytes,
+                    publisher.publish(pubsub_topic_id, data=message_bytes, retry=None, timeout=timeout))
+                   for index, item, message_bytes in pending]
+        attempt_deadline = time.monotonic() + timeout
+
+        failed_count = len(failures)
+        retry = []
+        for index, item, message_bytes, future in futures:
+            try:
+                with section('publish'):
+                    message_id = future.result(timeout=max(0.0, attempt_deadline - time.monotonic()))
+                published.append({
+                    "index": index,
+                    "workflow_id": item.get('workflow_id', 'unknown'),
+                    "execution_id": item.get('execution_id', 'unknown'),
+                    "message_id": message_id
+                })
+            except Exception as error:
+                if is_retryable(error):
+                    retry.append((index, item, message_bytes, error))
+                else:
+                    failures.append(failure(index, item, error, attempts))
+        # Rebuild the publisher after the first failed round, as publish() does
+        if attempts == 1 and (retry or len(failures) > failed_count):
+            reset_client('publisher')
+        if not retry:
+            break
+
+        delay = retry_delay(attempts)
+        log.warning('publish_batch_attempt_failed', attempt=attempts, retryable_count=len(retry),
+                    remaining_ms=round((deadline - time.monotonic()) * 1000))
+        if deadline - time.monotonic() < delay + PUBLISH_MIN_ATTEMPT_SECONDS:
+            failures.extend(failure(index, item, error, attempts) for index, item, _, error in retry)
+            break
+        time.sleep(delay)
+        pending = [(index, item, message_bytes) for index, item, message_bytes, _ in retry]
+
+    published.sort(key=lambda entry: entry['index'])
+    failures.sort(key=lambda entry: entry['index'])
+    return published, failures, init_ms
+
+
+def build_message_data(item, context):
+    """Build the Pub/Sub message payload for a single {workflow_id, execution_id} item"""
+    now = datetime.now(timezone.utc).isoformat()
+    return {
+        "custom_message": f"Hello from AWS Step Function! Workflow: {item.get('workflow_id', 'unknown')}",
+        "timestamp": now,
+        "source": "aws_step_function",
+        "workflow_id": item.get('workflow_id', 'unknown'),
+        "execution_id": item.get('execution_id', 'unknown'),
+        "lambda_request_id": context.aws_request_id,
+        "trigger_time": now,
+        "trace": record_hop(item, 'trigger_dag', log)
+    }
+
+
+def get_batch_items(event):
+    """Return the list of items for a batch event (a list, or a dict with an 'items' list), else None"""
+    if isinstance(event, list):
+        return event
+    if isinstance(event, dict) and isinstance(event.get('items'), list):
+        return event['items']
+    return None
+
+
+def handle_batch(pubsub_topic_id, items, context, cold_start, handler_start):
+    """
+    Publish a list of {workflow_id, execution_id} items in one invocation.
+
+    Returns:
+        dict: Response with per-item message IDs and failures
+    """
+    log.info('publishing_batch', count=len(items))
+
+    messages = [(item, encode(build_message_data(item, context))) for item in items]
+
+    publish_start = time.perf_counter()
+    published, failures, client_init_ms = publish_batch(pubsub_topic_id, messages, publish_deadline(context))
+    publish_ms = (time.perf_counter() - publish_start) * 1000 - client_init_ms
+
+    log.info('batch_published', published_count=len(published), failed_count=len(failures))
+    for failure in failures:
+        log.error('publish_failed', **failure)
 
+    latency = {
+        "cold_start": cold_start,
+        "invocation_count": _invocation_count,
+        "client_init_ms": round(client_init_ms, 1),
+        "publish_ms": round(publish_ms, 1),
+        "total_ms": round((time.perf_counter() - handler_start) * 1000, 1)
+    }
+    log.info('latency', **latency)
+    log.info('credential_cache', caches=credential_metrics())
+
+    return {
+        "message": f"Published {len(published)} of {len(items)} messages to Pub/Sub topic: {pubsub_topic_id}",
+        "published_count": len(published),
+        "failed_count": len(failures),
+        "results": published,
+        "failures": failures,
+        "latency": latency,
+        "retryable": bool(failures) and all(failure['retryable'] for failure in failures),
+        "success": not failures
+    }
+
+
+def publish_error_response(error, publish_ms):
+    """Failure response for a publish that ran out of attempts or hit a non-retryable error"""
+    error_class = error.error.__class__.__name__
+    log.error('publish_failed', error=str(error), error_class=error_class, retryable=error.retryable,
+              attempts=error.attempts, publish_ms=round(publish_ms, 1))
+    return {
+        "message": "Error occurred while triggering DAG",
+        "error": str(error),
+        "error_class": error_class,
+        "retryable": error.retryable,
+        "attempts": error.attempts,
+        "publish_ms": round(publish_ms, 1),
+        "success": False
+    }
+
+
+@profiled
 def lambda_handler(event, context):
     """
     Lambda function to trigger an Airflow DAG by publishing a message to Pub/Sub.
     Uses Workload Identity Federation for authentication.
-    
+
     Args:
         event: Input event from Step Function
         context: Lambda context object
-    
+
     Returns:
         dict: Response with Pub/Sub publish status
     """
-    logger.info('Trigger DAG Lambda function started')
-    logger.info(f'Event: {json.dumps(event, indent=2)}')
-    
+    global _invocation_count
+    _invocation_count += 1
+    cold_start = _invocation_count == 1
+    handler_start = time.perf_counter()
+
+    log.info('trigger_dag_started', event=event)
+
     try:
-        # Get caller identity to verify WIF is working
-        client = boto3.client('sts')
-        response = client.get_caller_identity()
-        logger.info(f'Caller Identity: {response}')
+        if diagnostics_enabled(event):
+            log_caller_identity()
 
         # Get environment variables
         pubsub_topic_id = os.environ.get('PUBSUB_TOPIC_ID')
-        
-        logger.info(f'Google Application Credentials: {os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")}')
-        logger.info(f'Pub/Sub Topic: {pubsub_topic_id}')
-        
-        # Create Pub/Sub client
-        # Note: default retry policy is defined in .venv/lib/python3.12/site-packages/google/api_core/retry/retry_base.py
-        publisher = pubsub_v1.PublisherClient()
-        
+
+        log.info('config', google_application_credentials=os.environ.get('GOOGLE_APPLICATION_CREDENTIALS'), pubsub_topic=pubsub_topic_id)
+
+        batch_items = get_batch_items(event)
+        if batch_items is not None:
+            return handle_batch(pubsub_topic_id, batch_items, context, cold_start, handler_start)
+
         # Prepare the message data
-        message_data = {
-            "custom_message": f"Hello from AWS Step Function! Workflow: {event.get('workflow_id', 'unknown')}",
-            "timestamp": context.get_remaining_time_in_millis() and str(context.get_remaining_time_in_millis()),
-            "source": "aws_step_function",
-            "workflow_id": event.get('workflow_id', 'unknown'),
-            "execution_id": event.get('execution_id', 'unknown'),
-            "lambda_request_id": context.aws_request_id,
-            "trigger_time": context.get_remaining_time_in_millis() and str(context.get_remaining_time_in_millis())
+        message_data = build_message_data(event, context)
+
+        # Encode with the shared message codec
+        message_bytes = encode(message_data)
+
+        log.info('publishing_message', message=message_data)
+
+        # Publish the message and wait for it to be published, retrying within the Lambda's remaining time
+        publish_start = time.perf_counter()
+        try:
+            message_id, client_init_ms, attempts = publish(pubsub_topic_id, message_bytes, publish_deadline(context))
+        except PublishError as error:
+            return publish_error_response(error, (time.perf_counter() - publish_start) * 1000)
+        publish_ms = (time.perf_counter() - publish_start) * 1000 - client_init_ms
+
+        log.info('message_published', message_id=message_id, attempts=attempts)
+
+        # Warm-vs-cold latency report
+        latency = {
+            "cold_start": cold_start,
+            "invocation_count": _invocation_count,
+            "client_init_ms": round(client_init_ms, 1),
+            "publish_ms": round(publish_ms, 1),
+            "total_ms": round((time.perf_counter() - handler_start) * 1000, 1)
         }
-        
-        # Convert to JSON string and encode as bytes
-        message_json = json.dumps(message_data)
-        message_bytes = message_json.encode('utf-8')
-        
-        logger.info(f'Publishing message to Pub/Sub: {message_json}')
-        
-        # Publish the message
-        future = publisher.publish(pubsub_topic_id, data=message_bytes)
-        message_id = future.result()  # Wait for the message to be published
-        
-        logger.info(f'Message published successfully with ID: {message_id}')
-        
+        log.info('latency', **latency)
+        log.info('credential_cache', caches=credential_metrics())
+
         result = {
             "message": f"Successfully published message to Pub/Sub topic: {pubsub_topic_id}",
             "message_id": message_id,
+            "attempts": attempts,
             "workflow_id": event.get('workflow_id', 'unknown'),
             "execution_id": event.get('execution_id', 'unknown'),
+            "trace_id": message_data['trace']['trace_id'],
+            "latency": latency,
             "success": True
         }
-        
-        logger.info(f'Result: {json.dumps(result, indent=2)}')
-        
+
+        log.info('trigger_dag_result', result=result)
+
         return result
-        
+
     except Exception as error:
         error_class = error.__class__.__name__
-        logger.error(f'Error in Trigger DAG Lambda: {error_class}: {error}')
-        
+        log.error('trigger_dag_error', error=str(error), error_class=error_class)
+
         return {
             "message": "Error occurred while triggering DAG",
             "error": str(error),
             "error_class": error_class,
+            "retryable": is_retryable(error),
             "success": False
         }
@@ -0,0 +1,48 @@
+package main
+
+import (
+	"bufio"
+	"context"
+	"encoding/json"
+	"os"
+	"time"
+)
+
+// LocalInvocation is written to stdout for every event handled by runLocal
+type LocalInvocation struct {
+	Response   LambdaResponse `json:"response"`
+	DurationMs float64        `json:"duration_ms"`
+	Error      string         `json:"error,omitempty"`
+}
+
+// runLocal invokes the handler once per JSON event line on stdin and writes one
+// LocalInvocation line per event to stdout, after a {"ready": true} line. It is the
+// Go side of benchmarks/lambda_shim.py, used by benchmarks/trigger_dag_compare.py.
+// Logs go to stderr. Each invocation gets the Lambda timeout as its deadline.
+func runLocal() {
+	out := json.NewEncoder(os.Stdout)
+	_ = out.Encode(map[string]bool{"ready": true})
+
+	scanner := bufio.NewScanner(os.Stdin)
+	scanner.Buffer(make([]byte, 1024*1024), 16*1024*1024)
+	for scanner.Scan() {
+		var event LambdaEvent
+		if err := json.Unmarshal(scanner.Bytes(), &event); err != nil {
+			_ = out.Encode(LocalInvocation{Error: err.Error()})
+			continue
+		}
+
+		ctx, cancel := context.WithTimeout(context.Background(), 60*time.Second)
+		start := time.Now()
+		response, err := handler(ctx, event)
+		invocation := LocalInvocation{
+			Response:   response,
+			DurationMs: float64(time.Since(start).Microseconds()) / 1000,
+		}
+		cancel()
+		if err != nil {
+			invocation.Error = err.Error()
+		}
+		_ = out.Encode(invocation)
+	}
+}
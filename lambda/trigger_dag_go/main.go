@@ -2,10 +2,13 @@ package main
 
 import (
 	"context"
+	"crypto/rand"
+	"encoding/hex"
 	"encoding/json"
 	"fmt"
 	"log"
 	"os"
+	"strings"
 	"time"
 
 	"cloud.google.com/go/pubsub/v2"
@@ -16,8 +19,29 @@ import (
 
 // LambdaEvent represents the input event from Step Function
 type LambdaEvent struct {
-	WorkflowID  string `json:"workflow_id"`
-	ExecutionID string `json:"execution_id"`
+	WorkflowID       string        `json:"workflow_id"`
+	ExecutionID      string        `json:"execution_id"`
+	Trace            *TraceContext `json:"trace,omitempty"`
+	HelloWorldResult *TracedResult `json:"helloWorldResult,omitempty"`
+	TimestampResult  *TracedResult `json:"timestampResult,omitempty"`
+	Diagnostics      bool          `json:"diagnostics,omitempty"`
+}
+
+// TraceContext is the trace carried in the payload of every hop, see shared/trace_context.py
+type TraceContext struct {
+	TraceID string     `json:"trace_id"`
+	Hops    []TraceHop `json:"hops"`
+}
+
+// TraceHop records when a hop handled the request, in epoch milliseconds
+type TraceHop struct {
+	Hop string `json:"hop"`
+	Ts  int64  `json:"ts"`
+}
+
+// TracedResult is a previous Lambda result nested under its Step Function ResultPath
+type TracedResult struct {
+	Trace *TraceContext `json:"trace,omitempty"`
 }
 
 // LambdaResponse represents the response from the lambda function
@@ -26,20 +50,25 @@ type LambdaResponse struct {
 	MessageID   string `json:"message_id,omitempty"`
 	WorkflowID  string `json:"workflow_id"`
 	ExecutionID string `json:"execution_id"`
+	TraceID     string `json:"trace_id,omitempty"`
 	Success     bool   `json:"success"`
 	Error       string `json:"error,omitempty"`
 	ErrorClass  string `json:"error_class,omitempty"`
+	// Retryable is set on failures only; the Step Function skips its retry loop when it is false
+	Retryable *bool `json:"retryable,omitempty"`
+	Attempts  int   `json:"attempts,omitempty"`
 }
 
 // MessageData represents the data to be published to Pub/Sub
 type MessageData struct {
-	CustomMessage   string `json:"custom_message"`
-	Timestamp       string `json:"timestamp,omitempty"`
-	Source          string `json:"source"`
-	WorkflowID      string `json:"workflow_id"`
-	ExecutionID     string `json:"execution_id"`
-	LambdaRequestID string `json:"lambda_request_id"`
-	TriggerTime     string `json:"trigger_time,omitempty"`
+	CustomMessage   string       `json:"custom_message"`
+	Timestamp       string       `json:"timestamp,omitempty"`
+	Source          string       `json:"source"`
+	WorkflowID      string       `json:"workflow_id"`
+	ExecutionID     string       `json:"execution_id"`
+	LambdaRequestID string       `json:"lambda_request_id"`
+	TriggerTime     string       `json:"trigger_time,omitempty"`
+	Trace           TraceContext `json:"trace"`
 }
 
 // LambdaContext represents the lambda context
@@ -49,9 +78,62 @@ type LambdaContext struct {
 }
 
 func main() {
+	// TRIGGER_DAG_LOCAL=true invokes the handler for JSON events on stdin instead of the Lambda runtime
+	if os.Getenv("TRIGGER_DAG_LOCAL") == "true" {
+		runLocal()
+		return
+	}
 	lambda.Start(handler)
 }
 
+// findTrace returns the trace carried by the event, including traces nested under
+// Step Function ResultPaths; the one with the most hops wins
+func findTrace(event LambdaEvent) *TraceContext {
+	var found *TraceContext
+	candidates := []*TraceContext{event.Trace}
+	if event.HelloWorldResult != nil {
+		candidates = append(candidates, event.HelloWorldResult.Trace)
+	}
+	if event.TimestampResult != nil {
+		candidates = append(candidates, event.TimestampResult.Trace)
+	}
+	for _, candidate := range candidates {
+		if candidate != nil && candidate.TraceID != "" && (found == nil || len(candidate.Hops) > len(found.Hops)) {
+			found = candidate
+		}
+	}
+	return found
+}
+
+// recordHop continues the parent trace, or starts a new one, with hop and logs a trace_hop record
+func recordHop(parent *TraceContext, hop string) TraceContext {
+	trace := TraceContext{}
+	if parent != nil {
+		trace.TraceID = parent.TraceID
+		trace.Hops = append(trace.Hops, parent.Hops...)
+	} else {
+		id := make([]byte, 16)
+		_, _ = rand.Read(id)
+		trace.TraceID = hex.EncodeToString(id)
+	}
+	trace.Hops = append(trace.Hops, TraceHop{Hop: hop, Ts: time.Now().UnixMilli()})
+
+	record, _ := json.Marshal(map[string]interface{}{"msg": "trace_hop", "trace_id": trace.TraceID, "hop": hop, "trace": trace})
+	log.Printf("%s", record)
+	return trace
+}
+
+// diagnosticsEnabled makes the STS caller identity check opt-in via DIAGNOSTICS=true or event.Diagnostics
+func diagnosticsEnabled(event LambdaEvent) bool {
+	return event.Diagnostics || strings.ToLower(os.Getenv("DIAGNOSTICS")) == "true"
+}
+
+// retryable classifies err for LambdaResponse.Retryable
+func retryable(err error) *bool {
+	value := isRetryable(err)
+	return &value
+}
+
 func handler(ctx context.Context, event LambdaEvent) (LambdaResponse, error) {
 	log.Printf("Trigger DAG Lambda function started")
 	eventJSON, _ := json.MarshalIndent(event, "", "  ")
@@ -66,31 +148,35 @@ func handler(ctx context.Context, event LambdaEvent) (LambdaResponse, error) {
 	log.Printf("Pub/Sub Topic: %s", pubsubTopicID)
 	log.Printf("GCP Project ID: %s", gcpProjectID)
 
-	// Get caller identity to verify WIF is working
-	cfg, err := config.LoadDefaultConfig(ctx)
-	if err != nil {
-		return LambdaResponse{
-			Message:    "Error occurred while triggering DAG",
-			Error:      fmt.Sprintf("Failed to load AWS config: %v", err),
-			ErrorClass: "ConfigError",
-			Success:    false,
-		}, nil
+	// Get caller identity to verify WIF is working, opt-in like the Python handler
+	if diagnosticsEnabled(event) {
+		cfg, err := config.LoadDefaultConfig(ctx)
+		if err != nil {
+			return LambdaResponse{
+				Message:    "Error occurred while triggering DAG",
+				Error:      fmt.Sprintf("Failed to load AWS config: %v", err),
+				ErrorClass: "ConfigError",
+				Retryable:  retryable(err),
+				Success:    false,
+			}, nil
+		}
+
+		stsClient := sts.NewFromConfig(cfg)
+		callerIdentity, err := stsClient.GetCallerIdentity(ctx, &sts.GetCallerIdentityInput{})
+		if err != nil {
+			return LambdaResponse{
+				Message:    "Error occurred while triggering DAG",
+				Error:      fmt.Sprintf("Failed to get caller identity: %v", err),
+				ErrorClass: "STSError",
+				Retryable:  retryable(err),
+				Success:    false,
+			}, nil
+		}
+
+		callerIdentityJSON, _ := json.MarshalIndent(callerIdentity, "", "  ")
+		log.Printf("Caller Identity: %s", string(callerIdentityJSON))
 	}
 
-	stsClient := sts.NewFromConfig(cfg)
-	callerIdentity, err := stsClient.GetCallerIdentity(ctx, &sts.GetCallerIdentityInput{})
-	if err != nil {
-		return LambdaResponse{
-			Message:    "Error occurred while triggering DAG",
-			Error:      fmt.Sprintf("Failed to get caller identity: %v", err),
-			ErrorClass: "STSError",
-			Success:    false,
-		}, nil
-	}
-
-	callerIdentityJSON, _ := json.MarshalIndent(callerIdentity, "", "  ")
-	log.Printf("Caller Identity: %s", string(callerIdentityJSON))
-
 	// Create Pub/Sub client
 	pubsubClient, err := pubsub.NewClient(ctx, gcpProjectID)
 	if err != nil {
@@ -98,6 +184,7 @@ func handler(ctx context.Context, event LambdaEvent) (LambdaResponse, error) {
 			Message:    "Error occurred while triggering DAG",
 			Error:      fmt.Sprintf("Failed to create Pub/Sub client: %v", err),
 			ErrorClass: "PubSubClientError",
+			Retryable:  retryable(err),
 			Success:    false,
 		}, nil
 	}
@@ -107,12 +194,16 @@ func handler(ctx context.Context, event LambdaEvent) (LambdaResponse, error) {
 	publisher := pubsubClient.Publisher(pubsubTopicID)
 
 	// Prepare the message data
+	now := time.Now().UTC().Format(time.RFC3339Nano)
 	messageData := MessageData{
 		CustomMessage:   fmt.Sprintf("Hello from AWS Step Function! Workflow: %s", event.WorkflowID),
+		Timestamp:       now,
 		Source:          "aws_step_function",
 		WorkflowID:      event.WorkflowID,
 		ExecutionID:     event.ExecutionID,
 		LambdaRequestID: "go-lambda-request-id", // Go lambda doesn't provide request ID in the same way
+		TriggerTime:     now,
+		Trace:           recordHop(findTrace(event), "trigger_dag"),
 	}
 
 	// Convert to JSON string
@@ -122,27 +213,22 @@ func handler(ctx context.Context, event LambdaEvent) (LambdaResponse, error) {
 			Message:    "Error occurred while triggering DAG",
 			Error:      fmt.Sprintf("Failed to marshal message data: %v", err),
 			ErrorClass: "JSONMarshalError",
+			Retryable:  new(bool),
 			Success:    false,
 		}, nil
 	}
 
 	log.Printf("Publishing message to Pub/Sub: %s", string(messageJSON))
 
-	// Publish the message
-	publishCtx, cancel := context.WithTimeout(ctx, 30*time.Second)
-	defer cancel()
-
-	result := publisher.Publish(publishCtx, &pubsub.Message{
-		Data: messageJSON,
-	})
-
-	// Wait for the message to be published
-	messageID, err := result.Get(publishCtx)
-	if err != nil {
+	// Publish the message, retrying within the Lambda's remaining time
+	messageID, attempts, publishErr := publishWithRetry(ctx, publisher, messageJSON, publishDeadline(ctx))
+	if publishErr != nil {
 		return LambdaResponse{
 			Message:    "Error occurred while triggering DAG",
-			Error:      fmt.Sprintf("Failed to publish message: %v", err),
-			ErrorClass: "PublishError",
+			Error:      fmt.Sprintf("Failed to publish message: %v", publishErr),
+			ErrorClass: publishErr.ErrorClass,
+			Retryable:  &publishErr.Retryable,
+			Attempts:   publishErr.Attempts,
 			Success:    false,
 		}, nil
 	}
@@ -154,6 +240,8 @@ func handler(ctx context.Context, event LambdaEvent) (LambdaResponse, error) {
 		MessageID:   messageID,
 		WorkflowID:  event.WorkflowID,
 		ExecutionID: event.ExecutionID,
+		TraceID:     messageData.Trace.TraceID,
+		Attempts:    attempts,
 		Success:     true,
 	}
 
@@ -0,0 +1,140 @@
+package main
+
+import (
+	"context"
+	"errors"
+	"log"
+	"net"
+	"os"
+	"strconv"
+	"time"
+
+	"cloud.google.com/go/pubsub/v2"
+	"google.golang.org/grpc/codes"
+	"google.golang.org/grpc/status"
+)
+
+// Publish deadline: attempts and backoff must fit into the Lambda's remaining time minus the safety
+// margin, so the handler reports the failure itself instead of being killed by the Lambda timeout.
+// Same environment variables and defaults as the Python handler.
+var (
+	publishSafetyMargin   = envDuration("PUBLISH_SAFETY_MARGIN_MS", 2000, time.Millisecond)
+	publishAttemptTimeout = envDuration("PUBLISH_ATTEMPT_TIMEOUT_SECONDS", 10, time.Second)
+	publishRetryBaseDelay = envDuration("PUBLISH_RETRY_BASE_DELAY_SECONDS", 0.2, time.Second)
+	publishRetryMaxDelay  = envDuration("PUBLISH_RETRY_MAX_DELAY_SECONDS", 2, time.Second)
+)
+
+// Shortest attempt worth starting, and the budget used when the context has no deadline (local runs)
+const (
+	publishMinAttemptTime = 500 * time.Millisecond
+	publishDefaultBudget  = 30 * time.Second
+)
+
+// Transient gRPC status codes worth retrying, the same classes as RETRYABLE_ERRORS in the Python handler
+var retryableCodes = map[codes.Code]bool{
+	codes.Aborted:           true,
+	codes.Canceled:          true,
+	codes.DeadlineExceeded:  true,
+	codes.Internal:          true,
+	codes.ResourceExhausted: true,
+	codes.Unavailable:       true,
+	codes.Unknown:           true,
+}
+
+// PublishError is a publish that failed for good: a non-retryable error, or the retry budget ran out
+type PublishError struct {
+	Err        error
+	ErrorClass string
+	Attempts   int
+	Retryable  bool
+}
+
+func (e *PublishError) Error() string {
+	return e.Err.Error()
+}
+
+func envDuration(name string, defaultValue float64, unit time.Duration) time.Duration {
+	value, err := strconv.ParseFloat(os.Getenv(name), 64)
+	if err != nil {
+		value = defaultValue
+	}
+	return time.Duration(value * float64(unit))
+}
+
+// isRetryable returns true if err is transient, so that publishing again later may succeed
+func isRetryable(err error) bool {
+	if errors.Is(err, context.DeadlineExceeded) || errors.Is(err, context.Canceled) {
+		return true
+	}
+	var netErr net.Error
+	if errors.As(err, &netErr) {
+		return true
+	}
+	if st, ok := status.FromError(err); ok {
+		return retryableCodes[st.Code()]
+	}
+	return false
+}
+
+// errorClass names err like the Python handler's error_class: the gRPC status code, or the context error
+func errorClass(err error) string {
+	switch {
+	case errors.Is(err, context.DeadlineExceeded):
+		return "DeadlineExceeded"
+	case errors.Is(err, context.Canceled):
+		return "Cancelled"
+	}
+	if st, ok := status.FromError(err); ok {
+		return st.Code().String()
+	}
+	return "PublishError"
+}
+
+// publishDeadline is the time by which publishing must be done, from the Lambda's deadline
+func publishDeadline(ctx context.Context) time.Time {
+	deadline, ok := ctx.Deadline()
+	if !ok {
+		deadline = time.Now().Add(publishDefaultBudget)
+	}
+	return deadline.Add(-publishSafetyMargin)
+}
+
+// retryDelay is the exponential backoff before the next attempt
+func retryDelay(attempt int) time.Duration {
+	// Cap the exponent, the delay is capped long before the multiplication could overflow
+	return min(publishRetryMaxDelay, publishRetryBaseDelay*time.Duration(1<<min(attempt-1, 16)))
+}
+
+// publishWithRetry publishes data, retrying transient errors until deadline. Every attempt is
+// bounded by the time left, so the retries never outlast the Lambda. Returns the message ID and
+// the number of attempts, or the error that ended the retries.
+func publishWithRetry(ctx context.Context, publisher *pubsub.Publisher, data []byte, deadline time.Time) (string, int, *PublishError) {
+	// Bound the client's own RPC retries by a single attempt
+	publisher.PublishSettings.Timeout = publishAttemptTimeout
+
+	attempts := 0
+	for {
+		timeout := min(publishAttemptTimeout, time.Until(deadline))
+		if timeout < publishMinAttemptTime || ctx.Err() != nil {
+			err := errors.New("not enough time left in the Lambda to publish")
+			return "", attempts, &PublishError{Err: err, ErrorClass: "TimeoutError", Attempts: attempts, Retryable: true}
+		}
+
+		attempts++
+		attemptCtx, cancel := context.WithTimeout(ctx, timeout)
+		messageID, err := publisher.Publish(attemptCtx, &pubsub.Message{Data: data}).Get(attemptCtx)
+		cancel()
+		if err == nil {
+			return messageID, attempts, nil
+		}
+
+		retryable := isRetryable(err)
+		delay := retryDelay(attempts)
+		log.Printf("Publish attempt %d failed (retryable=%t, remaining=%s): %v", attempts, retryable,
+			time.Until(deadline).Round(time.Millisecond), err)
+		if !retryable || time.Until(deadline) < delay+publishMinAttemptTime {
+			return "", attempts, &PublishError{Err: err, ErrorClass: errorClass(err), Attempts: attempts, Retryable: retryable}
+		}
+		time.Sleep(delay)
+	}
+}
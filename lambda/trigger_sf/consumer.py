@@ -0,0 +1,128 @@
+"""
+Long-running Pub/Sub StreamingPull consumer that triggers AWS Step Functions.
+
+Runs the same message-processing core as the trigger_sf Lambda (processor.py),
+but receives messages as soon as they are published instead of polling once a
+minute. Works against the Pub/Sub emulator when PUBSUB_EMULATOR_HOST is set.
+
+Usage (the shared modules are copied into the package by build.sh, add them to the path locally):
+    PYTHONPATH=../../shared python consumer.py --subscription projects/<project>/subscriptions/<name> \
+        --state-machine-arn arn:aws:states:...
+"""
+
+import argparse
+import logging
+import os
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import boto3
+from google.cloud import pubsub_v1
+from google.cloud.pubsub_v1.subscriber.scheduler import ThreadScheduler
+import processor
+from processor import handle_message, RETRY
+
+logger = logging.getLogger(__name__)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Pub/Sub StreamingPull consumer that triggers AWS Step Functions')
+    parser.add_argument('--subscription', default=os.environ.get('PUBSUB_SUBSCRIPTION_PATH'),
+                        help='Full subscription path (default: $PUBSUB_SUBSCRIPTION_PATH)')
+    parser.add_argument('--state-machine-arn', default=os.environ.get('STEP_FUNCTION_ARN'),
+                        help='State machine to start (default: $STEP_FUNCTION_ARN)')
+    parser.add_argument('--max-messages', type=int, default=100,
+                        help='Flow control: maximum number of outstanding messages (default: 100)')
+    parser.add_argument('--max-bytes', type=int, default=10 * 1024 * 1024,
+                        help='Flow control: maximum outstanding message bytes (default: 10 MiB)')
+    parser.add_argument('--max-workers', type=int, default=10,
+                        help='Size of the callback thread pool (default: 10)')
+    parser.add_argument('--sfn-endpoint-url', default=os.environ.get('SFN_ENDPOINT_URL'),
+                        help='Step Functions endpoint override, e.g. Step Functions Local (default: $SFN_ENDPOINT_URL)')
+    parser.add_argument('--log-level', default='INFO')
+    args = parser.parse_args(argv)
+
+    if not args.subscription or not args.state_machine_arn:
+        parser.error('--subscription and --state-machine-arn are required')
+    return args
+
+
+def create_subscriber():
+    """Create the subscriber, using application default credentials unless the emulator is in use"""
+    if os.environ.get('PUBSUB_EMULATOR_HOST'):
+        return pubsub_v1.SubscriberClient()
+
+    from google.auth import default
+    credentials, project = default()
+    return pubsub_v1.SubscriberClient(credentials=credentials)
+
+
+def make_callback(sfn_client, step_function_arn):
+    """Return the StreamingPull callback that starts one execution per message"""
+
+    def callback(message):
+        default_execution_name = f"pubsub-consumer-{message.message_id}"
+        outcome = handle_message(message.data, default_execution_name, sfn_client, step_function_arn)
+        # Same semantics as the Lambda: ack once the execution has started or failed permanently,
+        # nack transient failures so that Pub/Sub redelivers them
+        if outcome == RETRY:
+            message.nack()
+        else:
+            message.ack()
+
+    return callback
+
+
+def run(args):
+    sfn_client = boto3.client('stepfunctions', endpoint_url=args.sfn_endpoint_url)
+    subscriber = create_subscriber()
+
+    flow_control = pubsub_v1.types.FlowControl(max_messages=args.max_messages, max_bytes=args.max_bytes)
+    executor = ThreadPoolExecutor(max_workers=args.max_workers, thread_name_prefix='trigger-sf-callback')
+    scheduler = ThreadScheduler(executor=executor)
+
+    streaming_pull_future = subscriber.subscribe(
+        args.subscription,
+        callback=make_callback(sfn_client, args.state_machine_arn),
+        flow_control=flow_control,
+        scheduler=scheduler,
+        await_callbacks_on_shutdown=True,
+    )
+    logger.info(f"Listening on {args.subscription} (max_messages={args.max_messages}, "
+                f"max_bytes={args.max_bytes}, max_workers={args.max_workers})")
+
+    shutdown = threading.Event()
+
+    def request_shutdown(signum, frame):
+        logger.info(f"Received signal {signum}, shutting down")
+        shutdown.set()
+
+    signal.signal(signal.SIGTERM, request_shutdown)
+    signal.signal(signal.SIGINT, request_shutdown)
+
+    with subscriber:
+        while not shutdown.is_set() and not streaming_pull_future.done():
+            shutdown.wait(1)
+
+        # Stop receiving new messages and wait for in-flight callbacks to finish
+        streaming_pull_future.cancel()
+        try:
+            streaming_pull_future.result()
+        except Exception as e:
+            logger.error(f"Streaming pull terminated with error: {e}")
+            return 1
+        finally:
+            processor.dedup_index.save()
+
+    logger.info("Consumer stopped")
+    return 0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level, format='%(asctime)s %(levelname)s %(name)s %(message)s')
+    return run(args)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
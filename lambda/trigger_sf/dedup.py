@@ -0,0 +1,91 @@
+"""
+Dedup index of Step Function execution names that were already started.
+
+An in-memory LRU with a TTL, optionally persisted to a JSON file under /tmp so
+it survives across warm Lambda invocations of the same container. Redelivered
+Pub/Sub messages whose execution name is in the index are acked without a
+StartExecution round trip.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class DedupIndex:
+    """Thread-safe LRU set of execution names with per-entry expiry"""
+
+    def __init__(self, ttl_seconds, max_entries, persist_path=None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.persist_path = persist_path
+        self._entries = OrderedDict()  # name -> expiry (epoch seconds)
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def contains(self, name):
+        """Return True if name was recorded and has not expired"""
+        with self._lock:
+            expiry = self._entries.get(name)
+            if expiry is None:
+                return False
+            if expiry < time.time():
+                del self._entries[name]
+                self._dirty = True
+                return False
+            self._entries.move_to_end(name)
+            return True
+
+    def add(self, name):
+        """Record name, evicting the least recently used entries above max_entries"""
+        with self._lock:
+            self._entries[name] = time.time() + self.ttl_seconds
+            self._entries.move_to_end(name)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty = True
+
+    def load(self):
+        """Load unexpired entries from persist_path, if it exists"""
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable dedup index {self.persist_path}: {e}")
+            return
+
+        now = time.time()
+        with self._lock:
+            for name, expiry in entries:
+                if expiry >= now:
+                    self._entries[name] = expiry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        logger.info(f"Loaded {len(self._entries)} dedup entries from {self.persist_path}")
+
+    def save(self):
+        """Write unexpired entries to persist_path if anything changed"""
+        if not self.persist_path or not self._dirty:
+            return
+        now = time.time()
+        with self._lock:
+            entries = [[name, expiry] for name, expiry in self._entries.items() if expiry >= now]
+            self._dirty = False
+        try:
+            tmp_path = f"{self.persist_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.persist_path)
+        except OSError as e:
+            logger.warning(f"Error saving dedup index to {self.persist_path}: {e}")
@@ -1,15 +1,354 @@
 import json
 import os
 import logging
-import boto3
-from google.cloud import pubsub_v1
-from google.pubsub_v1 import types
-from google.auth import default
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import processor
+from credential_cache import credential_metrics, get_credentials
+from log_utils import StructuredLogger
+from processor import handle_message, RETRY
+from profiling import profiled, section
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
+log = StructuredLogger(logger)
 
+# boto3 and the Google Cloud libraries are imported inside the functions that use
+# them to keep module import (and therefore the cold start init phase) cheap
+
+# Maximum number of concurrent StartExecution calls per batch
+START_EXECUTION_CONCURRENCY = int(os.environ.get('START_EXECUTION_CONCURRENCY', '10'))
+
+# Drain mode keeps pulling batches until the subscription is empty or the time budget runs out
+DRAIN_MODE = os.environ.get('DRAIN_MODE', 'false').lower() == 'true'
+DRAIN_SAFETY_MARGIN_MS = int(os.environ.get('DRAIN_SAFETY_MARGIN_MS', '10000'))
+PULL_MAX_MESSAGES = int(os.environ.get('PULL_MAX_MESSAGES', '10'))
+# Timeout of each pull in drain mode, capped at the remaining budget. The pull that finds
+# the subscription empty waits this long, not until the budget is used up.
+DRAIN_PULL_TIMEOUT_SECONDS = float(os.environ.get('DRAIN_PULL_TIMEOUT_SECONDS', '5'))
+
+# google.api_core.exceptions raised by a pull that timed out without messages, matched by
+# class name so that the Google libraries stay out of module import. The client's retry wraps
+# the timeout in a RetryError, which only counts when its cause is the timeout.
+EMPTY_PULL_ERROR = 'DeadlineExceeded'
+RETRY_ERROR = 'RetryError'
+
+# Ack deadline extension for in-flight messages
+ACK_DEADLINE_SECONDS = int(os.environ.get('ACK_DEADLINE_SECONDS', '60'))
+ACK_EXTENSION_INTERVAL_SECONDS = float(os.environ.get('ACK_EXTENSION_INTERVAL_SECONDS', '20'))
+
+# Ack deadline set on transiently failed messages, Pub/Sub redelivers them once it expires
+RETRY_ACK_DEADLINE_SECONDS = int(os.environ.get('RETRY_ACK_DEADLINE_SECONDS', '10'))
+
+# Coalescing mode groups the messages pulled within a window into executions of
+# COALESCE_STEP_FUNCTION_ARN, whose Map state processes the items (see processor.py for the group limits)
+COALESCE_MODE = os.environ.get('COALESCE_MODE', 'false').lower() == 'true'
+COALESCE_WINDOW_MS = int(os.environ.get('COALESCE_WINDOW_MS', '2000'))
+
+
+def create_sfn_client():
+    import boto3
+
+    return boto3.client('stepfunctions')
+
+
+def create_subscriber():
+    from google.cloud import pubsub_v1
+
+    # Reuses the access token of earlier invocations instead of repeating the WIF token exchange
+    return pubsub_v1.SubscriberClient(credentials=get_credentials())
+
+
+def process_message(received_message, index, sfn_client, step_function_arn, context):
+    """
+    Start the Step Function execution for a single pulled Pub/Sub message.
+
+    Returns:
+        str: Message outcome, see processor.handle_message
+    """
+    default_execution_name = f"pubsub-lambda-{context.aws_request_id}-{index}"
+    return handle_message(received_message.message.data, default_execution_name, sfn_client, step_function_arn)
+
+
+def process_messages(received_messages, sfn_client, step_function_arn, context):
+    """
+    Start Step Function executions for a batch of messages on a bounded thread pool,
+    so the batch takes roughly as long as the slowest StartExecution call.
+
+    Returns:
+        list: (received_message, outcome) tuples, in the order the messages were received
+    """
+    max_workers = max(1, min(START_EXECUTION_CONCURRENCY, len(received_messages)))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            (received_message, executor.submit(process_message, received_message, index, sfn_client, step_function_arn, context))
+            for index, received_message in enumerate(received_messages)
+        ]
+        # Wait until each message's execution has started (or failed) before acking it
+        return [(received_message, future.result()) for received_message, future in futures]
+
+
+def process_coalesced(received_messages, sfn_client, step_function_arn, context):
+    """
+    Start one execution per group of messages instead of one per message.
+
+    Invalid messages, messages in the dedup index and repeated copies of a message within
+    the window get their own outcome. The others are grouped (processor.group_items) and
+    every message gets the outcome of its group's execution, so a failed group is
+    redelivered without affecting the other groups.
+
+    Returns:
+        tuple: (list of (received_message, outcome) tuples in the order received, number of executions)
+    """
+    outcomes = {}
+    pending = []
+    seen = set()
+    for index, received_message in enumerate(received_messages):
+        default_execution_name = f"pubsub-lambda-{context.aws_request_id}-{index}"
+        outcome, execution_name, message_json = processor.decode_message(received_message.message.data, default_execution_name)
+        if outcome is None and execution_name in seen:
+            outcome = processor.DUPLICATE
+        if outcome is not None:
+            outcomes[index] = outcome
+            continue
+        seen.add(execution_name)
+        pending.append((index, processor.coalesced_item(message_json, execution_name, received_message.message.message_id)))
+
+    groups = processor.group_items(pending)
+    if groups:
+        max_workers = max(1, min(START_EXECUTION_CONCURRENCY, len(groups)))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                (group, executor.submit(processor.start_coalesced_execution, [item for _, item in group], sfn_client, step_function_arn))
+                for group in groups
+            ]
+            for group, future in futures:
+                outcome = future.result()
+                for index, _ in group:
+                    outcomes[index] = outcome
+
+    return [(received_message, outcomes[index]) for index, received_message in enumerate(received_messages)], len(groups)
+
+
+class AckDeadlineExtender:
+    """
+    Context manager that periodically extends the ack deadline of in-flight messages
+    on a background thread until processing of the batch has finished.
+    """
+
+    def __init__(self, subscriber, subscription_path, ack_ids):
+        self.subscriber = subscriber
+        self.subscription_path = subscription_path
+        self.ack_ids = ack_ids
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stopped.wait(ACK_EXTENSION_INTERVAL_SECONDS):
+            try:
+                self.subscriber.modify_ack_deadline(
+                    subscription=self.subscription_path,
+                    ack_ids=self.ack_ids,
+                    ack_deadline_seconds=ACK_DEADLINE_SECONDS
+                )
+                log.info('ack_deadline_extended', count=len(self.ack_ids), ack_deadline_seconds=ACK_DEADLINE_SECONDS)
+            except Exception as e:
+                log.warning('ack_deadline_extension_failed', error=str(e))
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stopped.set()
+        self._thread.join()
+
+
+def is_named(error, name):
+    """True if error is an instance of a class called name"""
+    return any(cls.__name__ == name for cls in type(error).__mro__)
+
+
+def is_empty_pull(error):
+    """True if error is a pull timing out without messages, possibly wrapped in a RetryError"""
+    if is_named(error, RETRY_ERROR):
+        error = getattr(error, 'cause', None)
+    return error is not None and is_named(error, EMPTY_PULL_ERROR)
+
+
+def pull_messages(subscriber, subscription_path, max_messages, timeout=None):
+    """
+    Pull up to max_messages messages. A pull that times out before any message
+    arrives raises DeadlineExceeded (or a RetryError caused by it) instead of
+    returning an empty response; it is returned as an empty list. Any other
+    error is raised.
+
+    Returns:
+        list: Received messages
+    """
+    # Only override the client's default timeout when a time budget applies
+    pull_kwargs = {'timeout': timeout} if timeout is not None else {}
+    try:
+        with section('pull'):
+            response = subscriber.pull(subscription=subscription_path, max_messages=max_messages, **pull_kwargs)
+    except Exception as e:
+        if not is_empty_pull(e):
+            raise
+        log.info('pull_timed_out', timeout=timeout, error_class=e.__class__.__name__)
+        return []
+    return list(response.received_messages)
+
+
+def pull_and_process(subscriber, subscription_path, sfn_client, step_function_arn, context, pull_timeout=None):
+    """
+    Pull one batch of messages, start their executions and acknowledge them.
+    Transiently failed messages are nacked with a short ack deadline instead.
+
+    Returns:
+        Counter: Number of messages received and per outcome
+    """
+    received_messages = pull_messages(subscriber, subscription_path, PULL_MAX_MESSAGES, pull_timeout)
+    counts = Counter(received=len(received_messages))
+    if not received_messages:
+        return counts
+
+    batch_start = time.perf_counter()
+    with AckDeadlineExtender(subscriber, subscription_path, [m.ack_id for m in received_messages]):
+        outcomes = process_messages(received_messages, sfn_client, step_function_arn, context)
+    counts.update(outcome for _, outcome in outcomes)
+    log.info('batch_processed', duration_ms=round((time.perf_counter() - batch_start) * 1000, 1), **counts)
+
+    acknowledge_outcomes(subscriber, subscription_path, outcomes)
+    return counts
+
+
+def pull_window(subscriber, subscription_path, window_seconds):
+    """
+    Keep pulling until window_seconds have passed, a pull comes back empty or
+    COALESCE_MAX_MESSAGES messages were received.
+
+    Returns:
+        list: Received messages
+    """
+    received_messages = []
+    deadline = time.monotonic() + window_seconds
+    while len(received_messages) < processor.COALESCE_MAX_MESSAGES:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        max_messages = min(PULL_MAX_MESSAGES, processor.COALESCE_MAX_MESSAGES - len(received_messages))
+        # A pull timing out at the end of the window returns nothing and keeps the messages received so far
+        pulled = pull_messages(subscriber, subscription_path, max_messages, remaining)
+        if not pulled:
+            break
+        received_messages.extend(pulled)
+    return received_messages
+
+
+def pull_and_coalesce(subscriber, subscription_path, sfn_client, step_function_arn, context, pull_timeout=None):
+    """
+    Coalescing mode counterpart of pull_and_process: pull for up to COALESCE_WINDOW_MS,
+    start one execution per group of messages and acknowledge them.
+
+    Returns:
+        Counter: Number of messages received, per outcome, and of coalesced executions
+    """
+    window_seconds = COALESCE_WINDOW_MS / 1000
+    if pull_timeout is not None:
+        window_seconds = min(window_seconds, pull_timeout)
+    received_messages = pull_window(subscriber, subscription_path, window_seconds)
+    counts = Counter(received=len(received_messages))
+    if not received_messages:
+        return counts
+
+    batch_start = time.perf_counter()
+    with AckDeadlineExtender(subscriber, subscription_path, [m.ack_id for m in received_messages]):
+        outcomes, executions = process_coalesced(received_messages, sfn_client, step_function_arn, context)
+    counts.update(outcome for _, outcome in outcomes)
+    counts['executions'] += executions
+    log.info('batch_processed', duration_ms=round((time.perf_counter() - batch_start) * 1000, 1), **counts)
+
+    acknowledge_outcomes(subscriber, subscription_path, outcomes)
+    return counts
+
+
+def acknowledge_outcomes(subscriber, subscription_path, outcomes):
+    """Acknowledge the messages of a processed batch, nacking the transiently failed ones"""
+    ack_ids = [m.ack_id for m, outcome in outcomes if outcome != RETRY]
+    retry_ack_ids = [m.ack_id for m, outcome in outcomes if outcome == RETRY]
+
+    # Acknowledge started, duplicate and permanently failed messages
+    if ack_ids:
+        with section('ack'):
+            subscriber.acknowledge(subscription=subscription_path, ack_ids=ack_ids)
+        log.info('messages_acknowledged', count=len(ack_ids))
+
+    # Let transiently failed messages be redelivered after a short delay
+    if retry_ack_ids:
+        with section('ack'):
+            subscriber.modify_ack_deadline(
+                subscription=subscription_path,
+                ack_ids=retry_ack_ids,
+                ack_deadline_seconds=RETRY_ACK_DEADLINE_SECONDS
+            )
+        log.info('messages_nacked', count=len(retry_ack_ids), redelivery_seconds=RETRY_ACK_DEADLINE_SECONDS)
+
+
+def drain(subscriber, subscription_path, sfn_client, step_function_arn, context):
+    """
+    Keep pulling and processing batches until the subscription is empty or the
+    remaining invocation time reaches DRAIN_SAFETY_MARGIN_MS.
+
+    Returns:
+        tuple: (counts, pulls)
+    """
+    counts = Counter()
+    pulls = 0
+    while True:
+        remaining_ms = context.get_remaining_time_in_millis()
+        budget_ms = remaining_ms - DRAIN_SAFETY_MARGIN_MS
+        if budget_ms <= 0:
+            log.info('drain_stopped', remaining_time_ms=remaining_ms)
+            break
+
+        batch_counts = pull_batch(
+            subscriber, subscription_path, sfn_client, step_function_arn, context,
+            pull_timeout=min(DRAIN_PULL_TIMEOUT_SECONDS, budget_ms / 1000)
+        )
+        pulls += 1
+        counts.update(batch_counts)
+        if not batch_counts['received']:
+            log.info('subscription_drained')
+            break
+
+    return counts, pulls
+
+
+def pull_batch(*args, **kwargs):
+    """pull_and_coalesce in coalescing mode, else pull_and_process"""
+    if COALESCE_MODE:
+        return pull_and_coalesce(*args, **kwargs)
+    return pull_and_process(*args, **kwargs)
+
+
+def summarize(counts):
+    """Build the response body statistics from the message outcome counts"""
+    stats = {
+        'received_count': counts['received'],
+        'processed_count': counts[processor.STARTED],
+        'duplicate_count': counts[processor.DUPLICATE],
+        'failed_count': counts[processor.INVALID],
+        'retry_count': counts[processor.RETRY]
+    }
+    if COALESCE_MODE:
+        stats['execution_count'] = counts['executions']
+    return stats
+
+
+@profiled
 def lambda_handler(event, context):
     """
     Lambda function that pulls messages from Pub/Sub and triggers AWS Step Function
@@ -18,96 +357,65 @@ def lambda_handler(event, context):
         # Get configuration from environment variables
         subscription_path = os.environ.get('PUBSUB_SUBSCRIPTION_PATH')
         step_function_arn = os.environ.get('STEP_FUNCTION_ARN')
-        
+        if COALESCE_MODE:
+            step_function_arn = os.environ.get('COALESCE_STEP_FUNCTION_ARN') or step_function_arn
+
         if not subscription_path or not step_function_arn:
             raise ValueError("Missing required environment variables: PUBSUB_SUBSCRIPTION_PATH or STEP_FUNCTION_ARN")
 
-        logger.info(f'Google Application Credentials: {os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")}')
-        logger.info(f'Pub/Sub Subscription: {subscription_path}')
-        logger.info(f'Step Function ARN: {step_function_arn}')
-
-        # Initialize AWS Step Functions client
-        sfn_client = boto3.client('stepfunctions')
-        
-        # Initialize Google Cloud Pub/Sub client
-        credentials, project = default()
-        subscriber = pubsub_v1.SubscriberClient(credentials=credentials)
-        
-        # Pull messages from Pub/Sub (max 10 messages at a time)
-        request = types.pubsub.PullRequest(
-            subscription=subscription_path,
-            max_messages=10
+        log.info(
+            'config',
+            google_application_credentials=os.environ.get('GOOGLE_APPLICATION_CREDENTIALS'),
+            pubsub_subscription=subscription_path,
+            step_function_arn=step_function_arn
         )
-        
-        response = subscriber.pull(request=request)
-        
-        if not response.received_messages:
-            logger.info("No messages received from Pub/Sub")
+
+        # Initialize AWS Step Functions and Google Cloud Pub/Sub clients
+        with section('client_init'):
+            sfn_client = create_sfn_client()
+            subscriber = create_subscriber()
+
+        try:
+            if DRAIN_MODE:
+                counts, pulls = drain(subscriber, subscription_path, sfn_client, step_function_arn, context)
+                stats = {
+                    **summarize(counts),
+                    'pulls': pulls,
+                    'remaining_time_ms': context.get_remaining_time_in_millis()
+                }
+                log.info('drain_finished', **stats)
+                return {
+                    'statusCode': 200,
+                    'body': json.dumps({
+                        'message': f"Successfully processed {stats['processed_count']} messages",
+                        **stats
+                    })
+                }
+
+            counts = pull_batch(subscriber, subscription_path, sfn_client, step_function_arn, context)
+        finally:
+            # Keep the dedup index for the next warm invocation
+            processor.dedup_index.save()
+            log.info('credential_cache', caches=credential_metrics())
+
+        if not counts['received']:
+            log.info('no_messages')
             return {
                 'statusCode': 200,
                 'body': json.dumps({'message': 'No messages to process'})
             }
-        
-        processed_count = 0
-        ack_ids = []
-        
-        for received_message in response.received_messages:
-            try:
-                # Decode the message data
-                message_data = received_message.message.data.decode('utf-8')
-                logger.info(f"Received message: {message_data}")
-                
-                # Parse the JSON message
-                message_json = json.loads(message_data)
-                
-                # Generate a unique execution name
-                execution_name = message_json.get('name', f"pubsub-lambda-{context.aws_request_id}-{processed_count}")
-                
-                # Trigger the Step Function with the message content as input
-                step_function_input = message_json
-                
-                # Start Step Function execution
-                response = sfn_client.start_execution(
-                    stateMachineArn=step_function_arn,
-                    name=execution_name,
-                    input=json.dumps(step_function_input)
-                )
-                
-                logger.info(f"Started Step Function execution: {response['executionArn']}")
-                processed_count += 1
-                
-                # Add message to acknowledgment list
-                ack_ids.append(received_message.ack_id)
-                
-            except json.JSONDecodeError as e:
-                logger.error(f"Error parsing JSON message: {e}")
-                # Still acknowledge the message to avoid infinite retries
-                ack_ids.append(received_message.ack_id)
-                
-            except Exception as e:
-                logger.error(f"Error processing message: {e}")
-                # Still acknowledge the message to avoid infinite retries
-                ack_ids.append(received_message.ack_id)
-        
-        # Acknowledge all processed messages
-        if ack_ids:
-            ack_request = pubsub_v1.AcknowledgeRequest(
-                subscription=subscription_path,
-                ack_ids=ack_ids
-            )
-            subscriber.acknowledge(request=ack_request)
-            logger.info(f"Acknowledged {len(ack_ids)} messages")
-        
+
+        stats = summarize(counts)
         return {
             'statusCode': 200,
             'body': json.dumps({
-                'message': f'Successfully processed {processed_count} messages',
-                'processed_count': processed_count
+                'message': f"Successfully processed {stats['processed_count']} messages",
+                **stats
             })
         }
-        
+
     except Exception as e:
-        logger.error(f"Error in lambda_handler: {e}")
+        log.error('trigger_sf_error', error=str(e), error_class=e.__class__.__name__)
         return {
             'statusCode': 500,
             'body': json.dumps({'error': str(e)})
@@ -0,0 +1,229 @@
+"""
+Message-processing core shared by the trigger_sf Lambda (index.py) and the
+streaming-pull consumer (consumer.py).
+"""
+
+import hashlib
+import os
+import logging
+import random
+import time
+from dedup import DedupIndex
+from log_utils import StructuredLogger
+from message_codec import EXECUTION_SCHEMA, MessageError, decode, dumps
+from profiling import section
+from trace_context import record_hop
+
+log = StructuredLogger(logging.getLogger(__name__))
+
+# Outcomes of handling a single message
+STARTED = 'started'      # execution started, ack
+DUPLICATE = 'duplicate'  # execution was already started, ack without starting it again
+INVALID = 'invalid'      # permanent failure, ack to avoid infinite redelivery
+RETRY = 'retry'          # transient failure, nack so that Pub/Sub redelivers the message
+
+# Retry settings for throttled StartExecution calls (full jitter exponential backoff)
+THROTTLE_MAX_ATTEMPTS = int(os.environ.get('THROTTLE_MAX_ATTEMPTS', '5'))
+THROTTLE_BASE_DELAY_SECONDS = float(os.environ.get('THROTTLE_BASE_DELAY_SECONDS', '0.1'))
+THROTTLE_MAX_DELAY_SECONDS = float(os.environ.get('THROTTLE_MAX_DELAY_SECONDS', '2.0'))
+
+THROTTLING_ERROR_CODES = ('ThrottlingException', 'TooManyRequestsException', 'RequestLimitExceeded')
+
+# StartExecution errors that will fail the same way on every redelivery
+PERMANENT_ERROR_CODES = (
+    'InvalidArn', 'InvalidName', 'InvalidExecutionInput', 'ValidationException',
+    'StateMachineDoesNotExist', 'StateMachineDeleting', 'AccessDeniedException'
+)
+
+# Dedup index of started execution names, shared by all messages handled in this process
+DEDUP_TTL_SECONDS = int(os.environ.get('DEDUP_TTL_SECONDS', '3600'))
+DEDUP_MAX_ENTRIES = int(os.environ.get('DEDUP_MAX_ENTRIES', '10000'))
+DEDUP_PERSIST_PATH = os.environ.get('DEDUP_PERSIST_PATH', '/tmp/trigger_sf_dedup.json')
+
+dedup_index = DedupIndex(DEDUP_TTL_SECONDS, DEDUP_MAX_ENTRIES, DEDUP_PERSIST_PATH or None)
+
+# Coalesced executions: limits of the items array started as one execution. Step Functions
+# rejects inputs above 256 KiB, the default leaves room for the envelope.
+COALESCE_MAX_MESSAGES = int(os.environ.get('COALESCE_MAX_MESSAGES', '50'))
+COALESCE_MAX_BYTES = int(os.environ.get('COALESCE_MAX_BYTES', '240000'))
+
+
+def get_error_code(error):
+    """Return the AWS error code of a botocore ClientError, else None"""
+    return getattr(error, 'response', {}).get('Error', {}).get('Code')
+
+
+def is_throttling_error(error):
+    """Return True if error is an AWS throttling error"""
+    return get_error_code(error) in THROTTLING_ERROR_CODES
+
+
+def start_execution_with_retry(sfn_client, step_function_arn, execution_name, step_function_input):
+    """
+    Start a Step Function execution, retrying throttled calls with jittered backoff.
+
+    Returns:
+        dict: StartExecution response
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            with section('start_execution'):
+                return sfn_client.start_execution(
+                    stateMachineArn=step_function_arn,
+                    name=execution_name,
+                    input=dumps(step_function_input).decode('utf-8')
+                )
+        except Exception as e:
+            if not is_throttling_error(e) or attempt >= THROTTLE_MAX_ATTEMPTS:
+                raise
+            delay = random.uniform(0, min(THROTTLE_MAX_DELAY_SECONDS, THROTTLE_BASE_DELAY_SECONDS * 2 ** attempt))
+            log.warning('start_execution_throttled', execution_name=execution_name, attempt=attempt, delay_seconds=round(delay, 2))
+            time.sleep(delay)
+
+
+def decode_message(data, default_execution_name):
+    """
+    Decode and validate a Pub/Sub message payload, once, here at the edge.
+
+    Returns:
+        tuple: (outcome, execution_name, message_json) where outcome is None if the message
+        still needs an execution, else INVALID or DUPLICATE
+    """
+    try:
+        message_json = decode(data, EXECUTION_SCHEMA)
+
+    except MessageError as e:
+        log.error('invalid_message', error=str(e), data=data)
+        return INVALID, None, None
+
+    # Generate a unique execution name
+    execution_name = message_json.get('name', default_execution_name)
+    log.info('message_received', sampled=True, execution_name=execution_name, message=message_json)
+
+    # Redelivered message whose execution was already started
+    if dedup_index.contains(execution_name):
+        log.info('duplicate_skipped', execution_name=execution_name)
+        return DUPLICATE, execution_name, message_json
+
+    return None, execution_name, message_json
+
+
+def handle_message(data, default_execution_name, sfn_client, step_function_arn):
+    """
+    Start the Step Function execution for a single Pub/Sub message payload.
+
+    Args:
+        data: Raw message data (bytes), see message_codec
+        default_execution_name: Execution name used when the message has no 'name'
+        sfn_client: boto3 Step Functions client
+        step_function_arn: ARN of the state machine to start
+
+    Returns:
+        str: One of STARTED, DUPLICATE, INVALID or RETRY
+    """
+    outcome, execution_name, message_json = decode_message(data, default_execution_name)
+    if outcome is not None:
+        return outcome
+
+    # Forward the trace context to the started execution
+    message_json = {**message_json, 'trace': record_hop(message_json, 'trigger_sf', log)}
+
+    # Trigger the Step Function with the message content as input
+    return start_execution(sfn_client, step_function_arn, execution_name, message_json)
+
+
+def start_execution(sfn_client, step_function_arn, execution_name, step_function_input):
+    """
+    Start an execution and classify the result.
+
+    Returns:
+        str: One of STARTED, DUPLICATE, INVALID or RETRY
+    """
+    try:
+        response = start_execution_with_retry(sfn_client, step_function_arn, execution_name, step_function_input)
+
+    except Exception as e:
+        error_code = get_error_code(e)
+        if error_code == 'ExecutionAlreadyExists':
+            log.info('execution_already_exists', execution_name=execution_name)
+            dedup_index.add(execution_name)
+            return DUPLICATE
+        if error_code in PERMANENT_ERROR_CODES:
+            log.error('start_execution_failed', execution_name=execution_name, error=str(e), error_code=error_code)
+            return INVALID
+        log.warning('start_execution_retry', execution_name=execution_name, error=str(e), error_code=error_code)
+        return RETRY
+
+    log.info('execution_started', sampled=True, execution_arn=response['executionArn'])
+    dedup_index.add(execution_name)
+    return STARTED
+
+
+def coalesced_item(message_json, execution_name, message_id):
+    """
+    Build the items entry of a coalesced execution for one message.
+
+    The message's own execution name is kept as its correlation_id, so every Map
+    iteration result can be traced back to the message (and its trace) it came from.
+    """
+    return {
+        **message_json,
+        'correlation_id': execution_name,
+        'pubsub_message_id': message_id,
+        'trace': record_hop(message_json, 'trigger_sf', log),
+    }
+
+
+def group_items(entries):
+    """
+    Split (key, item) entries into groups of at most COALESCE_MAX_MESSAGES items and
+    COALESCE_MAX_BYTES of serialized items, keeping their order. An item larger than
+    COALESCE_MAX_BYTES on its own gets a group of its own.
+
+    Returns:
+        list: Lists of (key, item) entries
+    """
+    groups = []
+    group = []
+    group_bytes = 0
+    for key, item in entries:
+        item_bytes = len(dumps(item)) + 1
+        if group and (len(group) >= COALESCE_MAX_MESSAGES or group_bytes + item_bytes > COALESCE_MAX_BYTES):
+            groups.append(group)
+            group = []
+            group_bytes = 0
+        group.append((key, item))
+        group_bytes += item_bytes
+    if group:
+        groups.append(group)
+    return groups
+
+
+def coalesced_execution_name(correlation_ids):
+    """Execution name derived from the members, so restarting the same group is a duplicate"""
+    digest = hashlib.sha256('\n'.join(sorted(correlation_ids)).encode('utf-8')).hexdigest()
+    return f"coalesced-{digest[:40]}"
+
+
+def start_coalesced_execution(items, sfn_client, step_function_arn):
+    """
+    Start one execution for a group of coalesced items, processed by a Map state.
+
+    The input is {"batch_id", "count", "items": [...]}. The outcome applies to every
+    message of the group. Once started, every member's execution name is added to the
+    dedup index, so redelivered members are acked without starting them again.
+
+    Returns:
+        str: One of STARTED, DUPLICATE, INVALID or RETRY
+    """
+    correlation_ids = [item['correlation_id'] for item in items]
+    batch_id = coalesced_execution_name(correlation_ids)
+    outcome = start_execution(sfn_client, step_function_arn, batch_id,
+                              {'batch_id': batch_id, 'count': len(items), 'items': items})
+    log.info('coalesced_execution', batch_id=batch_id, outcome=outcome, count=len(items), correlation_ids=correlation_ids)
+    if outcome in (STARTED, DUPLICATE):
+        for correlation_id in correlation_ids:
+            dedup_index.add(correlation_id)
+    return outcome
@@ -0,0 +1,234 @@
+"""
+Cache of the Google access token obtained through Workload Identity Federation.
+
+google.auth.default() with a WIF config file (GOOGLE_APPLICATION_CREDENTIALS)
+returns credentials that exchange an AWS-signed token at Google STS and then
+impersonate the service account on every refresh. get_credentials() returns
+credentials that share one access token per config file for the lifetime of
+the Lambda container, so rebuilt clients and warm invocations reuse it:
+
+- the token is kept in memory and, unless CREDENTIAL_CACHE_PATH is empty, in a
+  file under /tmp, so a restarted runtime in the same container reuses it
+- concurrent refreshes are single-flight: one thread runs the exchange, the
+  others wait for its token instead of starting their own
+- a request made with less than CREDENTIAL_REFRESH_AHEAD_SECONDS left on the
+  token starts a background refresh and goes ahead with the current token.
+  Lambda freezes background threads between invocations, so the check runs on
+  each request instead of on a timer
+
+credential_metrics() reports cache hits (requests served with the cached token)
+and refresh latency.
+"""
+
+import functools
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from log_utils import StructuredLogger
+from profiling import section
+
+# google.auth is imported where it is first needed to keep module import cheap
+
+log = StructuredLogger(logging.getLogger(__name__))
+
+CREDENTIAL_CACHE_PATH = os.environ.get('CREDENTIAL_CACHE_PATH', '/tmp/wif_token_cache.json')
+# Refresh in the background below this much remaining lifetime
+CREDENTIAL_REFRESH_AHEAD_SECONDS = int(os.environ.get('CREDENTIAL_REFRESH_AHEAD_SECONDS', '600'))
+# Refresh synchronously below this much remaining lifetime. Must exceed google.auth's own
+# refresh threshold (225 s), which treats tokens closer to expiry as expired.
+CREDENTIAL_MIN_VALID_SECONDS = int(os.environ.get('CREDENTIAL_MIN_VALID_SECONDS', '300'))
+
+CLOUD_PLATFORM_SCOPE = 'https://www.googleapis.com/auth/cloud-platform'
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def _utcnow():
+    """Naive UTC now, the convention of google.auth credential expiries"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class TokenCache:
+    """Access token shared by all credentials built from the same WIF config and scopes"""
+
+    def __init__(self, key, persist_path=None):
+        self.key = key
+        self.persist_path = persist_path
+        self.base = None
+        self.token = None
+        self.expiry = None
+        self.metrics = {'hits': 0, 'misses': 0, 'refreshes': 0, 'background_refreshes': 0, 'refresh_waits': 0,
+                        'disk_loads': 0, 'refresh_errors': 0, 'refresh_ms_last': None, 'refresh_ms_total': 0.0}
+        # _lock serializes refreshes; _metrics_lock only guards the counters, so requests counting
+        # a hit never wait for a refresh in progress. Taken after _lock, never the other way round.
+        self._lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self._background = None
+        self.load()
+
+    def record(self, metric, value=1):
+        """Add value to a counter in metrics"""
+        with self._metrics_lock:
+            self.metrics[metric] += value
+
+    def metrics_snapshot(self):
+        """Copy of metrics, consistent across counters"""
+        with self._metrics_lock:
+            return dict(self.metrics)
+
+    def seconds_left(self):
+        if self.token is None or self.expiry is None:
+            return 0.0
+        return (self.expiry - _utcnow()).total_seconds()
+
+    def load(self):
+        """Load an unexpired token for this key from persist_path, if there is one"""
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path) as f:
+                entry = json.load(f).get(self.key)
+            if entry:
+                self.token = entry['token']
+                self.expiry = datetime.fromisoformat(entry['expiry'])
+        except (OSError, ValueError, KeyError, AttributeError) as e:
+            log.warning('credential_cache_unreadable', path=self.persist_path, error=str(e))
+            return
+        if self.seconds_left() > CREDENTIAL_MIN_VALID_SECONDS:
+            self.record('disk_loads')
+        else:
+            self.token = self.expiry = None
+
+    def save(self):
+        """Write the token to persist_path, readable by the function's user only"""
+        if not self.persist_path:
+            return
+        try:
+            with open(self.persist_path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            entries = None
+        if not isinstance(entries, dict):
+            # Missing or unreadable: start a new file
+            entries = {}
+        try:
+            entries[self.key] = {'token': self.token, 'expiry': self.expiry.isoformat()}
+            tmp_path = f"{self.persist_path}.tmp"
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.persist_path)
+        except (OSError, ValueError) as e:
+            log.warning('credential_cache_save_failed', path=self.persist_path, error=str(e))
+
+    def refresh(self, request, min_valid_seconds, background=False):
+        """
+        Refresh the token through the base credentials unless it has more than
+        min_valid_seconds left. Runs one exchange at a time: callers that waited
+        for another thread's refresh reuse its token.
+        """
+        with self._lock:
+            if self.seconds_left() > min_valid_seconds:
+                self.record('refresh_waits')
+                return
+            start = time.perf_counter()
+            try:
+                with section('credential_refresh'):
+                    self.base.refresh(request)
+            except Exception:
+                self.record('refresh_errors')
+                raise
+            refresh_ms = round((time.perf_counter() - start) * 1000, 1)
+            self.token, self.expiry = self.base.token, self.base.expiry
+            with self._metrics_lock:
+                self.metrics['refreshes'] += 1
+                self.metrics['background_refreshes'] += background
+                self.metrics['refresh_ms_last'] = refresh_ms
+                self.metrics['refresh_ms_total'] = round(self.metrics['refresh_ms_total'] + refresh_ms, 1)
+            log.info('credential_refreshed', refresh_ms=refresh_ms, background=background,
+                     expires_in_seconds=round(self.seconds_left()))
+            self.save()
+
+    def refresh_in_background(self):
+        """Start a background refresh, unless one is already running"""
+        if self._background is not None and self._background.is_alive():
+            return
+        self._background = threading.Thread(target=self._background_refresh, daemon=True)
+        self._background.start()
+
+    def _background_refresh(self):
+        from google.auth.transport.requests import Request
+
+        try:
+            self.refresh(Request(), CREDENTIAL_REFRESH_AHEAD_SECONDS, background=True)
+        except Exception as e:
+            log.warning('credential_background_refresh_failed', error=str(e), error_class=e.__class__.__name__)
+
+
+@functools.lru_cache(maxsize=None)
+def _cached_credentials_class():
+    """Credentials subclass backed by a TokenCache, built on first use to defer the google.auth import"""
+    from google.auth import credentials
+
+    class CachedCredentials(credentials.Credentials):
+        def __init__(self, cache):
+            super().__init__()
+            self._cache = cache
+            self.token, self.expiry = cache.token, cache.expiry
+            # apply() sends it as x-goog-user-project, like the base credentials would
+            self._quota_project_id = getattr(cache.base, 'quota_project_id', None)
+
+        def refresh(self, request):
+            self._cache.refresh(request, CREDENTIAL_MIN_VALID_SECONDS)
+            self.token, self.expiry = self._cache.token, self._cache.expiry
+
+        def before_request(self, request, method, url, headers):
+            # Called before every API request, by the gRPC auth plugin among others
+            cache = self._cache
+            seconds_left = cache.seconds_left()
+            if seconds_left > CREDENTIAL_MIN_VALID_SECONDS:
+                cache.record('hits')
+                # May pick up a token refreshed by another client or in the background
+                self.token, self.expiry = cache.token, cache.expiry
+                if seconds_left < CREDENTIAL_REFRESH_AHEAD_SECONDS:
+                    cache.refresh_in_background()
+            else:
+                cache.record('misses')
+                self.refresh(request)
+            self.apply(headers)
+
+    return CachedCredentials
+
+
+def get_credentials(scopes=(CLOUD_PLATFORM_SCOPE,)):
+    """
+    Return credentials for the WIF config in GOOGLE_APPLICATION_CREDENTIALS that share
+    the cached access token. Pass them to the client instead of letting it call
+    google.auth.default() itself.
+
+    Returns:
+        google.auth.credentials.Credentials
+    """
+    key = hashlib.sha256(f"{os.environ.get('GOOGLE_APPLICATION_CREDENTIALS')}|{','.join(scopes)}".encode()).hexdigest()
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = TokenCache(key, CREDENTIAL_CACHE_PATH or None)
+        if cache.base is None:
+            from google.auth import default
+
+            cache.base, _ = default(scopes=list(scopes))
+
+    return _cached_credentials_class()(cache)
+
+
+def credential_metrics():
+    """Cache hit and refresh latency counters, per cached config, for logging"""
+    with _caches_lock:
+        caches = list(_caches.items())
+    return {key[:12]: cache.metrics_snapshot() for key, cache in caches}
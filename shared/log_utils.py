@@ -0,0 +1,97 @@
+"""
+Structured logging shared by the Lambda handlers and the Airflow DAG callables.
+
+Every record is a single line of compact JSON: {"msg": "...", <fields>}.
+Fields are only serialized when the record is actually emitted, so disabled
+levels and sampled-out records cost a level check and nothing else. Each
+field is capped at LOG_MAX_FIELD_BYTES bytes of UTF-8 encoded JSON.
+"""
+
+import json
+import logging
+import os
+import random
+
+# Maximum serialized size of a single field in UTF-8 bytes, larger values are truncated
+LOG_MAX_FIELD_BYTES = int(os.environ.get('LOG_MAX_FIELD_BYTES', '2048'))
+
+# Fraction of records kept for high-volume call sites that pass sampled=True
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', '1.0'))
+
+
+def compact_json(value):
+    """Serialize value as single-line JSON without whitespace"""
+    return json.dumps(value, separators=(',', ':'), default=str)
+
+
+def truncate(text, max_bytes):
+    """Cap text at max_bytes bytes of UTF-8, without splitting a character, noting how much was dropped"""
+    if max_bytes is None:
+        return text
+    encoded = text.encode('utf-8')
+    if len(encoded) <= max_bytes:
+        return text
+    return f"{encoded[:max_bytes].decode('utf-8', errors='ignore')}...<truncated {len(encoded) - max_bytes} bytes>"
+
+
+class _Record:
+    """Log message that is only serialized when a handler formats it"""
+
+    __slots__ = ('msg', 'fields', 'max_field_bytes')
+
+    def __init__(self, msg, fields, max_field_bytes):
+        self.msg = msg
+        self.fields = fields
+        self.max_field_bytes = max_field_bytes
+
+    def __str__(self):
+        record = {'msg': self.msg}
+        for key, value in self.fields.items():
+            if isinstance(value, (bool, int, float)) or value is None:
+                record[key] = value
+                continue
+            serialized = compact_json(value)
+            if len(serialized.encode('utf-8')) > self.max_field_bytes:
+                # Keep the field valid JSON by storing the truncated serialization as a string
+                record[key] = truncate(serialized, self.max_field_bytes)
+            else:
+                record[key] = value
+        return compact_json(record)
+
+
+class StructuredLogger:
+    """
+    Thin wrapper around a logging.Logger that emits lazy, size-capped, single-line JSON records.
+
+    Usage:
+        log = StructuredLogger(logging.getLogger())
+        log.info('event_received', event=event)
+        log.info('message_received', sampled=True, data=message)
+
+    The record name and level are positional-only, so any keyword (including 'event')
+    can be used as a field. 'sampled' is reserved for marking high-volume records.
+    """
+
+    def __init__(self, logger, max_field_bytes=None, sample_rate=None):
+        self.logger = logger
+        self.max_field_bytes = LOG_MAX_FIELD_BYTES if max_field_bytes is None else max_field_bytes
+        self.sample_rate = LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+
+    def log(self, level, msg, /, sampled=False, **fields):
+        if not self.logger.isEnabledFor(level):
+            return
+        if sampled and self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        self.logger.log(level, '%s', _Record(msg, fields, self.max_field_bytes))
+
+    def debug(self, msg, /, **fields):
+        self.log(logging.DEBUG, msg, **fields)
+
+    def info(self, msg, /, **fields):
+        self.log(logging.INFO, msg, **fields)
+
+    def warning(self, msg, /, **fields):
+        self.log(logging.WARNING, msg, **fields)
+
+    def error(self, msg, /, **fields):
+        self.log(logging.ERROR, msg, **fields)
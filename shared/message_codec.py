@@ -0,0 +1,155 @@
+"""
+Message codec shared by the Lambda handlers and the Airflow DAGs.
+
+Every hop that puts a message on Pub/Sub encodes it with encode() and every
+hop that takes one off decodes it with decode(), validating it against the
+message schema once at that edge. Everything in between passes dicts.
+
+Wire format: a 3-byte header followed by the JSON payload, zlib-compressed
+when it is larger than CODEC_COMPRESS_THRESHOLD_BYTES.
+
+    b'\\x00' | version (1 byte) | flags (1 byte) | payload
+
+JSON text never starts with a NUL byte, so decode() also accepts plain JSON
+messages from publishers that do not use this codec (e.g. gcloud, the Go
+trigger_dag Lambda). orjson is used when it is installed, json otherwise.
+"""
+
+import datetime
+import json
+import os
+import zlib
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+CODEC_VERSION = 1
+
+# Payloads larger than this are compressed
+CODEC_COMPRESS_THRESHOLD_BYTES = int(os.environ.get('CODEC_COMPRESS_THRESHOLD_BYTES', '4096'))
+CODEC_COMPRESS_LEVEL = 6
+
+FRAME_MARKER = b'\x00'
+FLAG_ZLIB = 0x01
+
+# Message schemas: field -> accepted types. Unknown fields are allowed, all fields are optional.
+# Trigger requests published by trigger_dag (and external publishers) for pubsub_trigger_dag
+TRIGGER_SCHEMA = {
+    'custom_message': (str,),
+    'timestamp': (str,),
+    'trigger_time': (str,),
+    'source': (str,),
+    'workflow_id': (str, int),
+    'execution_id': (str, int),
+    'trace': (dict,),
+}
+
+# Execution requests published by hello_world_dag for trigger_sf
+EXECUTION_SCHEMA = {
+    'name': (str,),
+    'source': (str,),
+    'workflow_id': (str, int),
+    'execution_id': (str, int),
+    'custom_message': (str,),
+    'trace': (dict,),
+}
+
+
+class MessageError(ValueError):
+    """Raised when a message cannot be decoded or does not match its schema"""
+
+
+def _json_default(value):
+    """Serialize what json cannot like orjson does: dates and times in ISO format, anything else via str"""
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+def dumps(value):
+    """Serialize value as compact JSON bytes, the same bytes with either backend"""
+    if orjson is not None:
+        return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False, default=_json_default).encode('utf-8')
+
+
+def loads(data):
+    """Parse JSON bytes or str"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def validate(message, schema):
+    """
+    Check that message is a dict whose known fields have the types given by schema.
+
+    Returns:
+        dict: The message
+
+    Raises:
+        MessageError: If the message does not match the schema
+    """
+    if not isinstance(message, dict):
+        raise MessageError(f"Expected a JSON object, got {type(message).__name__}")
+    for field, types in schema.items():
+        value = message.get(field)
+        # bool is an int subclass, but never a valid id
+        if value is not None and (not isinstance(value, types) or isinstance(value, bool)):
+            raise MessageError(f"Field '{field}' has type {type(value).__name__}, "
+                               f"expected {' or '.join(t.__name__ for t in types)}")
+    return message
+
+
+def encode(message):
+    """
+    Encode a message dict for publishing.
+
+    Returns:
+        bytes: Header and JSON payload, compressed above CODEC_COMPRESS_THRESHOLD_BYTES
+    """
+    payload = dumps(message)
+    flags = 0
+    if len(payload) > CODEC_COMPRESS_THRESHOLD_BYTES:
+        payload = zlib.compress(payload, CODEC_COMPRESS_LEVEL)
+        flags |= FLAG_ZLIB
+    return FRAME_MARKER + bytes((CODEC_VERSION, flags)) + payload
+
+
+def decode(data, schema=None):
+    """
+    Decode a received message, validating it against schema if given.
+
+    Args:
+        data: Message data (bytes), framed by encode() or plain JSON
+        schema: Optional schema, e.g. TRIGGER_SCHEMA
+
+    Returns:
+        dict: The message
+
+    Raises:
+        MessageError: If the message is malformed, uses a newer codec version or fails validation
+    """
+    try:
+        if data[:1] == FRAME_MARKER:
+            if len(data) < 3:
+                raise MessageError('Truncated message header')
+            version, flags = data[1], data[2]
+            if version > CODEC_VERSION:
+                raise MessageError(f"Unsupported codec version {version}")
+            payload = data[3:]
+            if flags & FLAG_ZLIB:
+                payload = zlib.decompress(payload)
+        else:
+            payload = data
+        message = loads(payload)
+    except MessageError:
+        raise
+    except (ValueError, zlib.error) as e:
+        raise MessageError(f"Malformed message: {e}") from e
+
+    if schema is not None:
+        validate(message, schema)
+    return message
@@ -0,0 +1,148 @@
+"""
+Opt-in per-invocation profiling for the Lambda handlers.
+
+With PROFILING=true, @profiled records per invocation the wall time, the CPU
+time, the tracemalloc peak and the process's peak RSS, plus the time spent in
+named sections:
+
+    @profiled
+    def lambda_handler(event, context):
+        with section('pull'):
+            ...
+
+and prints them as one CloudWatch Embedded Metric Format (EMF) line, which
+CloudWatch turns into metrics in PROFILING_NAMESPACE per function. Compare
+MaxRssMiB with the function's memory_size to size it.
+
+When disabled, @profiled returns the handler unchanged and section() returns
+a shared no-op context manager, so the hooks can stay in production code.
+PROFILING is read at import time, i.e. once per Lambda container.
+"""
+
+import contextlib
+import functools
+import json
+import os
+import resource
+import threading
+import time
+import tracemalloc
+
+PROFILING_ENABLED = os.environ.get('PROFILING', 'false').lower() == 'true'
+PROFILING_NAMESPACE = os.environ.get('PROFILING_NAMESPACE', 'step-dag')
+# tracemalloc slows allocations down noticeably, it can be turned off separately
+PROFILING_TRACEMALLOC = os.environ.get('PROFILING_TRACEMALLOC', 'true').lower() == 'true'
+
+_NOOP = contextlib.nullcontext()
+
+# Profile of the invocation in progress; a Lambda container handles one invocation at a time
+_current = None
+_invocation_count = 0
+
+
+class InvocationProfile:
+    """Section timings of one invocation, summed across threads"""
+
+    def __init__(self):
+        self.sections = {}  # name -> [total seconds, count]
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            totals = self.sections.setdefault(name, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += 1
+
+
+class _Section:
+    __slots__ = ('profile', 'name', 'start')
+
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profile.add(self.name, time.perf_counter() - self.start)
+
+
+def section(name):
+    """Context manager timing a named section of the current invocation, a no-op when not profiling"""
+    profile = _current
+    if profile is None:
+        return _NOOP
+    return _Section(profile, name)
+
+
+def emf_record(function_name, values, properties):
+    """
+    Build an EMF record with one metric per entry of values.
+
+    Args:
+        function_name: FunctionName dimension
+        values: metric name -> (value, unit)
+        properties: Extra fields logged with the metrics, not turned into metrics
+    """
+    return {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': PROFILING_NAMESPACE,
+                'Dimensions': [['FunctionName']],
+                'Metrics': [{'Name': name, 'Unit': unit} for name, (_, unit) in values.items()],
+            }],
+        },
+        'FunctionName': function_name,
+        **{name: value for name, (value, _) in values.items()},
+        **properties,
+    }
+
+
+def profiled(handler):
+    """Decorator profiling every invocation of a lambda_handler(event, context), if PROFILING=true"""
+    if not PROFILING_ENABLED:
+        return handler
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        global _current, _invocation_count
+        # A handler called by another profiled handler (pipeline_runner steps) is part of its profile
+        if _current is not None:
+            return handler(event, context)
+        _invocation_count += 1
+        profile = _current = InvocationProfile()
+        trace_memory = PROFILING_TRACEMALLOC and not tracemalloc.is_tracing()
+        if trace_memory:
+            tracemalloc.start()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            return handler(event, context)
+        finally:
+            values = {
+                'WallMs': (round((time.perf_counter() - wall_start) * 1000, 2), 'Milliseconds'),
+                'CpuMs': (round((time.process_time() - cpu_start) * 1000, 2), 'Milliseconds'),
+                # ru_maxrss is in KiB on Linux
+                'MaxRssMiB': (round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1), 'Megabytes'),
+            }
+            if trace_memory:
+                values['TracemallocPeakKiB'] = (round(tracemalloc.get_traced_memory()[1] / 1024, 1), 'Kilobytes')
+                tracemalloc.stop()
+            for name, (seconds, _) in profile.sections.items():
+                values[f"{name}Ms"] = (round(seconds * 1000, 2), 'Milliseconds')
+            _current = None
+
+            properties = {
+                'ColdStart': _invocation_count == 1,
+                'MemoryLimitMiB': getattr(context, 'memory_limit_in_mb', None),
+                'RequestId': getattr(context, 'aws_request_id', None),
+                'SectionCounts': {name: count for name, (_, count) in profile.sections.items()},
+            }
+            function_name = getattr(context, 'function_name', None) or handler.__module__
+            # EMF records must be printed as bare JSON lines, the logging prefix would hide them from CloudWatch
+            print(json.dumps(emf_record(function_name, values, properties), separators=(',', ':')), flush=True)
+
+    return wrapper
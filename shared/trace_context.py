@@ -0,0 +1,63 @@
+"""
+Trace context carried in the payload of every hop of the Step Function <-> Airflow loop.
+
+The trace is stored under the 'trace' key of each payload:
+
+    {"trace_id": "<32 hex chars>", "hops": [{"hop": "hello_world", "ts": 1718000000000}, ...]}
+
+Each hop appends its name and the current time (epoch milliseconds) with
+record_hop() and forwards the returned trace in the payload it hands to the
+next hop. record_hop() also logs a 'trace_hop' record with the hops so far,
+which benchmarks/trace_report.py turns into per-hop latency histograms and
+the critical path. Hops run on AWS and GCP clocks, so latencies between the
+clouds include the clock skew.
+"""
+
+import time
+import uuid
+
+TRACE_KEY = 'trace'
+
+
+def now_ms():
+    """Current time in epoch milliseconds"""
+    return int(time.time() * 1000)
+
+
+def is_trace(value):
+    """Return True if value looks like a trace context"""
+    return (isinstance(value, dict) and isinstance(value.get('trace_id'), str)
+            and isinstance(value.get('hops'), list))
+
+
+def find_trace(payload):
+    """
+    Return the trace carried by payload, else None.
+
+    Step Functions nest Lambda results under their ResultPath (e.g. $.helloWorldResult),
+    so traces one level down are considered too; the one with the most hops wins.
+    """
+    if not isinstance(payload, dict):
+        return None
+    candidates = [payload.get(TRACE_KEY)]
+    candidates.extend(value.get(TRACE_KEY) for value in payload.values() if isinstance(value, dict))
+    traces = [candidate for candidate in candidates if is_trace(candidate)]
+    return max(traces, key=lambda trace: len(trace['hops']), default=None)
+
+
+def record_hop(payload, hop, log):
+    """
+    Continue the trace carried by payload, or start a new one, with hop.
+
+    Args:
+        payload: Payload received by this hop
+        hop: Name of this hop
+        log: StructuredLogger the 'trace_hop' record is written to
+
+    Returns:
+        dict: New trace including this hop, to forward in the next payload
+    """
+    trace = find_trace(payload) or {'trace_id': uuid.uuid4().hex, 'hops': []}
+    trace = {'trace_id': trace['trace_id'], 'hops': trace['hops'] + [{'hop': hop, 'ts': now_ms()}]}
+    log.info('trace_hop', trace_id=trace['trace_id'], hop=hop, trace=trace)
+    return trace
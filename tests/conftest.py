@@ -0,0 +1,64 @@
+"""
+Shared setup of the unit tests.
+
+The Lambda handlers and DAG helpers import their neighbours by module name,
+as they do once packaged, so their directories are put on sys.path. The
+cloud clients are replaced by the stand-ins in benchmarks/cloud_fakes.py.
+"""
+
+import importlib.util
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+for directory in ('shared', 'benchmarks', os.path.join('lambda', 'trigger_sf')):
+    sys.path.insert(0, os.path.join(ROOT, directory))
+
+# Keep the caches persisted to /tmp out of the tests, set before the modules are imported
+os.environ['DEDUP_PERSIST_PATH'] = ''
+os.environ['CREDENTIAL_CACHE_PATH'] = ''
+os.environ['PROFILING'] = 'false'
+
+EXECUTION_TOPIC = 'projects/test/topics/execution'
+EXECUTION_SUBSCRIPTION = 'projects/test/subscriptions/execution'
+STATE_MACHINE_ARN = 'arn:aws:states:local:000000000000:stateMachine:test'
+
+
+def load_module(name, path):
+    """Import a handler module under a unique name (both trigger Lambdas are called index.py)"""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def trigger_sf(monkeypatch):
+    """The trigger_sf handler module, with a fresh dedup index"""
+    import processor
+    from dedup import DedupIndex
+
+    module = load_module('trigger_sf_index', os.path.join(ROOT, 'lambda', 'trigger_sf', 'index.py'))
+    monkeypatch.setattr(processor, 'dedup_index', DedupIndex(3600, 1000))
+    return module
+
+
+@pytest.fixture
+def broker():
+    """FakePubSub with the execution subscription trigger_sf pulls from"""
+    from cloud_fakes import FakePubSub
+
+    broker = FakePubSub(pull_wait_seconds=0.01)
+    broker.create_subscription(EXECUTION_TOPIC, EXECUTION_SUBSCRIPTION)
+    return broker
+
+
+def execution_message(i, **fields):
+    """Encoded execution request as hello_world_dag publishes it"""
+    from message_codec import encode
+
+    return encode({'name': f"execution-{i}", 'source': 'test', 'workflow_id': f"workflow-{i}",
+                   'execution_id': i, 'custom_message': 'test', **fields})
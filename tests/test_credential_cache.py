@@ -0,0 +1,180 @@
+import os
+import sys
+import threading
+import time
+import types
+from datetime import timedelta
+
+import pytest
+
+import credential_cache
+from credential_cache import CREDENTIAL_MIN_VALID_SECONDS, TokenCache, _utcnow
+
+
+class Credentials:
+    """The part of google.auth.credentials.Credentials that CachedCredentials relies on"""
+
+    def __init__(self):
+        self.token = None
+        self.expiry = None
+        self._quota_project_id = None
+
+    @property
+    def quota_project_id(self):
+        return self._quota_project_id
+
+    def apply(self, headers, token=None):
+        headers['authorization'] = f"Bearer {token or self.token}"
+        if self.quota_project_id:
+            headers['x-goog-user-project'] = self.quota_project_id
+
+
+class BaseCredentials:
+    """WIF credentials whose refresh takes refresh_seconds and hands out numbered tokens"""
+
+    def __init__(self, refresh_seconds=0.0, lifetime_seconds=3600, quota_project_id=None):
+        self.refresh_seconds = refresh_seconds
+        self.lifetime_seconds = lifetime_seconds
+        self.quota_project_id = quota_project_id
+        self.refreshes = 0
+        self.token = None
+        self.expiry = None
+
+    def refresh(self, request):
+        time.sleep(self.refresh_seconds)
+        self.refreshes += 1
+        self.token = f"token-{self.refreshes}"
+        self.expiry = _utcnow() + timedelta(seconds=self.lifetime_seconds)
+
+
+@pytest.fixture
+def google_auth(monkeypatch):
+    """Stand-in google.auth modules, so CachedCredentials can be built without google-auth"""
+    base = BaseCredentials(quota_project_id='billing-project')
+    modules = {
+        'google': types.ModuleType('google'),
+        'google.auth': types.ModuleType('google.auth'),
+        'google.auth.credentials': types.ModuleType('google.auth.credentials'),
+        'google.auth.transport': types.ModuleType('google.auth.transport'),
+        'google.auth.transport.requests': types.ModuleType('google.auth.transport.requests'),
+    }
+    modules['google.auth'].default = lambda scopes=None: (base, 'test-project')
+    modules['google.auth.credentials'].Credentials = Credentials
+    modules['google.auth.transport.requests'].Request = object
+    for name, module in modules.items():
+        monkeypatch.setitem(sys.modules, name, module)
+    monkeypatch.setattr(credential_cache, '_caches', {})
+    credential_cache._cached_credentials_class.cache_clear()
+    yield base
+    credential_cache._cached_credentials_class.cache_clear()
+
+
+def run_threads(count, target):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_concurrent_refreshes_run_one_exchange():
+    cache = TokenCache('key')
+    cache.base = BaseCredentials(refresh_seconds=0.05)
+
+    run_threads(8, lambda: cache.refresh(None, CREDENTIAL_MIN_VALID_SECONDS))
+
+    assert cache.base.refreshes == 1
+    assert cache.token == 'token-1'
+    assert cache.metrics['refreshes'] == 1
+    assert cache.metrics['refresh_waits'] == 7
+
+
+def test_refresh_replaces_a_token_close_to_expiry():
+    cache = TokenCache('key')
+    cache.base = BaseCredentials(lifetime_seconds=CREDENTIAL_MIN_VALID_SECONDS - 1)
+    cache.refresh(None, CREDENTIAL_MIN_VALID_SECONDS)
+    cache.refresh(None, CREDENTIAL_MIN_VALID_SECONDS)
+
+    assert cache.token == 'token-2'
+    assert cache.metrics['refreshes'] == 2
+
+
+def test_refresh_errors_are_counted_and_raised():
+    class FailingCredentials(BaseCredentials):
+        def refresh(self, request):
+            raise RuntimeError('sts unavailable')
+
+    cache = TokenCache('key')
+    cache.base = FailingCredentials()
+    with pytest.raises(RuntimeError):
+        cache.refresh(None, CREDENTIAL_MIN_VALID_SECONDS)
+    assert cache.metrics['refresh_errors'] == 1
+    assert cache.token is None
+
+
+def test_token_is_persisted_for_the_next_container_start(tmp_path):
+    path = str(tmp_path / 'tokens.json')
+    cache = TokenCache('key', path)
+    cache.base = BaseCredentials()
+    cache.refresh(None, CREDENTIAL_MIN_VALID_SECONDS)
+
+    assert os.stat(path).st_mode & 0o777 == 0o600
+    reloaded = TokenCache('key', path)
+    assert reloaded.token == 'token-1'
+    assert reloaded.metrics['disk_loads'] == 1
+    assert TokenCache('other-key', path).token is None
+
+
+def test_persisted_token_close_to_expiry_is_not_loaded(tmp_path):
+    path = str(tmp_path / 'tokens.json')
+    cache = TokenCache('key', path)
+    cache.base = BaseCredentials(lifetime_seconds=CREDENTIAL_MIN_VALID_SECONDS - 1)
+    cache.refresh(None, CREDENTIAL_MIN_VALID_SECONDS)
+
+    assert TokenCache('key', path).token is None
+
+
+def test_corrupt_persisted_file_is_ignored_and_replaced(tmp_path):
+    path = tmp_path / 'tokens.json'
+    path.write_text('{not json')
+
+    cache = TokenCache('key', str(path))
+    assert cache.token is None
+    cache.base = BaseCredentials()
+    cache.refresh(None, CREDENTIAL_MIN_VALID_SECONDS)
+    assert TokenCache('key', str(path)).token == 'token-1'
+
+
+def test_cached_credentials_share_one_token(google_auth):
+    first, second = credential_cache.get_credentials(), credential_cache.get_credentials()
+    headers = {}
+    first.before_request(None, 'POST', 'https://pubsub.googleapis.com', headers)
+    second.before_request(None, 'POST', 'https://pubsub.googleapis.com', {})
+
+    assert google_auth.refreshes == 1
+    assert headers['authorization'] == 'Bearer token-1'
+    metrics, = credential_cache.credential_metrics().values()
+    assert (metrics['misses'], metrics['hits']) == (1, 1)
+
+
+def test_cached_credentials_send_the_quota_project(google_auth):
+    credentials = credential_cache.get_credentials()
+    headers = {}
+    credentials.before_request(None, 'POST', 'https://pubsub.googleapis.com', headers)
+
+    assert credentials.quota_project_id == 'billing-project'
+    assert headers['x-goog-user-project'] == 'billing-project'
+
+
+def test_concurrent_requests_count_every_hit(google_auth):
+    credentials = credential_cache.get_credentials()
+    credentials.before_request(None, 'POST', 'https://pubsub.googleapis.com', {})
+
+    def requests():
+        for _ in range(500):
+            credentials.before_request(None, 'POST', 'https://pubsub.googleapis.com', {})
+
+    run_threads(8, requests)
+    metrics, = credential_cache.credential_metrics().values()
+    assert metrics['hits'] == 8 * 500
+    assert metrics['misses'] == 1
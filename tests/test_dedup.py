@@ -0,0 +1,73 @@
+import json
+import time
+
+from dedup import DedupIndex
+
+
+def test_evicts_least_recently_used_entries():
+    index = DedupIndex(3600, 3)
+    for name in ('a', 'b', 'c'):
+        index.add(name)
+    # Looking up a makes b the least recently used entry
+    assert index.contains('a')
+    index.add('d')
+
+    assert len(index) == 3
+    assert not index.contains('b')
+    assert all(index.contains(name) for name in ('a', 'c', 'd'))
+
+
+def test_expired_entries_are_dropped(monkeypatch):
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now)
+    index = DedupIndex(60, 10)
+    index.add('a')
+    assert index.contains('a')
+
+    monkeypatch.setattr(time, 'time', lambda: now + 61)
+    assert not index.contains('a')
+    assert len(index) == 0
+
+
+def test_persists_unexpired_entries(tmp_path, monkeypatch):
+    path = str(tmp_path / 'dedup.json')
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now)
+    index = DedupIndex(60, 10, persist_path=path)
+    index.add('old')
+    monkeypatch.setattr(time, 'time', lambda: now + 30)
+    index.add('new')
+    index.save()
+
+    # A later container start within the TTL of 'new' only
+    monkeypatch.setattr(time, 'time', lambda: now + 61)
+    reloaded = DedupIndex(60, 10, persist_path=path)
+    assert reloaded.contains('new')
+    assert not reloaded.contains('old')
+
+
+def test_load_keeps_the_most_recent_entries_up_to_max_entries(tmp_path):
+    path = tmp_path / 'dedup.json'
+    expiry = time.time() + 60
+    path.write_text(json.dumps([[f"name-{i}", expiry] for i in range(5)]))
+
+    index = DedupIndex(60, 2, persist_path=str(path))
+    assert len(index) == 2
+    assert index.contains('name-3') and index.contains('name-4')
+
+
+def test_save_skips_unchanged_index(tmp_path):
+    path = tmp_path / 'dedup.json'
+    DedupIndex(60, 10, persist_path=str(path)).save()
+    assert not path.exists()
+
+
+def test_corrupt_persisted_file_is_ignored(tmp_path):
+    path = tmp_path / 'dedup.json'
+    path.write_text('{not json')
+
+    index = DedupIndex(60, 10, persist_path=str(path))
+    assert len(index) == 0
+    index.add('a')
+    index.save()
+    assert json.loads(path.read_text())[0][0] == 'a'
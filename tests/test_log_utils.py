@@ -0,0 +1,32 @@
+import json
+import logging
+
+from log_utils import StructuredLogger, truncate
+
+
+def test_truncate_counts_utf8_bytes():
+    text = 'é' * 10  # 2 bytes each
+    assert truncate(text, 20) == text
+
+    truncated = truncate(text, 5)
+    assert truncated == 'éé...<truncated 15 bytes>'
+
+
+def test_truncate_never_splits_a_character():
+    assert truncate('a€b', 2) == 'a...<truncated 3 bytes>'
+
+
+def test_fields_are_capped_by_encoded_size(caplog):
+    log = StructuredLogger(logging.getLogger('test_log_utils'), max_field_bytes=32)
+    small = {'name': 'ok'}
+    large = {'message': 'ü' * 100}
+
+    with caplog.at_level(logging.INFO, logger='test_log_utils'):
+        log.info('event', small=small, large=large, count=3)
+
+    record = json.loads(caplog.records[0].getMessage())
+    assert record['small'] == small
+    assert record['count'] == 3
+    assert record['large'].startswith('{"message":"')
+    prefix = record['large'].split('...<truncated')[0]
+    assert len(prefix.encode('utf-8')) == 32
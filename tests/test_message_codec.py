@@ -0,0 +1,80 @@
+import json
+import zlib
+from datetime import datetime, timezone
+
+import pytest
+
+import message_codec
+from message_codec import (CODEC_VERSION, EXECUTION_SCHEMA, FLAG_ZLIB, FRAME_MARKER, TRIGGER_SCHEMA, MessageError,
+                           decode, dumps, encode)
+
+MESSAGE = {'workflow_id': 'workflow-1', 'execution_id': 7, 'custom_message': 'hello', 'trace': {'trace_id': 'abc'}}
+
+
+def test_encode_writes_the_frame_header():
+    data = encode(MESSAGE)
+    assert data[:1] == FRAME_MARKER
+    assert data[1] == CODEC_VERSION
+    assert data[2] == 0
+    assert json.loads(data[3:]) == MESSAGE
+    assert decode(data, TRIGGER_SCHEMA) == MESSAGE
+
+
+def test_large_payloads_are_compressed(monkeypatch):
+    monkeypatch.setattr(message_codec, 'CODEC_COMPRESS_THRESHOLD_BYTES', 64)
+    message = {**MESSAGE, 'custom_message': 'x' * 1000}
+
+    data = encode(message)
+    assert data[2] & FLAG_ZLIB
+    assert len(data) < 1000
+    assert json.loads(zlib.decompress(data[3:])) == message
+    assert decode(data, TRIGGER_SCHEMA) == message
+
+
+def test_decodes_legacy_plain_json():
+    assert decode(json.dumps(MESSAGE).encode('utf-8'), TRIGGER_SCHEMA) == MESSAGE
+    assert decode(b'  {"name": "execution-1"}', EXECUTION_SCHEMA) == {'name': 'execution-1'}
+
+
+def test_rejects_newer_codec_versions():
+    data = FRAME_MARKER + bytes((CODEC_VERSION + 1, 0)) + b'{}'
+    with pytest.raises(MessageError, match='version'):
+        decode(data)
+
+
+@pytest.mark.parametrize('data', [
+    FRAME_MARKER + b'\x01',
+    FRAME_MARKER + bytes((CODEC_VERSION, FLAG_ZLIB)) + b'not zlib',
+    b'{"truncated": ',
+])
+def test_rejects_malformed_messages(data):
+    with pytest.raises(MessageError):
+        decode(data)
+
+
+@pytest.mark.parametrize('message', [
+    ['not', 'an', 'object'],
+    {'workflow_id': True},
+    {'trace': 'not-a-dict'},
+])
+def test_validates_against_the_schema(message):
+    with pytest.raises(MessageError):
+        decode(encode(message), TRIGGER_SCHEMA)
+
+
+@pytest.mark.parametrize('message', [
+    MESSAGE,
+    {**MESSAGE, 'custom_message': 'Grüße aus München ✓ 日本'},
+])
+def test_json_fallback_matches_orjson(monkeypatch, message):
+    data = encode(message)
+    monkeypatch.setattr(message_codec, 'orjson', None)
+    assert encode(message) == data
+    assert decode(data) == message
+
+
+def test_json_fallback_matches_orjson_on_non_string_keys_and_dates(monkeypatch):
+    value = {1: 'one', None: 'none', 'at': datetime(2024, 1, 1, 12, 30, tzinfo=timezone.utc)}
+    data = dumps(value)
+    monkeypatch.setattr(message_codec, 'orjson', None)
+    assert dumps(value) == data == b'{"1":"one","null":"none","at":"2024-01-01T12:30:00+00:00"}'
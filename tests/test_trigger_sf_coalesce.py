@@ -0,0 +1,91 @@
+import pytest
+
+import processor
+from cloud_fakes import DeadlineExceeded, FakeLambdaContext, FakeStepFunctions, FakeSubscriberClient
+from conftest import EXECUTION_SUBSCRIPTION, EXECUTION_TOPIC, STATE_MACHINE_ARN, execution_message
+from message_codec import dumps
+
+
+def item(i, size=0):
+    return {'correlation_id': f"execution-{i}", 'custom_message': 'x' * size}
+
+
+def test_pull_window_keeps_messages_when_pull_times_out(trigger_sf, broker):
+    for i in range(3):
+        broker.publish(EXECUTION_TOPIC, execution_message(i))
+
+    received = trigger_sf.pull_window(FakeSubscriberClient(broker), EXECUTION_SUBSCRIPTION, 5.0)
+
+    assert [m.message.message_id for m in received] == ['1', '2', '3']
+
+
+def test_pull_and_coalesce_acks_window_ending_in_timeout(trigger_sf, broker, monkeypatch):
+    monkeypatch.setattr(trigger_sf, 'COALESCE_WINDOW_MS', 5000)
+    for i in range(3):
+        broker.publish(EXECUTION_TOPIC, execution_message(i))
+    sfn = FakeStepFunctions()
+
+    counts = trigger_sf.pull_and_coalesce(FakeSubscriberClient(broker), EXECUTION_SUBSCRIPTION, sfn,
+                                          STATE_MACHINE_ARN, FakeLambdaContext(60000))
+
+    assert counts['received'] == 3
+    assert counts['started'] == 3
+    assert counts['executions'] == 1
+    assert broker.backlog(EXECUTION_SUBSCRIPTION) == 0
+
+
+def test_pull_window_raises_other_errors(trigger_sf):
+    class FailingSubscriber:
+        def pull(self, **kwargs):
+            raise RuntimeError('unavailable')
+
+    with pytest.raises(RuntimeError):
+        trigger_sf.pull_window(FailingSubscriber(), EXECUTION_SUBSCRIPTION, 1.0)
+
+
+def test_fake_subscriber_raises_on_idle_pull(broker):
+    with pytest.raises(DeadlineExceeded):
+        FakeSubscriberClient(broker).pull(subscription=EXECUTION_SUBSCRIPTION, max_messages=10, timeout=0.01)
+
+
+def test_group_items_splits_by_count(monkeypatch):
+    monkeypatch.setattr(processor, 'COALESCE_MAX_MESSAGES', 3)
+    entries = [(i, item(i)) for i in range(7)]
+
+    groups = processor.group_items(entries)
+
+    assert [[key for key, _ in group] for group in groups] == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_group_items_splits_by_bytes(monkeypatch):
+    item_bytes = len(dumps(item(0, 100))) + 1
+    monkeypatch.setattr(processor, 'COALESCE_MAX_BYTES', item_bytes * 2)
+    entries = [(i, item(i, 100)) for i in range(5)]
+
+    groups = processor.group_items(entries)
+
+    assert [len(group) for group in groups] == [2, 2, 1]
+    assert all(sum(len(dumps(it)) + 1 for _, it in group) <= item_bytes * 2 for group in groups)
+
+
+def test_group_items_gives_oversized_item_its_own_group(monkeypatch):
+    monkeypatch.setattr(processor, 'COALESCE_MAX_BYTES', 200)
+    entries = [(0, item(0)), (1, item(1, 1000)), (2, item(2))]
+
+    groups = processor.group_items(entries)
+
+    assert [[key for key, _ in group] for group in groups] == [[0], [1], [2]]
+
+
+def test_group_items_of_nothing():
+    assert processor.group_items([]) == []
+
+
+def test_coalesced_execution_name_ignores_member_order():
+    name = processor.coalesced_execution_name(['b', 'a', 'c'])
+
+    assert name == processor.coalesced_execution_name(['c', 'b', 'a'])
+    assert name != processor.coalesced_execution_name(['a', 'b'])
+    assert name.startswith('coalesced-')
+    # Step Functions execution names are limited to 80 characters
+    assert len(name) <= 80
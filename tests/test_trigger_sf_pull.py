@@ -0,0 +1,68 @@
+import pytest
+
+from cloud_fakes import DeadlineExceeded, FakeLambdaContext, FakeStepFunctions, FakeSubscriberClient
+from conftest import EXECUTION_SUBSCRIPTION, EXECUTION_TOPIC, STATE_MACHINE_ARN, execution_message
+
+
+class RetryError(Exception):
+    """Named like google.api_core.exceptions.RetryError, which carries the last error as cause"""
+
+    def __init__(self, message, cause):
+        super().__init__(message)
+        self.cause = cause
+
+
+class IdleSubscriber:
+    """Subscriber whose pulls time out without messages"""
+
+    def __init__(self, error):
+        self.error = error
+        self.timeouts = []
+
+    def pull(self, subscription, max_messages, timeout=None):
+        self.timeouts.append(timeout)
+        raise self.error
+
+
+def publish(broker, count):
+    for i in range(count):
+        broker.publish(EXECUTION_TOPIC, execution_message(i))
+
+
+def test_pull_messages_treats_timeouts_as_empty(trigger_sf):
+    for error in (DeadlineExceeded('idle'), RetryError('idle', DeadlineExceeded('idle'))):
+        assert trigger_sf.pull_messages(IdleSubscriber(error), EXECUTION_SUBSCRIPTION, 10, 1.0) == []
+
+
+@pytest.mark.parametrize('error', [
+    PermissionError('denied'),
+    RetryError('retries exhausted', PermissionError('denied')),
+    RetryError('retries exhausted', None),
+])
+def test_pull_messages_raises_other_errors(trigger_sf, error):
+    with pytest.raises(type(error)):
+        trigger_sf.pull_messages(IdleSubscriber(error), EXECUTION_SUBSCRIPTION, 10)
+
+
+def test_drain_stops_at_idle_pull(trigger_sf, broker):
+    publish(broker, 25)
+    sfn = FakeStepFunctions()
+
+    counts, pulls = trigger_sf.drain(FakeSubscriberClient(broker), EXECUTION_SUBSCRIPTION, sfn, STATE_MACHINE_ARN,
+                                     FakeLambdaContext(60000))
+
+    assert counts['received'] == 25
+    assert counts['started'] == 25
+    assert pulls == 4  # 10 + 10 + 5, then the idle pull raising DeadlineExceeded
+    assert broker.backlog(EXECUTION_SUBSCRIPTION) == 0
+
+
+def test_drain_caps_pull_timeout(trigger_sf):
+    subscriber = IdleSubscriber(DeadlineExceeded('idle'))
+
+    counts, pulls = trigger_sf.drain(subscriber, EXECUTION_SUBSCRIPTION, FakeStepFunctions(), STATE_MACHINE_ARN,
+                                     FakeLambdaContext(60000))
+
+    assert counts['received'] == 0
+    assert pulls == 1
+    assert subscriber.timeouts == [trigger_sf.DRAIN_PULL_TIMEOUT_SECONDS]
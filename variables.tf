@@ -77,6 +77,18 @@ variable "lambda_runtime_python" {
   default     = "python3.12"
 }
 
+variable "lambda_profiling" {
+  description = "Log per-invocation wall/CPU time, memory and section timings of the Python Lambda functions as CloudWatch EMF metrics"
+  type        = bool
+  default     = false
+}
+
+variable "fuse_hello_world_steps" {
+  description = "Run the HelloWorld and Timestamp steps of the start Step Function in one pipeline_runner Lambda invocation"
+  type        = bool
+  default     = false
+}
+
 variable "lambda_runtime_go" {
   description = "Go runtime version for Lambda functions"
   type        = string
@@ -89,3 +101,21 @@ variable "airflow_webserver_secret_key" {
   sensitive   = true
   default     = "your-secret-key-here" # You'll need to set this in terraform.tfvars
 }
+
+variable "hello_world_batch_mode" {
+  description = "Trigger one hello_world_dag run for all the Pub/Sub messages pulled by pubsub_trigger_dag instead of one run per message"
+  type        = bool
+  default     = false
+}
+
+variable "fuse_hello_world_dag_steps" {
+  description = "Run the start, hello_world, print_timestamp and bash_hello tasks of hello_world_dag as one task instance"
+  type        = bool
+  default     = false
+}
+
+variable "step_function_start_concurrency" {
+  description = "Maximum number of direct Step Function starts running at once per hello_world_dag run in batch mode"
+  type        = number
+  default     = 10
+}